@@ -2,77 +2,121 @@
 GTMS Admin Panel - Complete User & License Management
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, flash, session, jsonify, has_app_context, has_request_context, current_app, g
+from flask.globals import request_ctx
 from flask_sqlalchemy import SQLAlchemy
-from flask_mail import Mail, Message
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from sqlalchemy import event
+from sqlalchemy.schema import CreateIndex
+from werkzeug.http import is_resource_modified
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 import hashlib
+import json
 import os
+import time
 from pathlib import Path
 from functools import wraps
 
 # Import config and utilities
 from config import Config
-from utils.invoice_generator import InvoiceGenerator
+from utils.sql_functions import add_days, fold, fold_text, increment_on_conflict, prefix_match
+from utils.scheduler import PeriodicTask
+from utils.job_queue import invoice_queue
+from utils.rollups import hour_bucket, traffic_buffer
+from utils.log_partitions import LogRotation, add_months, month_start
+from utils.profiling import RequestProfiler, profile_span
+from utils import assets, compression, fragment_cache, metrics, shared_cache
+from utils.shared_cache import current_cache
+from utils.events import publish_event, stream_response
+
+# Extensions are bound to an app in create_app(); heavy optional
+# dependencies (reportlab, flask_mail, pandas) are imported where used
+db = SQLAlchemy()
+
+# Admin panel pages and the API used by the GTMS desktop app (plus /metrics).
+# The API-only profile registers just api_bp.
+admin_bp = Blueprint('admin', __name__)
+api_bp = Blueprint('api', __name__)
+
+
+class AdminPrincipal:
+    """
+    The logged-in admin for one request (g.admin). Built from the signed
+    session, so ordinary page loads run no AdminUser query.
+    """
+
+    def __init__(self, id, username, role, permissions):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.permissions = permissions
 
-# Create Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
+    def can(self, flag_name):
+        return self.permissions.get(flag_name, False)
 
-# Debug: print mail config
-print("MAIL_SERVER:", app.config["MAIL_SERVER"])
-print("MAIL_PORT:", app.config["MAIL_PORT"])
-print("MAIL_USE_TLS:", app.config["MAIL_USE_TLS"])
-print("MAIL_USE_SSL:", app.config["MAIL_USE_SSL"])
-print("MAIL_USERNAME:", app.config["MAIL_USERNAME"])
-print("USING DATABASE:", app.config['SQLALCHEMY_DATABASE_URI'])
 
-# Initialize extensions
-db = SQLAlchemy(app)
-mail = Mail(app)  # ✅ create Mail here, before importing email_service
+def remember_admin(admin):
+    """Store the admin's identity, permission flags and permission version in the session"""
+    session['admin_id'] = admin.id
+    session['admin_username'] = admin.username
+    session['admin_role'] = admin.role  # role field on AdminUser
+    session['admin_permissions'] = {flag: bool(getattr(admin, flag)) for flag in ADMIN_PERMISSIONS}
+    session['admin_permissions_version'] = admin.permissions_version or 0
+
+
+@admin_bp.before_request
+def load_admin_principal():
+    """
+    Set g.admin from the session. The session's permission flags are used
+    as long as their version matches the admin's current one (shared cache);
+    after edit_employee bumps it, the flags are reloaded once.
+    """
+    g.admin = None
+    admin_id = session.get('admin_id')
+    if admin_id is None:
+        return
 
-# NOW import email_service (it will use the mail instance created above)
-from utils.email_service import send_templated_email
+    if session.get('admin_permissions_version') != permissions_version(admin_id):
+        admin = db.session.get(AdminUser, admin_id)
+        if admin is None:
+            session.clear()
+            return
+        remember_admin(admin)
 
+    g.admin = AdminPrincipal(admin_id, session.get('admin_username'), session.get('admin_role'),
+                             session['admin_permissions'])
 
-# Your models, routes, etc. below...
 
 def login_required(f):
     """Decorator for protected routes"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'admin_id' not in session:
+        if g.get('admin') is None:
             flash('Please log in to access this page.', 'error')
-            return redirect(url_for('admin_login'))
+            return redirect(url_for('admin.admin_login'))
         return f(*args, **kwargs)
     return decorated_function
 
 
-def permission_required(flag_name):
-    """Require a specific permission on AdminUser."""
+def permission_required(*flag_names):
+    """Require a specific permission on AdminUser (any one of several, if given)."""
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            if 'admin_id' not in session:
-                return redirect(url_for('admin_login'))
+            if g.get('admin') is None:
+                return redirect(url_for('admin.admin_login'))
 
-            admin = AdminUser.query.get(session['admin_id'])
-            if not admin or not getattr(admin, flag_name, False):
+            if not any(g.admin.can(flag_name) for flag_name in flag_names):
                 flash('You do not have permission to access this page.', 'error')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('admin.dashboard'))
 
             return f(*args, **kwargs)
         return decorated
     return decorator
 
 
-
-
-
-
-
 # ==================
 # DATABASE MODELS
 # ==================
@@ -100,6 +144,8 @@ class AdminUser(db.Model):
     can_manage_licenses = db.Column(db.Boolean, default=False, nullable=False)
     can_manage_payments = db.Column(db.Boolean, default=False, nullable=False)
     can_manage_users = db.Column(db.Boolean, default=False, nullable=False)
+    # Bumped whenever the flags change; sessions holding an older version reload them
+    permissions_version = db.Column(db.Integer, default=0)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -107,8 +153,15 @@ class AdminUser(db.Model):
         self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
+        if self.has_legacy_password:
+            return secrets.compare_digest(self.password_hash, hashlib.sha256(password.encode()).hexdigest())
         return check_password_hash(self.password_hash, password)
 
+    @property
+    def has_legacy_password(self):
+        """Unsalted SHA-256 hash carried over from license_server.db"""
+        return len(self.password_hash) == 64 and '$' not in self.password_hash
+
 
 
 class GTMSUser(db.Model):
@@ -182,6 +235,13 @@ class Subscription(db.Model):
 
     payments = db.relationship('Payment', backref='subscription', lazy=True)
 
+    __table_args__ = (
+        # Used by the expiry sweeper: active subscriptions past their end date
+        db.Index('ix_subscription_status_end_date', 'status', 'end_date'),
+        # Used by the auto-renew billing run: subscriptions due for billing
+        db.Index('ix_subscription_next_billing_date', 'next_billing_date'),
+    )
+
 
 class Payment(db.Model):
     """Payment tracking"""
@@ -292,12 +352,18 @@ class License(db.Model):
     
     # Status
     is_active = db.Column(db.Boolean, default=True)
+    expired_at = db.Column(db.DateTime, nullable=True)  # set when the sweeper deactivates a lapsed license
     notes = db.Column(db.Text)
     
     # Relationships (NO product relationship)
     users = db.relationship('GTMSUser', backref='license', lazy=True)
     devices = db.relationship('DeviceAccess', backref='license', lazy=True)
 
+    __table_args__ = (
+        # Used by the expiry sweeper: active licenses past their expiry date
+        db.Index('ix_license_is_active_expiry_date', 'is_active', 'expiry_date'),
+    )
+
 
 
 class DeviceAccess(db.Model):
@@ -328,6 +394,11 @@ class ActivityLog(db.Model):
     ip_address = db.Column(db.String(50))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Recent-activity lists and partition pruning on PostgreSQL
+        db.Index('ix_activity_log_timestamp', 'timestamp'),
+    )
+
 class AdminActivityLog(db.Model):
     """Log actions performed by admin/employees"""
     id = db.Column(db.Integer, primary_key=True)
@@ -338,11 +409,243 @@ class AdminActivityLog(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class TrafficRollup(db.Model):
+    """Hourly API traffic counters per endpoint, license, event and denial reason"""
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.DateTime, nullable=False)  # start of the hour (UTC)
+    endpoint = db.Column(db.String(50), nullable=False)
+    event = db.Column(db.String(20), nullable=False)  # verification, activation, denial, login
+    reason = db.Column(db.String(50), nullable=False, default='')  # denials only
+    license_id = db.Column(db.Integer, nullable=False, default=0)  # 0 = no license resolved
+    product_name = db.Column(db.String(100), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'endpoint', 'event', 'reason', 'license_id', 'product_name',
+                            name='uq_traffic_rollup_key'),
+    )
+
+
+# Expression indexes for the case-insensitive prefix searches behind the
+# typeahead selects (see utils.sql_functions.fold)
+db.Index('ix_client_name_folded', fold(Client.name))
+db.Index('ix_license_company_name_folded', fold(License.company_name))
+db.Index('ix_license_key_folded', fold(License.license_key))
+db.Index('ix_gtms_user_username_folded', fold(GTMSUser.username))
+db.Index('ix_gtms_user_full_name_folded', fold(GTMSUser.full_name))
+
+# Indexes replaced by the ones above; upgrade_schema() drops them
+OBSOLETE_INDEXES = ('ix_client_name_lower', 'ix_license_company_name_lower',
+                    'ix_gtms_user_username_lower', 'ix_gtms_user_full_name_lower')
+
+
+# ==================
+# Shared Caches
+# ==================
+
+# Cache namespaces to invalidate when rows of a model change; their
+# generations are also the version stamps of conditional GETs. Any write made
+# from an admin panel request also invalidates the dashboard; API traffic
+# (device and login bookkeeping) only ages it out after DASHBOARD_CACHE_TTL.
+CACHE_DEPENDENCIES = {
+    License: ('licenses', 'dashboard'),
+    Client: ('clients',),
+    Payment: ('payments',),
+    Invoice: ('payments',),
+    Subscription: ('subscriptions',),
+    GTMSUser: ('users',),
+    DeviceAccess: ('devices',),
+    AdminUser: ('admins',),
+}
+
+
+def touched_cache_namespaces(session, models):
+    touched = session.info.setdefault('cache_namespaces', set())
+    for model in models:
+        touched.update(CACHE_DEPENDENCIES.get(model, ()))
+    if models and has_request_context() and request.blueprint == 'admin':
+        touched.add('dashboard')
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_cache_writes(session, flush_context):
+    touched_cache_namespaces(session, {type(obj) for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_cache_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        touched_cache_namespaces(orm_execute_state.session, {mapper.class_} if mapper else set())
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_cached_writes(session):
+    """Bump the generations of everything the transaction changed, in every worker"""
+    touched = session.info.pop('cache_namespaces', None)
+    if touched and has_app_context():
+        current_cache().invalidate(*touched)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_cached_writes(session):
+    session.info.pop('cache_namespaces', None)
+
+
+# Fields of License read by the verify / deactivate API
+LICENSE_CACHE_FIELDS = (
+    'id', 'license_key', 'company_name', 'contact_email', 'product_name', 'plan_type', 'subscription_type',
+    'is_active', 'expired_at', 'expiry_date', 'activation_date', 'max_devices',
+)
+
+ADMIN_PERMISSIONS = ('can_manage_clients', 'can_manage_licenses', 'can_manage_payments', 'can_manage_users')
+
+
+def cached_license(license_key):
+    """License fields for `license_key` (None if unknown), cached until any license changes"""
+    def load():
+        license = License.query.filter_by(license_key=license_key).first()
+        if license is None:
+            return None
+        return SimpleNamespace(**{field: getattr(license, field) for field in LICENSE_CACHE_FIELDS})
+
+    return current_cache().get_or_set('licenses', license_key, load, ttl=current_app.config['LICENSE_CACHE_TTL'])
+
+
+def permissions_version(admin_id):
+    """An admin's permission version (None if unknown), cached until admins change"""
+    return current_cache().get_or_set(
+        'admins', f'permissions_version:{admin_id}',
+        lambda: db.session.query(db.func.coalesce(AdminUser.permissions_version, 0))
+        .filter(AdminUser.id == admin_id).scalar(),
+        ttl=current_app.config['ADMIN_CACHE_TTL'],
+    )
+
+
+
+# ==================
+# Conditional GET (ETag / Last-Modified)
+# ==================
+
+def resource_stamp(namespaces, period):
+    """
+    (ETag, Last-Modified) of the current GET for a page built from the rows
+    behind `namespaces`, from cache generations alone. Pages also change
+    when `period` seconds roll over (relative dates, snapshots) and differ
+    per admin (navigation, permissions).
+    """
+    cache = current_cache()
+    token, started = cache.epoch()
+    now = time.time()
+    bucket = int(now // period)
+    generations = [cache.generation(namespace) for namespace in namespaces]
+    admin = g.get('admin')
+    identity = (admin.id, admin.username, admin.role, sorted(admin.permissions.items())) if admin else None
+    # Pages link fingerprinted assets, so they change when an asset does
+    asset_version = assets.current_manifest().version if 'assets' in current_app.extensions else None
+    etag = hashlib.sha1(repr((
+        current_app.config['APP_VERSION'], asset_version, request.full_path, identity, token, generations, bucket,
+    )).encode()).hexdigest()
+
+    modified = [bucket * period, started]
+    modified += [cache.last_modified(namespace) for namespace, generation in zip(namespaces, generations)
+                 if generation]
+    # Unknown (entry lost), or within the current second: HTTP dates are whole
+    # seconds, so a second change in the same second would not move it
+    if None in modified or max(modified) > now - 1:
+        return etag, None
+    return etag, datetime.utcfromtimestamp(int(max(modified)))
+
+
+def flashes_pending():
+    return '_flashes' in session or bool(getattr(request_ctx, 'flashes', None))
+
+
+def conditional(*namespaces, period=86400):
+    """
+    Conditional GET for a view built from the rows behind `namespaces` (see
+    CACHE_DEPENDENCIES). A client whose ETag or Last-Modified is current
+    gets a 304 before the view runs a query; other responses are tagged
+    and revalidated on every use. `period` may name a config value.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # A page carrying flash messages is never tagged, so never replayed
+            if request.method not in ('GET', 'HEAD') or flashes_pending():
+                return f(*args, **kwargs)
+
+            seconds = current_app.config[period] if isinstance(period, str) else period
+            etag, last_modified = resource_stamp(namespaces, seconds)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                metrics.CACHE_REQUESTS.labels(cache='http', result='hit').inc()
+                response = current_app.response_class(status=304)
+            else:
+                metrics.CACHE_REQUESTS.labels(cache='http', result='miss').inc()
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200 or flashes_pending():
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated
+    return decorator
+
+
+# ==================
+# Live Dashboard Events
+# ==================
+
+def payment_event(payment, client_names):
+    return {'id': payment.id, 'date': payment.payment_date, 'client': client_names.get(payment.client_id, ''),
+            'amount': payment.amount, 'status': payment.status}
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_payment_events(session, flush_context):
+    """Remember new payments and status changes; they are published after the commit"""
+    payments = [obj for obj in session.new if isinstance(obj, Payment)]
+    payments += [obj for obj in session.dirty
+                 if isinstance(obj, Payment) and db.inspect(obj).attrs.status.history.has_changes()]
+    if not payments:
+        return
+    client_names = dict(session.connection().execute(
+        db.select(Client.id, Client.name).where(Client.id.in_({payment.client_id for payment in payments}))
+    ).all())
+    session.info.setdefault('payment_events', []).extend(payment_event(p, client_names) for p in payments)
+
+
+@event.listens_for(db.session, 'after_commit')
+def publish_payment_events(session):
+    payments = session.info.pop('payment_events', None)
+    if payments and has_app_context():
+        publish_event('payment', count=len(payments), payments=payments[-5:])
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_payment_events(session):
+    session.info.pop('payment_events', None)
+
+
+def publish_renewals(since, count):
+    """Announce `count` renewals written at `since`, with the latest few of them"""
+    renewals = RenewalLog.query.options(db.joinedload(RenewalLog.client)) \
+        .filter(RenewalLog.renewal_date >= since).order_by(RenewalLog.id.desc()).limit(5).all()
+    publish_event('renewal', count=count, renewals=[
+        {'date': r.renewal_date, 'client': r.client.name if r.client else '', 'type': r.renewal_type,
+         'new_expiry': r.new_expiry_date}
+        for r in renewals
+    ])
+
 
 """
 # Email Routes for testing
 
-@app.route("/admin/test-welcome")
+@admin_bp.route("/admin/test-welcome")
 def test_welcome():
     ok = send_templated_email(
         subject="Welcome to License Server",
@@ -356,7 +659,7 @@ def test_welcome():
     return "OK" if ok else "FAILED"
 
 
-@app.route("/admin/test-license-activated")
+@admin_bp.route("/admin/test-license-activated")
 def test_license_activated():
     ok = send_templated_email(
         subject="Your license has been activated",
@@ -372,7 +675,7 @@ def test_license_activated():
     return "OK" if ok else "FAILED"
 
 
-@app.route("/admin/test-receipt")
+@admin_bp.route("/admin/test-receipt")
 def test_receipt():
     ok = send_templated_email(
         subject="Payment receipt",
@@ -389,7 +692,7 @@ def test_receipt():
     return "OK" if ok else "FAILED"
 
 
-@app.route("/admin/test-expiry-reminder")
+@admin_bp.route("/admin/test-expiry-reminder")
 def test_expiry_reminder():
     ok = send_templated_email(
         subject="Your license is expiring soon",
@@ -414,23 +717,24 @@ def test_expiry_reminder():
     # ==================
 # ROUTES - Employees Management (Admin users)
 # ==================
-@app.route("/admin/test-email")
+@admin_bp.route("/admin/test-email")
 def test_email():
+    from flask_mail import Message
     msg = Message(
         subject="License Server test email",
         recipients=["siddiquiadi249@gmail.com"]
     )
     msg.body = "If you see this, your email config works."
-    mail.send(msg)
+    current_app.extensions['mail'].send(msg)
     return "Test email sent!"
 
 
-@app.route('/admin/employees/<int:admin_id>')
+@admin_bp.route('/admin/employees/<int:admin_id>')
 @login_required
 @permission_required('can_manage_users')
 def employee_detail(admin_id):
     """View employee details and recent activity"""
-    emp = AdminUser.query.get_or_404(admin_id)
+    emp = db.get_or_404(AdminUser, admin_id)
     logs = AdminActivityLog.query.filter_by(admin_id=admin_id) \
                                  .order_by(AdminActivityLog.timestamp.desc()) \
                                  .limit(50).all()
@@ -439,21 +743,22 @@ def employee_detail(admin_id):
 
 
 
-@app.route('/admin/employees')
+@admin_bp.route('/admin/employees')
 @login_required
 @permission_required('can_manage_users')  # or a new can_manage_employees flag
+@conditional('admins')
 def employees_list():
     """List all admin/employees"""
     employees = AdminUser.query.order_by(AdminUser.created_at.desc()).all()
     return render_template('employees.html', employees=employees)
 
 
-@app.route('/admin/employees/edit/<int:admin_id>', methods=['POST'])
+@admin_bp.route('/admin/employees/edit/<int:admin_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_users')
 def edit_employee(admin_id):
     """Edit admin/employee info and permissions"""
-    admin = AdminUser.query.get_or_404(admin_id)
+    admin = db.get_or_404(AdminUser, admin_id)
     data = request.form
 
     admin.employee_code = data.get('employee_code') or admin.employee_code
@@ -480,6 +785,9 @@ def edit_employee(admin_id):
     admin.can_manage_payments = bool(data.get('can_manage_payments'))
     admin.can_manage_users = bool(data.get('can_manage_users'))
 
+    # Sessions of this admin reload their permission flags on the next request
+    admin.permissions_version = (admin.permissions_version or 0) + 1
+
     # New password (optional)
     new_password = data.get('new_password', '').strip()
     if new_password:
@@ -487,9 +795,9 @@ def edit_employee(admin_id):
 
     db.session.commit()
     flash(f'Employee "{admin.username}" updated successfully!', 'success')
-    return redirect(url_for('employees_list'))
+    return redirect(url_for('admin.employees_list'))
 
-@app.route('/admin/employees/add', methods=['GET', 'POST'])
+@admin_bp.route('/admin/employees/add', methods=['GET', 'POST'])
 @login_required
 @permission_required('can_manage_users')
 def add_employee():
@@ -521,7 +829,7 @@ def add_employee():
         db.session.add(emp)
         db.session.commit()
         flash('Employee created successfully', 'success')
-        return redirect(url_for('employees_list'))
+        return redirect(url_for('admin.employees_list'))
 
     return render_template('employee_add.html')
 
@@ -533,7 +841,7 @@ def add_employee():
 # ==================
 
 
-@app.route('/admin/login', methods=['GET', 'POST'])
+@admin_bp.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Admin login"""
     if request.method == 'POST':
@@ -542,23 +850,24 @@ def admin_login():
         admin = AdminUser.query.filter_by(username=username).first()
 
         if admin and admin.check_password(password):
-            session['admin_id'] = admin.id
-            session['admin_username'] = admin.username
-            session['admin_role'] = admin.role  # role field on AdminUser
+            if admin.has_legacy_password:
+                admin.set_password(password)
+                db.session.commit()
+            remember_admin(admin)
             flash('Login successful!', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('admin.dashboard'))
         else:
             flash('Invalid credentials!', 'error')
 
     return render_template('login.html')
 
 
-@app.route('/admin/logout')
+@admin_bp.route('/admin/logout')
 def admin_logout():
     """Admin logout"""
     session.clear()
     flash('Logged out successfully!', 'info')
-    return redirect(url_for('admin_login'))
+    return redirect(url_for('admin.admin_login'))
 
 
 # Decorators defined above; do not redefine them here.
@@ -569,16 +878,36 @@ def admin_logout():
 # ==================
 
 
-@app.route('/')
-@app.route('/admin/dashboard')
+def dashboard_counts():
+    """Row counts shown on the dashboard"""
+    return {
+        'total_licenses': License.query.count(),
+        'active_licenses': License.query.filter_by(is_active=True).count(),
+        # Deactivated by the expiry sweeper
+        'expired_licenses': License.query.filter(License.expired_at.isnot(None)).count(),
+        'total_users': GTMSUser.query.count(),
+        'active_users': GTMSUser.query.filter_by(is_active=True).count(),
+        'total_devices': DeviceAccess.query.count(),
+        'active_devices': DeviceAccess.query.filter_by(is_active=True).count(),
+        'total_clients': Client.query.count(),
+        'active_clients': Client.query.filter_by(status='active').count(),
+        'total_subscriptions': Subscription.query.count(),
+        'active_subscriptions': Subscription.query.filter_by(status='active').count(),
+    }
+
+
+@admin_bp.route('/')
+@admin_bp.route('/admin/dashboard')
 @login_required
+@conditional('dashboard', 'payments', 'subscriptions', period='DASHBOARD_CACHE_TTL')
 def dashboard():
     """Enhanced dashboard with expiry warnings and revenue"""
 
-    # === LICENSE STATS ===
-    total_licenses = License.query.count()
-    active_licenses = License.query.filter_by(is_active=True).count()
+    # === COUNTS (shared cache, see dashboard_counts) ===
+    counts = current_cache().get_or_set('dashboard', 'counts', dashboard_counts,
+                                        ttl=current_app.config['DASHBOARD_CACHE_TTL'])
 
+    # === LICENSE STATS ===
     # Expiring in 7 days
     expiring_soon = License.query.filter(
         License.expiry_date <= datetime.utcnow() + timedelta(days=7),
@@ -586,28 +915,7 @@ def dashboard():
         License.is_active == True
     ).all()
 
-    # Already expired
-    expired_licenses = License.query.filter(
-        License.expiry_date < datetime.utcnow(),
-        License.is_active == True
-    ).count()
-
-    # === USER STATS ===
-    total_users = GTMSUser.query.count()
-    active_users = GTMSUser.query.filter_by(is_active=True).count()
-
-    # === DEVICE STATS ===
-    total_devices = DeviceAccess.query.count()
-    active_devices = DeviceAccess.query.filter_by(is_active=True).count()
-
-    # === CLIENT STATS ===
-    total_clients = Client.query.count()
-    active_clients = Client.query.filter_by(status='active').count()
-
     # === SUBSCRIPTION STATS ===
-    total_subscriptions = Subscription.query.count()
-    active_subscriptions = Subscription.query.filter_by(status='active').count()
-
     # Expiring subscriptions (30 days)
     expiring_subscriptions = Subscription.query.filter(
         Subscription.end_date <= datetime.utcnow() + timedelta(days=30),
@@ -615,44 +923,30 @@ def dashboard():
         Subscription.status == 'active'
     ).all()
 
-    # === PAYMENT & REVENUE STATS ===
-    total_revenue = db.session.query(db.func.sum(Payment.amount)).filter_by(status='completed').scalar() or 0
+    # === PAYMENT & REVENUE STATS (daily analytics snapshot) ===
+    revenue = revenue_metrics()
+    total_revenue = revenue['total_revenue']
+    month_revenue = revenue['month_revenue']
+    outstanding_payments = revenue['outstanding_amount']
+    outstanding_count = revenue['outstanding_count']
 
-    # This month revenue
-    first_day = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    month_revenue = db.session.query(db.func.sum(Payment.amount)).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= first_day
-    ).scalar() or 0
-
-    # Outstanding payments (pending/unpaid)
-    outstanding_payments = db.session.query(db.func.sum(Payment.amount)).filter_by(status='pending').scalar() or 0
-    outstanding_count = Payment.query.filter_by(status='pending').count()
+    # === API TRAFFIC (last 24 hours, from the hourly rollups) ===
+    traffic, denial_reasons = traffic_totals(hour_bucket(datetime.utcnow()) - timedelta(hours=23))
 
     # === RECENT ACTIVITY ===
-    recent_logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(10).all()
-    recent_payments = Payment.query.order_by(Payment.payment_date.desc()).limit(5).all()
-    recent_renewals = RenewalLog.query.order_by(RenewalLog.renewal_date.desc()).limit(5).all()
+    recent_logs = ActivityLog.query.filter(ActivityLog.timestamp >= activity_hot_since()) \
+        .order_by(ActivityLog.timestamp.desc()).limit(10).all()
+    recent_payments = Payment.query.options(db.joinedload(Payment.client)) \
+        .order_by(Payment.payment_date.desc()).limit(5).all()
+    recent_renewals = RenewalLog.query.options(db.joinedload(RenewalLog.client)) \
+        .order_by(RenewalLog.renewal_date.desc()).limit(5).all()
 
     return render_template(
         'dashboard.html',
-        total_licenses=total_licenses,
-        active_licenses=active_licenses,
-        expired_licenses=expired_licenses,
+        **counts,
         expiring_soon=expiring_soon,
         expiring_soon_count=len(expiring_soon),
 
-        total_users=total_users,
-        active_users=active_users,
-
-        total_devices=total_devices,
-        active_devices=active_devices,
-
-        total_clients=total_clients,
-        active_clients=active_clients,
-
-        total_subscriptions=total_subscriptions,
-        active_subscriptions=active_subscriptions,
         expiring_subscriptions=expiring_subscriptions,
         expiring_subs_count=len(expiring_subscriptions),
 
@@ -660,19 +954,36 @@ def dashboard():
         month_revenue=month_revenue,
         outstanding_payments=outstanding_payments,
         outstanding_count=outstanding_count,
+        revenue=revenue,
+
+        traffic=traffic,
+        denial_reasons=denial_reasons,
 
         recent_logs=recent_logs,
         recent_payments=recent_payments,
-        recent_renewals=recent_renewals
+        recent_renewals=recent_renewals,
+        now=datetime.utcnow
     )
 
 
-@app.route('/admin/payments/outstanding')
+@admin_bp.route('/admin/events')
+@login_required
+def event_stream():
+    """Live dashboard events (server-sent events, see utils/events.py)"""
+    if current_app.config['EVENTS_SOCKET']:
+        # event_server.py serves this path; 204 tells EventSource to stop retrying
+        return '', 204
+    return stream_response(request.headers.get('Last-Event-ID'))
+
+
+@admin_bp.route('/admin/payments/outstanding')
 @login_required
 @permission_required('can_manage_payments')
+@conditional('payments', 'clients')
 def outstanding_payments():
     """Show outstanding/pending payments"""
-    payments = Payment.query.filter_by(status='pending').order_by(Payment.payment_date.asc()).all()
+    payments = Payment.query.options(db.joinedload(Payment.client)) \
+        .filter_by(status='pending').order_by(Payment.payment_date.asc()).all()
 
     total_outstanding = db.session.query(db.func.sum(Payment.amount)).filter_by(status='pending').scalar() or 0
     pending_count = len(payments)
@@ -690,13 +1001,13 @@ def outstanding_payments():
     )
 
 
-@app.route('/admin/payments/mark-paid/<int:payment_id>', methods=['POST'])
+@admin_bp.route('/admin/payments/mark-paid/<int:payment_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_payments')
 def mark_payment_paid(payment_id):
     """Mark a payment as completed"""
     try:
-        payment = Payment.query.get_or_404(payment_id)
+        payment = db.get_or_404(Payment, payment_id)
         payment.status = 'completed'
         db.session.commit()
 
@@ -712,17 +1023,18 @@ def mark_payment_paid(payment_id):
 # ==================
 
 
-@app.route('/admin/users')
+@admin_bp.route('/admin/users')
 @login_required
 @permission_required('can_manage_users')
+@conditional('users', 'licenses')
 def users_list():
     """List all GTMS users"""
-    users = GTMSUser.query.order_by(GTMSUser.created_at.desc()).all()
-    licenses = License.query.filter_by(is_active=True).all()
-    return render_template('users.html', users=users, licenses=licenses)
+    users = GTMSUser.query.options(db.joinedload(GTMSUser.license)) \
+        .order_by(GTMSUser.created_at.desc()).all()
+    return render_template('users.html', users=users)
 
 
-@app.route('/admin/users/add', methods=['POST'])
+@admin_bp.route('/admin/users/add', methods=['POST'])
 @login_required
 @permission_required('can_manage_users')
 def add_user():
@@ -732,17 +1044,17 @@ def add_user():
 
         if GTMSUser.query.filter_by(username=data['username']).first():
             flash('Username already exists!', 'error')
-            return redirect(url_for('users_list'))
+            return redirect(url_for('admin.users_list'))
 
         # ✅ ENFORCE MAX USERS PER LICENSE
         license_id = data.get('license_id') or None
         if license_id:
-            lic = License.query.get(int(license_id))
+            lic = db.session.get(License, int(license_id))
             if lic:
                 current_users = GTMSUser.query.filter_by(license_id=lic.id).count()
                 if current_users >= lic.max_users:
                     flash(f'User limit reached for this license (max {lic.max_users}).', 'error')
-                    return redirect(url_for('users_list'))
+                    return redirect(url_for('admin.users_list'))
 
         user = GTMSUser(
             username=data['username'],
@@ -764,16 +1076,16 @@ def add_user():
         db.session.rollback()
         flash(f'Error creating user: {str(e)}', 'error')
 
-    return redirect(url_for('users_list'))
+    return redirect(url_for('admin.users_list'))
 
 
-@app.route('/admin/users/edit/<int:user_id>', methods=['POST'])
+@admin_bp.route('/admin/users/edit/<int:user_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_users')
 def edit_user(user_id):
     """Edit GTMS user"""
     try:
-        user = GTMSUser.query.get_or_404(user_id)
+        user = db.get_or_404(GTMSUser, user_id)
         data = request.form
 
         # ✅ ENFORCE MAX USERS PER LICENSE WHEN CHANGING LICENSE
@@ -782,12 +1094,12 @@ def edit_user(user_id):
             new_license_id_int = int(new_license_id)
             # Only check limit if license is changing
             if user.license_id != new_license_id_int:
-                lic = License.query.get(new_license_id_int)
+                lic = db.session.get(License, new_license_id_int)
                 if lic:
                     current_users = GTMSUser.query.filter_by(license_id=lic.id).count()
                     if current_users >= lic.max_users:
                         flash(f'User limit reached for this license (max {lic.max_users}).', 'error')
-                        return redirect(url_for('users_list'))
+                        return redirect(url_for('admin.users_list'))
 
         user.full_name = data.get('full_name', user.full_name)
         user.role = data.get('role', user.role)
@@ -808,16 +1120,16 @@ def edit_user(user_id):
         db.session.rollback()
         flash(f'Error updating user: {str(e)}', 'error')
 
-    return redirect(url_for('users_list'))
+    return redirect(url_for('admin.users_list'))
 
 
-@app.route('/admin/users/toggle-status/<int:user_id>/<int:is_active>', methods=['POST'])
+@admin_bp.route('/admin/users/toggle-status/<int:user_id>/<int:is_active>', methods=['POST'])
 @login_required
 @permission_required('can_manage_users')
 def toggle_user_status(user_id, is_active):
     """Toggle user active/inactive status"""
     try:
-        user = GTMSUser.query.get_or_404(user_id)
+        user = db.get_or_404(GTMSUser, user_id)
         user.is_active = bool(is_active)
         db.session.commit()
 
@@ -831,13 +1143,13 @@ def toggle_user_status(user_id, is_active):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/admin/users/delete/<int:user_id>', methods=['POST'])
+@admin_bp.route('/admin/users/delete/<int:user_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_users')
 def delete_user(user_id):
     """Delete GTMS user"""
     try:
-        user = GTMSUser.query.get_or_404(user_id)
+        user = db.get_or_404(GTMSUser, user_id)
         username = user.username
 
         db.session.delete(user)
@@ -849,7 +1161,7 @@ def delete_user(user_id):
         db.session.rollback()
         flash(f'Error deleting user: {str(e)}', 'error')
 
-    return redirect(url_for('users_list'))
+    return redirect(url_for('admin.users_list'))
 
 
 # ==================
@@ -857,20 +1169,27 @@ def delete_user(user_id):
 # ==================
 
 
-@app.route('/admin/devices')
+@admin_bp.route('/admin/devices')
 @login_required
+@conditional('devices', 'users')
 def devices_list():
-    """List all devices"""
-    devices = DeviceAccess.query.order_by(DeviceAccess.last_access.desc()).all()
-    return render_template('devices.html', devices=devices)
-
-
-@app.route('/admin/devices/deactivate/<int:device_id>', methods=['POST'])
+    """List all devices, or ?user_id='s devices only"""
+    query = DeviceAccess.query.options(db.joinedload(DeviceAccess.user))
+    user = None
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        user = db.get_or_404(GTMSUser, user_id)
+        query = query.filter(DeviceAccess.user_id == user_id)
+    devices = query.order_by(DeviceAccess.last_access.desc()).all()
+    return render_template('devices.html', devices=devices, user=user)
+
+
+@admin_bp.route('/admin/devices/deactivate/<int:device_id>', methods=['POST'])
 @login_required
 def deactivate_device(device_id):
     """Deactivate a device"""
     try:
-        device = DeviceAccess.query.get_or_404(device_id)
+        device = db.get_or_404(DeviceAccess, device_id)
         device.is_active = False
         db.session.commit()
 
@@ -880,7 +1199,78 @@ def deactivate_device(device_id):
         db.session.rollback()
         flash(f'Error deactivating device: {str(e)}', 'error')
 
-    return redirect(url_for('devices_list'))
+    return redirect(url_for('admin.devices_list'))
+
+
+# ==================
+# ROUTES - Typeahead Search
+# ==================
+
+TYPEAHEAD_LIMIT = 20
+TYPEAHEAD_MAX_LIMIT = 50
+
+
+def typeahead_args():
+    """(case-folded ?q= prefix, ?limit= capped at TYPEAHEAD_MAX_LIMIT)"""
+    limit = request.args.get('limit', TYPEAHEAD_LIMIT, type=int)
+    return fold_text(request.args.get('q', '').strip()), min(max(limit, 1), TYPEAHEAD_MAX_LIMIT)
+
+
+@admin_bp.route('/admin/api/clients/search')
+@login_required
+@permission_required('can_manage_clients', 'can_manage_licenses', 'can_manage_payments')
+@conditional('clients')
+def search_clients():
+    """Clients whose name starts with ?q= (case-insensitive), for typeahead selects"""
+    q, limit = typeahead_args()
+    name = fold(Client.name)
+    query = db.session.query(Client.id, Client.name, Client.email)
+    if q:
+        query = query.filter(prefix_match(name, q))
+    rows = query.order_by(name).limit(limit).all()
+    return jsonify({'results': [
+        {'id': id, 'label': client_name, 'name': client_name, 'email': email or ''}
+        for id, client_name, email in rows
+    ]})
+
+
+@admin_bp.route('/admin/api/licenses/search')
+@login_required
+@permission_required('can_manage_users', 'can_manage_licenses')
+@conditional('licenses')
+def search_licenses():
+    """Licenses whose key or company name starts with ?q=; ?active=1 for active ones only"""
+    q, limit = typeahead_args()
+    company = fold(License.company_name)
+    query = db.session.query(License.id, License.license_key, License.company_name, License.product_name)
+    if q:
+        query = query.filter(db.or_(prefix_match(fold(License.license_key), q), prefix_match(company, q)))
+    if request.args.get('active', type=int):
+        query = query.filter(License.is_active == True)
+    rows = query.order_by(company).limit(limit).all()
+    return jsonify({'results': [
+        {'id': id, 'label': f'{company_name} ({key})', 'license_key': key,
+         'company_name': company_name, 'product_name': product}
+        for id, key, company_name, product in rows
+    ]})
+
+
+@admin_bp.route('/admin/api/users/search')
+@login_required
+@permission_required('can_manage_users')
+@conditional('users')
+def search_users():
+    """GTMS users whose username or full name starts with ?q="""
+    q, limit = typeahead_args()
+    username = fold(GTMSUser.username)
+    query = db.session.query(GTMSUser.id, GTMSUser.username, GTMSUser.full_name)
+    if q:
+        query = query.filter(db.or_(prefix_match(username, q), prefix_match(fold(GTMSUser.full_name), q)))
+    rows = query.order_by(username).limit(limit).all()
+    return jsonify({'results': [
+        {'id': id, 'label': f'{full_name} ({user})', 'username': user, 'full_name': full_name}
+        for id, user, full_name in rows
+    ]})
 
 
 # ==================
@@ -888,9 +1278,18 @@ def deactivate_device(device_id):
 # ==================
 
 
-@app.route('/admin/clients')
+def client_license_counts(client_ids=None):
+    """{client_id: number of licenses} in one grouped query"""
+    query = db.session.query(License.client_id, db.func.count(License.id)).filter(License.client_id.isnot(None))
+    if client_ids is not None:
+        query = query.filter(License.client_id.in_(client_ids))
+    return dict(query.group_by(License.client_id).all())
+
+
+@admin_bp.route('/admin/clients')
 @login_required
 @permission_required('can_manage_clients')
+@conditional('clients', 'licenses')
 def clients_list():
     """List all clients with search/filter/pagination"""
     page = request.args.get('page', 1, type=int)
@@ -937,6 +1336,7 @@ def clients_list():
     return render_template(
         'clients.html',
         clients=clients,
+        license_counts=client_license_counts([c.id for c in clients]),
         pagination=pagination,
         search=search,
         status=status,
@@ -946,7 +1346,7 @@ def clients_list():
     )
 
 
-@app.route('/admin/clients/add', methods=['POST'])
+@admin_bp.route('/admin/clients/add', methods=['POST'])
 @login_required
 @permission_required('can_manage_clients')
 def add_client():
@@ -957,12 +1357,12 @@ def add_client():
         # Validation
         if not data.get('name'):
             flash('✗ Company name is required!', 'error')
-            return redirect(url_for('clients_list'))
+            return redirect(url_for('admin.clients_list'))
 
         # Check duplicate
         if Client.query.filter_by(name=data['name']).first():
             flash(f'✗ Client "{data["name"]}" already exists!', 'error')
-            return redirect(url_for('clients_list'))
+            return redirect(url_for('admin.clients_list'))
 
         client = Client(
             name=data['name'],
@@ -1002,16 +1402,16 @@ def add_client():
         db.session.rollback()
         flash(f'✗ Error creating client: {str(e)}', 'error')
 
-    return redirect(url_for('clients_list'))
+    return redirect(url_for('admin.clients_list'))
 
 
-@app.route('/admin/clients/edit/<int:client_id>', methods=['POST'])
+@admin_bp.route('/admin/clients/edit/<int:client_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_clients')
 def edit_client(client_id):
     """Edit existing client"""
     try:
-        client = Client.query.get_or_404(client_id)
+        client = db.get_or_404(Client, client_id)
         data = request.form
 
         old_name = client.name
@@ -1041,16 +1441,16 @@ def edit_client(client_id):
         db.session.rollback()
         flash(f'✗ Error updating client: {str(e)}', 'error')
 
-    return redirect(url_for('clients_list'))
+    return redirect(url_for('admin.clients_list'))
 
 
-@app.route('/admin/clients/delete/<int:client_id>', methods=['POST'])
+@admin_bp.route('/admin/clients/delete/<int:client_id>', methods=['POST'])
 @login_required
 @permission_required('can_manage_clients')
 def delete_client(client_id):
     """Delete client (only if no licenses)"""
     try:
-        client = Client.query.get_or_404(client_id)
+        client = db.get_or_404(Client, client_id)
 
         # Check if client has any licenses (active or inactive)
         total_licenses = License.query.filter_by(client_id=client.id).count()
@@ -1061,7 +1461,7 @@ def delete_client(client_id):
                 f'Has {total_licenses} license(s) linked. Deactivate client instead.',
                 'error'
             )
-            return redirect(url_for('clients_list'))
+            return redirect(url_for('admin.clients_list'))
 
         client_name = client.name
         db.session.delete(client)
@@ -1081,16 +1481,16 @@ def delete_client(client_id):
         db.session.rollback()
         flash(f'✗ Error deleting client: {str(e)}', 'error')
 
-    return redirect(url_for('clients_list'))
+    return redirect(url_for('admin.clients_list'))
 
 
-@app.route('/admin/clients/toggle-status/<int:client_id>/<status>', methods=['POST'])
+@admin_bp.route('/admin/clients/toggle-status/<int:client_id>/<status>', methods=['POST'])
 @login_required
 @permission_required('can_manage_clients')
 def toggle_client_status(client_id, status):
     """Toggle client status (active/inactive)"""
     try:
-        client = Client.query.get_or_404(client_id)
+        client = db.get_or_404(Client, client_id)
         old_status = client.status
         client.status = status
         db.session.commit()
@@ -1111,20 +1511,20 @@ def toggle_client_status(client_id, status):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-@app.route('/admin/clients/view/<int:client_id>')
+@admin_bp.route('/admin/clients/view/<int:client_id>')
 @login_required
 @permission_required('can_manage_clients')
+@conditional('clients', 'licenses', 'users', 'devices')
 def view_client(client_id):
     """View client details with licenses and statistics"""
-    client = Client.query.get_or_404(client_id)
-    licenses = License.query.filter_by(client_id=client.id).order_by(License.created_at.desc()).all()
+    client = db.get_or_404(Client, client_id)
+    licenses = License.query.options(db.selectinload(License.users), db.selectinload(License.devices)) \
+        .filter_by(client_id=client.id).order_by(License.created_at.desc()).all()
 
     # Calculate statistics
     total_licenses = len(licenses)
     active_licenses = sum(1 for lic in licenses if lic.is_active)
-    expired_licenses = sum(
-        1 for lic in licenses if lic.expiry_date < datetime.utcnow() and lic.is_active
-    )
+    expired_licenses = sum(1 for lic in licenses if lic.expired_at)
 
     total_users = sum(len(lic.users) for lic in licenses)
     total_devices = sum(len([d for d in lic.devices if d.is_active]) for lic in licenses)
@@ -1142,9 +1542,10 @@ def view_client(client_id):
     )
 
 
-@app.route('/admin/clients/export')
+@admin_bp.route('/admin/clients/export')
 @login_required
 @permission_required('can_manage_clients')
+@conditional('clients', 'licenses')
 def export_clients():
     """Export clients to CSV"""
     import csv
@@ -1152,6 +1553,7 @@ def export_clients():
     from flask import make_response
 
     clients = Client.query.order_by(Client.created_at.desc()).all()
+    license_counts = client_license_counts()
 
     si = StringIO()
     writer = csv.writer(si)
@@ -1173,7 +1575,7 @@ def export_clients():
             c.gst_number or '',
             c.address or '',
             c.status,
-            len(c.licenses),
+            license_counts.get(c.id, 0),
             c.created_at.strftime('%Y-%m-%d %H:%M')
         ])
 
@@ -1183,30 +1585,68 @@ def export_clients():
     return output
 
 
+# ==================
+# ROUTES - Revenue Reports
+# ==================
+
+
+def revenue_metrics():
+    """
+    Today's revenue snapshot (MRR, ARR, churn, revenue totals), recomputed
+    whenever any process commits a payment or subscription change
+    """
+    from utils.analytics import revenue_snapshot
+    cache = current_cache()
+    version = (cache.epoch()[0], cache.generation('payments'), cache.generation('subscriptions'))
+    return revenue_snapshot(db.engine, version)
+
+
+@admin_bp.route('/admin/reports')
+@login_required
+@permission_required('can_manage_payments')
+def revenue_report():
+    """MRR / ARR / churn / per-product revenue report"""
+    return render_template('reports.html', revenue=revenue_metrics())
+
+
+def cohort_metrics():
+    """Cohort renewal / retention matrices, refreshed incrementally on each read"""
+    from utils.cohorts import cohort_snapshot
+    return cohort_snapshot(db.engine)
+
+
+@admin_bp.route('/admin/reports/cohorts')
+@login_required
+@permission_required('can_manage_payments')
+def cohort_report():
+    """Renewal and retention by first-license month"""
+    return render_template('cohorts.html', cohorts=cohort_metrics())
+
+
 # ==================
 # ROUTES - Subscription Management
 # ==================
 
+# Billing period of each recurring plan type; lifetime plans are not billed
+PLAN_PERIOD_DAYS = {'monthly': 30, 'quarterly': 90, 'yearly': 365}
+
 
-@app.route('/admin/subscriptions')
+@admin_bp.route('/admin/subscriptions')
 @login_required
 @permission_required('can_manage_payments')
+@conditional('subscriptions', 'clients')
 def subscriptions_list():
     """List all subscriptions"""
-    subscriptions = Subscription.query.order_by(Subscription.created_at.desc()).all()
+    subscriptions = Subscription.query.options(db.joinedload(Subscription.client)) \
+        .order_by(Subscription.created_at.desc()).all()
 
     # Stats
     total_subs = Subscription.query.count()
     active_subs = Subscription.query.filter_by(status='active').count()
     expired_subs = Subscription.query.filter_by(status='expired').count()
 
-    # Calculate MRR (Monthly Recurring Revenue)
-    monthly_revenue = db.session.query(db.func.sum(Subscription.amount)).filter(
-        Subscription.status == 'active',
-        Subscription.plan_type == 'monthly'
-    ).scalar() or 0
-
-    clients = Client.query.order_by(Client.name).all()
+    # MRR normalized across all recurring plan types (daily analytics snapshot)
+    monthly_revenue = revenue_metrics()['mrr']
 
     return render_template(
         'subscriptions.html',
@@ -1214,12 +1654,11 @@ def subscriptions_list():
         total_subs=total_subs,
         active_subs=active_subs,
         expired_subs=expired_subs,
-        monthly_revenue=monthly_revenue,
-        clients=clients
+        monthly_revenue=monthly_revenue
     )
 
 
-@app.route('/admin/subscriptions/add', methods=['POST'])
+@admin_bp.route('/admin/subscriptions/add', methods=['POST'])
 @login_required
 @permission_required('can_manage_payments')
 def add_subscription():
@@ -1231,16 +1670,10 @@ def add_subscription():
         plan_type = data['plan_type']
         amount = float(data['amount'])
 
-        # Calculate end date
+        # Calculate end date (lifetime plans run for 100 years and never bill again)
         start_date = datetime.utcnow()
-        if plan_type == 'monthly':
-            end_date = start_date + timedelta(days=30)
-        elif plan_type == 'quarterly':
-            end_date = start_date + timedelta(days=90)
-        elif plan_type == 'yearly':
-            end_date = start_date + timedelta(days=365)
-        else:  # lifetime
-            end_date = start_date + timedelta(days=36500)
+        period_days = PLAN_PERIOD_DAYS.get(plan_type)
+        end_date = start_date + timedelta(days=period_days or 36500)
 
         subscription = Subscription(
             client_id=client_id,
@@ -1250,6 +1683,7 @@ def add_subscription():
             amount=amount,
             start_date=start_date,
             end_date=end_date,
+            next_billing_date=end_date if period_days else None,
             notes=data.get('notes')
         )
 
@@ -1262,19 +1696,21 @@ def add_subscription():
         db.session.rollback()
         flash(f'✗ Error creating subscription: {str(e)}', 'error')
 
-    return redirect(url_for('subscriptions_list'))
+    return redirect(url_for('admin.subscriptions_list'))
 
 
 # ==================
 # ROUTES - Payment Management
 # ==================
 
-@app.route('/admin/payments')
+@admin_bp.route('/admin/payments')
 @login_required
 @permission_required('can_manage_payments')
+@conditional('payments', 'clients')
 def payments_list():
     """List all payments"""
-    payments = Payment.query.order_by(Payment.payment_date.desc()).all()
+    payments = Payment.query.options(db.joinedload(Payment.client)) \
+        .order_by(Payment.payment_date.desc()).all()
 
     # Stats
     total_revenue = db.session.query(
@@ -1292,20 +1728,57 @@ def payments_list():
         Payment.payment_date >= first_day
     ).scalar() or 0
 
-    clients = Client.query.order_by(Client.name).all()
-
     return render_template(
         'payments.html',
         payments=payments,
         total_revenue=total_revenue,
         total_payments=total_payments,
         pending_payments=pending_payments,
-        month_revenue=month_revenue,
-        clients=clients
+        month_revenue=month_revenue
     )
 
 
-@app.route('/admin/payments/add', methods=['POST'])
+def build_invoice_data(payment, client, due_date=None):
+    """Invoice PDF data for a payment (amounts are GST-inclusive at 18%)"""
+    return {
+        'invoice_number': payment.invoice_number,
+        'invoice_date': payment.payment_date,
+        'due_date': due_date or payment.payment_date,
+        'company': {
+            'name': 'Your Company Name Pvt Ltd',
+            'address': 'Address Line 1\nCity, State - 400001',
+            'email': 'info@yourcompany.com',
+            'phone': '+91-9876543210',
+            'gst': '27AAAAA0000A1Z5'
+        },
+        'client': {
+            'name': client.name,
+            'contact': client.contact_person,
+            'address': client.address or '-',
+            'email': client.email,
+            'phone': client.phone,
+            'gst': client.gst_number
+        },
+        'items': [
+            {
+                'description': payment.payment_for,
+                'quantity': 1,
+                'rate': payment.amount / 1.18,
+                'amount': payment.amount / 1.18
+            }
+        ],
+        'subtotal': payment.amount / 1.18,
+        'tax_rate': 18,
+        'tax_amount': payment.amount - (payment.amount / 1.18),
+        'discount': 0,
+        'total': payment.amount,
+        'payment_method': payment.payment_method,
+        'transaction_id': payment.transaction_id,
+        'notes': 'Thank you for your business!'
+    }
+
+
+@admin_bp.route('/admin/payments/add', methods=['POST'])
 @login_required
 @permission_required('can_manage_payments')
 def add_payment():
@@ -1341,48 +1814,15 @@ def add_payment():
 
         # ===== Generate invoice PDF immediately =====
         from utils.invoice_generator import InvoiceGenerator
+        from utils.email_service import send_templated_email
 
-        client = Client.query.get(payment.client_id)
-
-        invoice_data = {
-            'invoice_number': payment.invoice_number,
-            'invoice_date': payment.payment_date,
-            'due_date': payment.payment_date,
-            'company': {
-                'name': 'Your Company Name Pvt Ltd',
-                'address': 'Address Line 1\nCity, State - 400001',
-                'email': 'info@yourcompany.com',
-                'phone': '+91-9876543210',
-                'gst': '27AAAAA0000A1Z5'
-            },
-            'client': {
-                'name': client.name,
-                'contact': client.contact_person,
-                'address': client.address or '-',
-                'email': client.email,
-                'phone': client.phone,
-                'gst': client.gst_number
-            },
-            'items': [
-                {
-                    'description': payment.payment_for,
-                    'quantity': 1,
-                    'rate': payment.amount / 1.18,
-                    'amount': payment.amount / 1.18
-                }
-            ],
-            'subtotal': payment.amount / 1.18,
-            'tax_rate': 18,
-            'tax_amount': payment.amount - (payment.amount / 1.18),
-            'discount': 0,
-            'total': payment.amount,
-            'payment_method': payment.payment_method,
-            'transaction_id': payment.transaction_id,
-            'notes': 'Thank you for your business!'
-        }
+        client = db.session.get(Client, payment.client_id)
+
+        invoice_data = build_invoice_data(payment, client)
 
         generator = InvoiceGenerator()
-        pdf_path = generator.generate_invoice(invoice_data)
+        with profile_span('pdf'):
+            pdf_path = generator.generate_invoice(invoice_data)
 
         payment.invoice_generated = True
         payment.invoice_path = pdf_path
@@ -1412,10 +1852,10 @@ def add_payment():
         db.session.rollback()
         flash(f'✗ Error recording payment: {str(e)}', 'error')
 
-    return redirect(url_for('payments_list'))
+    return redirect(url_for('admin.payments_list'))
 
 
-@app.route('/admin/payments/generate-invoice/<int:payment_id>')
+@admin_bp.route('/admin/payments/generate-invoice/<int:payment_id>')
 @login_required
 @permission_required('can_manage_payments')
 def generate_invoice(payment_id):
@@ -1424,54 +1864,20 @@ def generate_invoice(payment_id):
         from utils.invoice_generator import InvoiceGenerator
         from flask import send_file
 
-        payment = Payment.query.get_or_404(payment_id)
+        payment = db.get_or_404(Payment, payment_id)
 
         # Block invoice generation for pending payments
         if payment.status != 'completed':
             flash('Cannot generate invoice for pending payment.', 'error')
-            return redirect(url_for('payments_list'))
-
-        client = Client.query.get(payment.client_id)
-
-        invoice_data = {
-            'invoice_number': payment.invoice_number,
-            'invoice_date': payment.payment_date,
-            'due_date': payment.payment_date,
-            'company': {
-                'name': 'Your Company Name Pvt Ltd',
-                'address': 'Address Line 1\nCity, State - 400001',
-                'email': 'info@yourcompany.com',
-                'phone': '+91-9876543210',
-                'gst': '27AAAAA0000A1Z5'
-            },
-            'client': {
-                'name': client.name,
-                'contact': client.contact_person,
-                'address': client.address or '-',
-                'email': client.email,
-                'phone': client.phone,
-                'gst': client.gst_number
-            },
-            'items': [
-                {
-                    'description': payment.payment_for,
-                    'quantity': 1,
-                    'rate': payment.amount / 1.18,
-                    'amount': payment.amount / 1.18
-                }
-            ],
-            'subtotal': payment.amount / 1.18,
-            'tax_rate': 18,
-            'tax_amount': payment.amount - (payment.amount / 1.18),
-            'discount': 0,
-            'total': payment.amount,
-            'payment_method': payment.payment_method,
-            'transaction_id': payment.transaction_id,
-            'notes': 'Thank you for your business!'
-        }
+            return redirect(url_for('admin.payments_list'))
+
+        client = db.session.get(Client, payment.client_id)
+
+        invoice_data = build_invoice_data(payment, client)
 
         generator = InvoiceGenerator()
-        pdf_path = generator.generate_invoice(invoice_data)
+        with profile_span('pdf'):
+            pdf_path = generator.generate_invoice(invoice_data)
 
         payment.invoice_generated = True
         payment.invoice_path = pdf_path
@@ -1481,38 +1887,162 @@ def generate_invoice(payment_id):
 
     except Exception as e:
         flash(f'✗ Error generating invoice: {str(e)}', 'error')
-        return redirect(url_for('payments_list'))
+        return redirect(url_for('admin.payments_list'))
 
 
 # ==================
 # ROUTES - License Management
 # ==================
 
+# Upper bound for one bulk issuance request (form quantity or CSV rows)
+BULK_LICENSE_LIMIT = 5000
+
+# Columns accepted in a bulk-issuance CSV; blank cells fall back to the form values
+LICENSE_CSV_FIELDS = (
+    'company_name', 'product_name', 'plan_type', 'subscription_type',
+    'max_users', 'max_devices', 'contact_email', 'contact_phone', 'notes', 'quantity'
+)
+
+
+def license_expiry_date(subscription_type, start=None):
+    """Expiry date for a new license of the given subscription type"""
+    start = start or datetime.utcnow()
+    if subscription_type == 'monthly':
+        return start + timedelta(days=30)
+    elif subscription_type == 'yearly':
+        return start + timedelta(days=365)
+    return start + timedelta(days=36500)
+
+
+def generate_license_keys(count):
+    """Generate license keys unique within the batch and against existing licenses"""
+    keys = set()
+    while len(keys) < count:
+        fresh = {f"GTMS-{secrets.token_hex(8).upper()}" for _ in range(count - len(keys))}
+        taken = db.session.query(License.license_key).filter(License.license_key.in_(fresh))
+        keys |= fresh - {key for (key,) in taken}
+    return list(keys)
+
+
+def license_quantity(value, issued=0):
+    """
+    A quantity field as an int; ValueError unless it is at least 1 and keeps
+    the request (with `issued` licenses so far) within BULK_LICENSE_LIMIT
+    """
+    try:
+        quantity = int(value or 1)
+    except ValueError:
+        raise ValueError(f'Invalid quantity {value!r}')
+    if quantity < 1:
+        raise ValueError(f'Quantity must be at least 1 (got {quantity})')
+    if quantity > BULK_LICENSE_LIMIT - issued:
+        raise ValueError(f'At most {BULK_LICENSE_LIMIT} licenses can be issued at once')
+    return quantity
+
+
+def parse_license_csv(stream, defaults):
+    """Read a bulk-issuance CSV into license specs, one per seat"""
+    import csv
+    import io
+
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    specs = []
+    for row in reader:
+        spec = dict(defaults)
+        for field in LICENSE_CSV_FIELDS:
+            value = (row.get(field) or '').strip()
+            if value:
+                spec[field] = value
+        try:
+            quantity = license_quantity(spec.pop('quantity', None), len(specs))
+        except ValueError as e:
+            raise ValueError(f'CSV line {reader.line_num}: {e}')
+        specs.extend([spec] * quantity)
+    return specs
+
+
+def issue_licenses(specs, client=None, admin_id=None):
+    """
+    Create one license per spec in a single multi-row INSERT and one commit.
+    Returns the inserted rows as dicts.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for spec, license_key in zip(specs, generate_license_keys(len(specs))):
+        subscription_type = spec.get('subscription_type') or 'yearly'
+        rows.append({
+            'license_key': license_key,
+            'client_id': client.id if client else None,
+            'company_name': spec.get('company_name') or (client.name if client else None),
+            'product_name': spec.get('product_name') or 'GTMS',
+            'max_users': int(spec.get('max_users') or 5),
+            'max_devices': int(spec.get('max_devices') or 3),
+            'plan_type': spec.get('plan_type') or 'Standard',
+            'subscription_type': subscription_type,
+            'activation_date': now,
+            'expiry_date': license_expiry_date(subscription_type, now),
+            'created_at': now,
+            'contact_email': spec.get('contact_email') or (client.email if client else None),
+            'contact_phone': spec.get('contact_phone'),
+            'notes': spec.get('notes'),
+            'is_active': True,
+        })
+
+    if any(not row['company_name'] for row in rows):
+        raise ValueError('Company name is required when no client is selected')
+
+    db.session.execute(db.insert(License), rows)
+    if admin_id:
+        db.session.add(AdminActivityLog(
+            admin_id=admin_id,
+            action='licenses_bulk_created',
+            details=f'Issued {len(rows)} licenses' + (f' for client: {client.name}' if client else ''),
+            ip_address=request.remote_addr if has_request_context() else None
+        ))
+    db.session.commit()
+    return rows
+
+
+def queue_activation_emails(rows):
+    """Queue activation emails for issued licenses as one background batch"""
+    from utils.email_service import queue_templated_emails
+    queue_templated_emails([
+        dict(
+            subject="Your license has been activated",
+            recipients=row['contact_email'],
+            template_name="emails/license_activated.html",
+            client_name=row['company_name'],
+            product_name=row['product_name'],
+            license_key=row['license_key'],
+            start_date=row['activation_date'].strftime("%d-%m-%Y"),
+            end_date=row['expiry_date'].strftime("%d-%m-%Y"),
+            notes=row['notes'],
+        )
+        for row in rows if row['contact_email']
+    ])
+
 
-@app.route('/admin/licenses')
+@admin_bp.route('/admin/licenses')
 @login_required
 @permission_required('can_manage_licenses')
+@conditional('licenses', 'clients', 'users', 'devices')
 def licenses_list():
     product_filter = request.args.get('product', 'all')
 
-    query = License.query
+    query = License.query.options(db.selectinload(License.users), db.selectinload(License.devices))
     if product_filter != 'all':
         query = query.filter_by(product_name=product_filter)
 
     licenses = query.order_by(License.created_at.desc()).all()
 
-    # Distinct product names from licenses
-    products = db.session.query(License.product_name.distinct()) \
-                         .filter(License.product_name.isnot(None)).all()
-    products = [p[0] for p in products]
-
-    clients = Client.query.order_by(Client.name).all()
+    # Distinct product names. Left unexecuted: the template renders them inside
+    # {% cache %} fragments, so the query only runs after licenses change
+    products = db.session.query(License.product_name).filter(License.product_name.isnot(None)).distinct()
 
     return render_template(
         'licenses.html',
         licenses=licenses,
         products=products,
-        clients=clients,
         now=datetime.utcnow(),
         product_filter=product_filter
     )
@@ -1521,13 +2051,12 @@ def licenses_list():
 
 
 
-@app.route('/admin/licenses/add', methods=["GET", "POST"])
+@admin_bp.route('/admin/licenses/add', methods=["GET", "POST"])
 @login_required
 @permission_required('can_manage_licenses')
 def add_license():
     if request.method == "GET":
-        clients = Client.query.order_by(Client.name).all()
-        return render_template("admin/add_license.html", clients=clients)
+        return render_template("admin/add_license.html")
 
     # POST: create license
     try:
@@ -1536,17 +2065,12 @@ def add_license():
         license_key = f"GTMS-{secrets.token_hex(8).upper()}"
 
         subscription_type = data.get('subscription_type', 'yearly')
-        if subscription_type == 'monthly':
-            expiry_date = datetime.utcnow() + timedelta(days=30)
-        elif subscription_type == 'yearly':
-            expiry_date = datetime.utcnow() + timedelta(days=365)
-        else:
-            expiry_date = datetime.utcnow() + timedelta(days=36500)
+        expiry_date = license_expiry_date(subscription_type)
 
         product_name = data.get('product_name', 'GTMS')
 
         client_id = data.get('client_id') or None
-        client = Client.query.get(client_id) if client_id else None
+        client = db.session.get(Client, client_id) if client_id else None
 
         license = License(
             license_key=license_key,
@@ -1568,6 +2092,7 @@ def add_license():
 
         # send activation email if email present
         if license.contact_email:
+            from utils.email_service import send_templated_email
             send_templated_email(
                 subject="Your license has been activated",
                 recipients=license.contact_email,
@@ -1586,22 +2111,709 @@ def add_license():
         db.session.rollback()
         flash(f'Error creating license: {str(e)}', 'error')
 
-    return redirect(url_for('licenses_list'))
+    return redirect(url_for('admin.licenses_list'))
+
+
+@admin_bp.route('/admin/licenses/bulk', methods=['POST'])
+@login_required
+@permission_required('can_manage_licenses')
+def bulk_add_license():
+    """Issue many licenses at once, from a quantity or an uploaded CSV"""
+    try:
+        data = request.form
+
+        client_id = data.get('client_id') or None
+        client = db.session.get(Client, client_id) if client_id else None
+        defaults = {field: data.get(field) for field in LICENSE_CSV_FIELDS if field != 'quantity'}
+
+        upload = request.files.get('csv_file')
+        if upload and upload.filename:
+            specs = parse_license_csv(upload.stream, defaults)
+        else:
+            specs = [defaults] * license_quantity(data.get('quantity'))
+
+        if not specs:
+            flash('✗ No licenses to create.', 'error')
+            return redirect(url_for('admin.licenses_list'))
+
+        rows = issue_licenses(specs, client, admin_id=session.get('admin_id'))
 
+        if data.get('send_emails'):
+            queue_activation_emails(rows)
 
+        flash(f'✓ {len(rows)} licenses created successfully!', 'success')
 
+    except Exception as e:
+        db.session.rollback()
+        flash(f'✗ Error creating licenses: {str(e)}', 'error')
+
+    return redirect(url_for('admin.licenses_list'))
+
+
+
+
+
+
+
+
+
+
+# ==================
+# ROUTES - Bulk Renewals
+# ==================
+
+
+def license_renewal_filters(criteria):
+    """
+    WHERE clauses selecting the licenses a bulk renewal applies to.
+    criteria keys (all optional): license_ids, client_id, product_name,
+    plan_type, expiring_within (days), include_inactive.
+    """
+    filters = []
+    if criteria.get('license_ids'):
+        filters.append(License.id.in_([int(i) for i in criteria['license_ids']]))
+    if criteria.get('client_id'):
+        filters.append(License.client_id == int(criteria['client_id']))
+    if criteria.get('product_name'):
+        filters.append(License.product_name == criteria['product_name'])
+    if criteria.get('plan_type'):
+        filters.append(License.plan_type == criteria['plan_type'])
+    if criteria.get('expiring_within'):
+        filters.append(License.expiry_date <= datetime.utcnow() + timedelta(days=int(criteria['expiring_within'])))
+    if not criteria.get('include_inactive'):
+        # Licenses the expiry sweeper deactivated are still renewable
+        filters.append(db.or_(License.is_active == True, License.expired_at.isnot(None)))
+    return filters
+
+
+def subscription_renewal_filters(criteria):
+    """
+    WHERE clauses selecting the subscriptions a bulk renewal applies to.
+    criteria keys (all optional): subscription_ids, client_id, plan_type,
+    status, expiring_within (days).
+    """
+    filters = []
+    if criteria.get('subscription_ids'):
+        filters.append(Subscription.id.in_([int(i) for i in criteria['subscription_ids']]))
+    if criteria.get('client_id'):
+        filters.append(Subscription.client_id == int(criteria['client_id']))
+    if criteria.get('plan_type'):
+        filters.append(Subscription.plan_type == criteria['plan_type'])
+    if criteria.get('status'):
+        filters.append(Subscription.status == criteria['status'])
+    if criteria.get('expiring_within'):
+        filters.append(Subscription.end_date <= datetime.utcnow() + timedelta(days=int(criteria['expiring_within'])))
+    return filters
+
+
+def renew_licenses(days, filters, renewed_by=None, notes=None):
+    """
+    Extend every matching license by `days`: one INSERT ... SELECT writes the
+    RenewalLog rows from the current expiry dates, then one UPDATE shifts them.
+    Licenses without a client are extended but not logged (RenewalLog needs a
+    client_id). Lapsed licenses whose new expiry is in the future are
+    reactivated. Returns the number of licenses extended.
+    """
+    now = datetime.utcnow()
+    revived = db.and_(License.expired_at.isnot(None), add_days(License.expiry_date, days) > now)
+    db.session.execute(
+        db.insert(RenewalLog).from_select(
+            ['client_id', 'license_id', 'old_expiry_date', 'new_expiry_date',
+             'renewal_type', 'renewed_by', 'renewal_date', 'notes'],
+            db.select(
+                License.client_id,
+                License.id,
+                License.expiry_date,
+                add_days(License.expiry_date, days),
+                db.literal('extension'),
+                db.literal(renewed_by, db.String),
+                db.literal(now, db.DateTime),
+                db.literal(notes, db.Text),
+            ).where(*filters, License.client_id.isnot(None))
+        )
+    )
+    extended = db.session.execute(
+        db.update(License)
+        .where(*filters)
+        .values(
+            expiry_date=add_days(License.expiry_date, days),
+            is_active=db.case((revived, True), else_=License.is_active),
+            expired_at=db.case((revived, None), else_=License.expired_at),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if extended:
+        publish_renewals(now, extended)
+    return extended
+
+
+def renew_subscriptions(days, filters, renewed_by=None, notes=None):
+    """
+    Extend every matching subscription's end and next billing date by `days`
+    with one INSERT ... SELECT into RenewalLog and one UPDATE. Expired
+    subscriptions whose new end date is in the future become active again.
+    Returns the number of subscriptions extended.
+    """
+    now = datetime.utcnow()
+    revived = db.and_(Subscription.status == 'expired', add_days(Subscription.end_date, days) > now)
+    db.session.execute(
+        db.insert(RenewalLog).from_select(
+            ['client_id', 'license_id', 'subscription_id', 'old_expiry_date', 'new_expiry_date',
+             'renewal_type', 'renewed_by', 'renewal_date', 'notes'],
+            db.select(
+                Subscription.client_id,
+                Subscription.license_id,
+                Subscription.id,
+                Subscription.end_date,
+                add_days(Subscription.end_date, days),
+                db.literal('subscription_renewal'),
+                db.literal(renewed_by, db.String),
+                db.literal(now, db.DateTime),
+                db.literal(notes, db.Text),
+            ).where(*filters)
+        )
+    )
+    extended = db.session.execute(
+        db.update(Subscription)
+        .where(*filters)
+        .values(
+            end_date=add_days(Subscription.end_date, days),
+            next_billing_date=add_days(Subscription.next_billing_date, days),
+            status=db.case((revived, 'active'), else_=Subscription.status),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if extended:
+        publish_renewals(now, extended)
+    return extended
+
+
+@admin_bp.route('/admin/licenses/renew', methods=['POST'])
+@login_required
+@permission_required('can_manage_licenses')
+def bulk_renew_licenses():
+    """Extend the expiry of a filtered set of licenses"""
+    try:
+        data = request.form
+        days = int(data.get('days') or 0)
+        if days <= 0:
+            flash('✗ Extension must be at least one day.', 'error')
+            return redirect(url_for('admin.licenses_list'))
+
+        criteria = dict(data.items())
+        criteria['license_ids'] = data.getlist('license_ids')
+        extended = renew_licenses(
+            days,
+            license_renewal_filters(criteria),
+            renewed_by=session.get('admin_username'),
+            notes=data.get('notes'),
+        )
+        flash(f'✓ Extended {extended} license(s) by {days} days.', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'✗ Error renewing licenses: {str(e)}', 'error')
+
+    return redirect(url_for('admin.licenses_list'))
+
+
+@admin_bp.route('/admin/subscriptions/renew', methods=['POST'])
+@login_required
+@permission_required('can_manage_payments')
+def bulk_renew_subscriptions():
+    """Extend the end date of a filtered set of subscriptions"""
+    try:
+        data = request.form
+        days = int(data.get('days') or 0)
+        if days <= 0:
+            flash('✗ Extension must be at least one day.', 'error')
+            return redirect(url_for('admin.subscriptions_list'))
+
+        criteria = dict(data.items())
+        criteria['subscription_ids'] = data.getlist('subscription_ids')
+        extended = renew_subscriptions(
+            days,
+            subscription_renewal_filters(criteria),
+            renewed_by=session.get('admin_username'),
+            notes=data.get('notes'),
+        )
+        flash(f'✓ Extended {extended} subscription(s) by {days} days.', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'✗ Error renewing subscriptions: {str(e)}', 'error')
+
+    return redirect(url_for('admin.subscriptions_list'))
+
+
+# ==================
+# Expiry Sweeper
+# ==================
+
+
+def expire_lapsed(chunk_size=500, now=None):
+    """
+    Flip active subscriptions past their end date to 'expired' and deactivate
+    active licenses past their expiry date, recording each transition in
+    ActivityLog. Works in chunks of `chunk_size` rows, one transaction each,
+    using the (status, end_date) and (is_active, expiry_date) indexes.
+    Returns (expired_subscriptions, expired_licenses).
+    """
+    now = now or datetime.utcnow()
+
+    lapsed_subscription = db.and_(Subscription.status == 'active', Subscription.end_date < now)
+    expired_subscriptions = 0
+    while True:
+        ids = db.session.scalars(db.select(Subscription.id).where(lapsed_subscription).limit(chunk_size)).all()
+        if not ids:
+            break
+        chunk = db.and_(Subscription.id.in_(ids), lapsed_subscription)
+        db.session.execute(
+            db.insert(ActivityLog).from_select(
+                ['action', 'details', 'timestamp'],
+                db.select(
+                    db.literal('subscription_expired'),
+                    'Subscription #' + db.cast(Subscription.id, db.String) + ' (' + Subscription.plan_name + ') expired',
+                    db.literal(now, db.DateTime),
+                ).where(chunk)
+            )
+        )
+        expired_subscriptions += db.session.execute(
+            db.update(Subscription).where(chunk).values(status='expired', updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+
+    lapsed_license = db.and_(License.is_active == True, License.expiry_date < now)
+    expired_licenses = 0
+    while True:
+        ids = db.session.scalars(db.select(License.id).where(lapsed_license).limit(chunk_size)).all()
+        if not ids:
+            break
+        chunk = db.and_(License.id.in_(ids), lapsed_license)
+        db.session.execute(
+            db.insert(ActivityLog).from_select(
+                ['action', 'details', 'timestamp'],
+                db.select(
+                    db.literal('license_expired'),
+                    'License ' + License.license_key + ' (' + License.company_name + ') expired',
+                    db.literal(now, db.DateTime),
+                ).where(chunk)
+            )
+        )
+        expired_licenses += db.session.execute(
+            db.update(License).where(chunk).values(is_active=False, expired_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+
+    return expired_subscriptions, expired_licenses
+
+
+# ==================
+# Activity Log Rotation
+# ==================
+
+
+def activity_log_rotation():
+    return LogRotation(ActivityLog.__tablename__, 'timestamp', current_app.config['ACTIVITY_LOG_ARCHIVE_DIR'])
+
+
+def activity_hot_since(now=None):
+    """Oldest timestamp still kept in the hot activity_log table"""
+    return add_months(month_start(now or datetime.utcnow()), -(current_app.config['ACTIVITY_LOG_HOT_MONTHS'] - 1))
+
+
+def rotate_activity_log(now=None):
+    """
+    Detach (PostgreSQL partitions) or move (chunked, SQLite) months that left
+    the hot window into activity_log_YYYYMM tables, and archive month tables
+    past the retention window to compressed files.
+    """
+    return activity_log_rotation().rotate(
+        db.engine, now=now,
+        hot_months=current_app.config['ACTIVITY_LOG_HOT_MONTHS'],
+        retention_months=current_app.config['ACTIVITY_LOG_RETENTION_MONTHS'],
+        chunk_size=current_app.config['ACTIVITY_LOG_ROTATE_CHUNK_SIZE'],
+    )
+
+
+def partition_activity_log():
+    """One-time conversion of activity_log into monthly PostgreSQL partitions"""
+    converted = activity_log_rotation().partition(db.engine)
+    if converted:
+        # Recreate the model's indexes on the new partitioned parent
+        upgrade_schema()
+    return converted
+
+
+def search_activity_archive(since=None, until=None, contains=None, **equals):
+    """Query archived activity_log months (DataFrame)"""
+    return activity_log_rotation().search_archive(since, until, contains, **equals)
 
 
+# ==================
+# Auto-Renew Billing
+# ==================
+
+
+def run_billing(chunk_size=200, now=None):
+    """
+    Bill every auto-renewing subscription whose next_billing_date has passed.
+
+    For each due subscription this creates a pending Payment, extends the
+    end and next billing dates by one plan period, writes a RenewalLog row,
+    and queues the invoice PDF. Due rows are read through the
+    next_billing_date index one chunk at a time, and each chunk commits
+    once.
+
+    A subscription is billed once per cycle: advancing next_billing_date
+    in the same transaction takes it out of the due set. Its invoice number
+    is derived from the subscription and cycle date, so a concurrent run
+    fails the chunk on the unique invoice_number instead of billing twice.
+    On PostgreSQL, due rows are also locked with SKIP LOCKED.
+
+    A subscription that is several cycles overdue stays in the due set
+    until it is caught up, so one run bills every missed cycle (one Payment
+    each). An auto-renewing subscription the expiry sweeper marked
+    'expired' is billed too, and becomes 'active' again once its end date
+    is back in the future.
+
+    Returns the number of subscriptions billed.
+    """
+    now = now or datetime.utcnow()
+    due = db.and_(
+        Subscription.next_billing_date <= now,
+        Subscription.auto_renew == True,
+        Subscription.status.in_(['active', 'expired']),
+        Subscription.plan_type.in_(list(PLAN_PERIOD_DAYS)),
+    )
+
+    billed = 0
+    while True:
+        subscriptions = db.session.scalars(
+            db.select(Subscription).where(due)
+            .order_by(Subscription.next_billing_date)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not subscriptions:
+            break
+
+        payments = []
+        for sub in subscriptions:
+            cycle = sub.next_billing_date
+            payments.append(Payment(
+                client_id=sub.client_id,
+                subscription_id=sub.id,
+                license_id=sub.license_id,
+                amount=sub.amount,
+                currency=sub.currency,
+                payment_method='auto-renew',
+                payment_date=cycle,
+                payment_for=f'{sub.plan_name} renewal ({cycle:%d-%m-%Y})',
+                invoice_number=f'INV-{cycle.year}-AR{sub.id}-{cycle:%Y%m%d}',
+                status='pending',
+                created_at=now,
+                created_by='auto-renew',
+            ))
+        db.session.add_all(payments)
+        db.session.flush()
+
+        renewals = []
+        for sub, payment in zip(subscriptions, payments):
+            period = timedelta(days=PLAN_PERIOD_DAYS[sub.plan_type])
+            old_end = sub.end_date
+            sub.end_date = old_end + period
+            sub.next_billing_date = sub.next_billing_date + period
+            if sub.status == 'expired' and sub.end_date > now:
+                sub.status = 'active'
+            renewals.append({
+                'client_id': sub.client_id,
+                'license_id': sub.license_id,
+                'subscription_id': sub.id,
+                'old_expiry_date': old_end,
+                'new_expiry_date': sub.end_date,
+                'renewal_type': 'subscription_renewal',
+                'amount': sub.amount,
+                'payment_id': payment.id,
+                'renewed_by': 'auto-renew',
+                'renewal_date': now,
+                'notes': f'Billing cycle {payment.payment_date:%Y-%m-%d}',
+            })
+        db.session.execute(db.insert(RenewalLog), renewals)
+        db.session.commit()
+
+        invoice_queue.enqueue(current_app._get_current_object(), generate_billing_invoices, [p.id for p in payments])
+        billed += len(subscriptions)
+
+    if billed:
+        publish_renewals(now, billed)
+    return billed
+
+
+def generate_billing_invoices(payment_ids):
+    """Render invoice PDFs and unpaid Invoice rows for auto-renew payments"""
+    from utils.invoice_generator import InvoiceGenerator
+
+    generator = InvoiceGenerator()
+    payments = Payment.query.filter(Payment.id.in_(payment_ids)).all()
+    clients = {c.id: c for c in Client.query.filter(Client.id.in_({p.client_id for p in payments}))}
+
+    for payment in payments:
+        data = build_invoice_data(payment, clients[payment.client_id])
+        payment.invoice_path = generator.generate_invoice(data)
+        payment.invoice_generated = True
+        db.session.add(Invoice(
+            invoice_number=payment.invoice_number,
+            invoice_date=payment.payment_date,
+            due_date=payment.payment_date,
+            client_id=payment.client_id,
+            payment_id=payment.id,
+            subtotal=data['subtotal'],
+            tax_rate=data['tax_rate'],
+            tax_amount=data['tax_amount'],
+            total_amount=data['total'],
+            items=json.dumps(data['items']),
+            status='unpaid',
+            pdf_path=payment.invoice_path,
+        ))
+    db.session.commit()
+
+
+# ==================
+# API Traffic Rollups
+# ==================
+
+TRAFFIC_KEY = ('bucket', 'endpoint', 'event', 'reason', 'license_id', 'product_name')
+TRAFFIC_EVENTS = ('verification', 'activation', 'denial', 'login')
+
 
+TRAFFIC_OUTCOMES = {'verification': 'valid', 'activation': 'activated', 'login': 'login'}
+
+
+def record_traffic(kind, reason='', license=None):
+    """Count one API event in the current hour's rollup bucket and announce it to live dashboards"""
+    traffic_buffer.add((
+        hour_bucket(datetime.utcnow()), request.path, kind, reason,
+        license.id if license else 0, license.product_name if license else '',
+    ))
+    metrics.API_OUTCOMES.labels(endpoint=request.path, outcome=reason or TRAFFIC_OUTCOMES[kind]).inc()
+    publish_event(kind, reason=reason, company=license.company_name if license else None,
+                  product=license.product_name if license else None)
+
+
+def flush_traffic_rollups():
+    """Add the buffered counters to TrafficRollup in one upsert batch"""
+    counts = traffic_buffer.drain()
+    if not counts:
+        return 0
+    stmt = increment_on_conflict(TrafficRollup.__table__, TRAFFIC_KEY, 'count', db.engine.dialect.name)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(stmt, [dict(zip(TRAFFIC_KEY, key), count=count) for key, count in counts.items()])
+    except Exception:
+        traffic_buffer.merge(counts)
+        raise
+    return len(counts)
+
+
+@api_bp.after_request
+def write_through_traffic(response):
+    """Flush rollups at the end of each API request unless a periodic flusher runs"""
+    if not current_app.config['ROLLUP_FLUSH_INTERVAL'] and len(traffic_buffer):
+        try:
+            flush_traffic_rollups()
+        except Exception as e:
+            print(f"Traffic rollup flush failed: {e}")
+    return response
+
+
+def traffic_totals(since, until=None):
+    """{event: count} and {reason: count} over [since, until) from the rollups"""
+    query = db.session.query(TrafficRollup.event, TrafficRollup.reason, db.func.sum(TrafficRollup.count)) \
+        .filter(TrafficRollup.bucket >= since)
+    if until:
+        query = query.filter(TrafficRollup.bucket < until)
+    events = dict.fromkeys(TRAFFIC_EVENTS, 0)
+    reasons = {}
+    for kind, reason, count in query.group_by(TrafficRollup.event, TrafficRollup.reason):
+        events[kind] = events.get(kind, 0) + count
+        if kind == 'denial':
+            reasons[reason] = count
+    return events, dict(sorted(reasons.items(), key=lambda item: -item[1]))
+
+
+@admin_bp.route('/admin/reports/traffic')
+@login_required
+def traffic_report():
+    """Daily API traffic, per product and top licenses, from the hourly rollups"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    since = hour_bucket(datetime.utcnow()).replace(hour=0) - timedelta(days=days - 1)
+
+    daily = {}
+    rows = db.session.query(TrafficRollup.bucket, TrafficRollup.event, db.func.sum(TrafficRollup.count)) \
+        .filter(TrafficRollup.bucket >= since) \
+        .group_by(TrafficRollup.bucket, TrafficRollup.event)
+    for bucket, kind, count in rows:
+        day = daily.setdefault(bucket.date(), dict.fromkeys(TRAFFIC_EVENTS, 0))
+        day[kind] = day.get(kind, 0) + count
+
+    by_product = {}
+    rows = db.session.query(TrafficRollup.product_name, TrafficRollup.event, db.func.sum(TrafficRollup.count)) \
+        .filter(TrafficRollup.bucket >= since) \
+        .group_by(TrafficRollup.product_name, TrafficRollup.event)
+    for product, kind, count in rows:
+        by_product.setdefault(product or 'Unknown', dict.fromkeys(TRAFFIC_EVENTS, 0))[kind] = count
+
+    verified = db.func.sum(TrafficRollup.count).label('verified')
+    top_licenses = db.session.query(License.license_key, License.company_name, verified) \
+        .join(License, License.id == TrafficRollup.license_id) \
+        .filter(TrafficRollup.bucket >= since,
+                TrafficRollup.event.in_(['verification', 'activation'])) \
+        .group_by(License.license_key, License.company_name) \
+        .order_by(verified.desc()).limit(10).all()
+
+    totals, denial_reasons = traffic_totals(since)
+    return render_template(
+        'traffic.html',
+        days=days,
+        totals=totals,
+        denial_reasons=denial_reasons,
+        daily=sorted(daily.items(), reverse=True),
+        by_product=sorted(by_product.items()),
+        top_licenses=top_licenses,
+    )
+
+
+# ==================
+# Prometheus Metrics
+# ==================
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.REQUEST_LATENCY.labels(
+            method=request.method, endpoint=request.endpoint or 'unmatched', status=response.status_code,
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+def inventory_counts():
+    """(active unexpired licenses, active devices) for the inventory gauges"""
+    licenses = License.query.filter(License.is_active == True, License.expiry_date >= datetime.utcnow()).count()
+    devices = DeviceAccess.query.filter_by(is_active=True).count()
+    return licenses, devices
+
+
+@api_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return 'Unauthorized', 401
+    metrics.refresh_inventory(inventory_counts)
+    body, content_type = metrics.render_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+
+# ==================
+# ROUTES - Time Series API (dashboard charts)
+# ==================
 
+# metric -> TrafficRollup events summed into it; revenue comes from payments
+TIMESERIES_EVENTS = {
+    'verifications': ('verification', 'activation'),
+    'new_devices': ('activation',),
+    'denials': ('denial',),
+    'logins': ('login',),
+}
+TIMESERIES_METRICS = tuple(TIMESERIES_EVENTS) + ('revenue',)
+TIMESERIES_MAX_POINTS = 2000
+# Longest [start, end) range (hourly buckets are built for all of it), and
+# the dates accepted at all (well inside what pandas timestamps can hold)
+TIMESERIES_MAX_SPAN = timedelta(days=1100)
+TIMESERIES_EARLIEST = datetime(1970, 1, 1)
+TIMESERIES_LATEST = datetime(2200, 1, 1)
+
+
+def parse_utc(value):
+    """ISO date/datetime as naive UTC (aware values are converted)"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def metric_series(metric, start, end):
+    """Zero-filled bucket series for `metric` over [start, end)"""
+    from utils.timeseries import fill_buckets
+
+    if metric == 'revenue':
+        day = db.func.date(Payment.payment_date)
+        rows = db.session.query(day, db.func.sum(Payment.amount)) \
+            .filter(Payment.status == 'completed', Payment.payment_date >= start, Payment.payment_date < end) \
+            .group_by(day).all()
+        return fill_buckets([row[0] for row in rows], [row[1] for row in rows], start.date(), end, 'D'), 'day'
+
+    rows = db.session.query(TrafficRollup.bucket, db.func.sum(TrafficRollup.count)) \
+        .filter(TrafficRollup.event.in_(TIMESERIES_EVENTS[metric]),
+                TrafficRollup.bucket >= start, TrafficRollup.bucket < end) \
+        .group_by(TrafficRollup.bucket).all()
+    return fill_buckets([row[0] for row in rows], [row[1] for row in rows], hour_bucket(start), end, 'h'), 'hour'
+
+
+@admin_bp.route('/admin/api/timeseries')
+@login_required
+def timeseries_api():
+    """
+    Chart data for one metric over [start, end), read from the hourly
+    rollups (daily payment sums for revenue) and downsampled with LTTB
+    to at most `points` points.
+    """
+    metric = request.args.get('metric', 'verifications')
+    if metric not in TIMESERIES_METRICS:
+        return jsonify({'success': False, 'message': f'Unknown metric: {metric}'}), 400
 
+    try:
+        end = parse_utc(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        start = parse_utc(request.args['start']) if request.args.get('start') else end - timedelta(days=30)
+    except (ValueError, OverflowError):
+        return jsonify({'success': False, 'message': 'start / end must be ISO dates'}), 400
+    if not TIMESERIES_EARLIEST <= start < end <= TIMESERIES_LATEST:
+        return jsonify({'success': False, 'message': f'start must be before end, both between '
+                        f'{TIMESERIES_EARLIEST.date()} and {TIMESERIES_LATEST.date()}'}), 400
+    if end - start > TIMESERIES_MAX_SPAN:
+        return jsonify({'success': False,
+                        'message': f'Range is limited to {TIMESERIES_MAX_SPAN.days} days'}), 400
+    points = min(max(request.args.get('points', 300, type=int), 3), TIMESERIES_MAX_POINTS)
+
+    from utils.timeseries import downsample
+    series, bucket = metric_series(metric, start, end)
+    return jsonify({
+        'success': True,
+        'metric': metric,
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total': float(series.sum()),
+        'raw_points': len(series),
+        'points': downsample(series, points),
+    })
 
 
 # ==================
 # API - License Verification (for GTMS Desktop App)
 # ==================
 
-@app.route('/api/verify-license', methods=['POST'])
+@api_bp.route('/api/verify-license', methods=['POST'])
 def verify_license_api():
     """Verify license key and hardware ID - used by GTMS app"""
     try:
@@ -1610,18 +2822,25 @@ def verify_license_api():
         hardware_id = data.get('hardware_id')
         
         if not license_key or not hardware_id:
+            record_traffic('denial', 'missing_fields')
             return jsonify({'valid': False, 'message': 'Missing license key or hardware ID'}), 400
         
-        # Find license
-        license = License.query.filter_by(license_key=license_key).first()
+        # Find license (shared cache; the device checks below always hit the database)
+        license = cached_license(license_key)
         
         if not license:
+            record_traffic('denial', 'invalid_key')
             return jsonify({'valid': False, 'message': 'Invalid license key'}), 404
         
         if not license.is_active:
+            if license.expired_at:
+                record_traffic('denial', 'expired', license)
+                return jsonify({'valid': False, 'message': 'License has expired'}), 403
+            record_traffic('denial', 'deactivated', license)
             return jsonify({'valid': False, 'message': 'License has been deactivated'}), 403
         
         if license.expiry_date < datetime.utcnow():
+            record_traffic('denial', 'expired', license)
             return jsonify({'valid': False, 'message': 'License has expired'}), 403
         
         # Check/register device
@@ -1631,10 +2850,12 @@ def verify_license_api():
             device.last_access = datetime.utcnow()
             device.access_count += 1
             device.is_active = True
+            event = 'verification'
         else:
             # Check device limit
             active_devices = DeviceAccess.query.filter_by(license_id=license.id, is_active=True).count()
             if active_devices >= license.max_devices:
+                record_traffic('denial', 'device_limit', license)
                 return jsonify({'valid': False, 'message': f'Device limit reached ({license.max_devices} max)'}), 403
             
             device = DeviceAccess(
@@ -1643,8 +2864,11 @@ def verify_license_api():
                 ip_address=request.remote_addr
             )
             db.session.add(device)
+            event = 'activation'
         
         db.session.commit()
+        # Counted only once committed: a failed commit is counted as an error below
+        record_traffic(event, license=license)
         
         days_remaining = (license.expiry_date - datetime.utcnow()).days
         
@@ -1663,16 +2887,17 @@ def verify_license_api():
         })
         
     except Exception as e:
+        record_traffic('denial', 'error')
         return jsonify({'valid': False, 'message': str(e)}), 500
 
 
-@app.route('/api/activate-license', methods=['POST'])
+@api_bp.route('/api/activate-license', methods=['POST'])
 def activate_license_api():
     """Activate license - same as verify"""
     return verify_license_api()
 
 
-@app.route('/api/deactivate-license', methods=['POST'])
+@api_bp.route('/api/deactivate-license', methods=['POST'])
 def deactivate_license_api():
     """Deactivate license on specific hardware"""
     try:
@@ -1681,7 +2906,7 @@ def deactivate_license_api():
         hardware_id = data.get('hardware_id')
         
         if license_key and hardware_id:
-            license = License.query.filter_by(license_key=license_key).first()
+            license = cached_license(license_key)
             if license:
                 device = DeviceAccess.query.filter_by(license_id=license.id, hardware_id=hardware_id).first()
                 if device:
@@ -1697,7 +2922,7 @@ def deactivate_license_api():
 # API - GTMS User Login (NEW!)
 # ==================
 
-@app.route('/api/login', methods=['POST'])
+@api_bp.route('/api/login', methods=['POST'])
 def api_login():
     """
     ✅ NEW API endpoint for GTMS user login
@@ -1709,6 +2934,7 @@ def api_login():
         password = data.get('password')
         
         if not username or not password:
+            record_traffic('denial', 'missing_fields')
             return jsonify({'success': False, 'message': 'Username and password required'}), 400
         
         # Hash password with SHA-256
@@ -1718,14 +2944,17 @@ def api_login():
         user = GTMSUser.query.filter_by(username=username).first()
         
         if not user:
+            record_traffic('denial', 'invalid_credentials')
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         # Check password
         if user.password_hash != password_hash:
+            record_traffic('denial', 'invalid_credentials', user.license)
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         # Check if user is active
         if not user.is_active:
+            record_traffic('denial', 'account_disabled', user.license)
             return jsonify({'success': False, 'message': 'Account is disabled'}), 403
         
         # Update last login
@@ -1740,6 +2969,7 @@ def api_login():
         )
         db.session.add(log)
         db.session.commit()
+        record_traffic('login', license=user.license)
         
         # Return user data
         return jsonify({
@@ -1758,6 +2988,7 @@ def api_login():
         
     except Exception as e:
         print(f"Login API Error: {str(e)}")
+        record_traffic('denial', 'error')
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
@@ -1765,7 +2996,7 @@ def api_login():
 # API - User Login Validation (OLD - for backward compatibility)
 # ==================
 
-@app.route('/api/validate', methods=['POST'])
+@api_bp.route('/api/validate', methods=['POST'])
 def validate_login():
     """Validate user login from GTMS application (with license check)"""
     try:
@@ -1777,21 +3008,29 @@ def validate_login():
         user = GTMSUser.query.filter_by(username=username).first()
         
         if not user or not user.is_active:
+            record_traffic('denial', 'invalid_credentials')
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         password_hash = hashlib.sha256(password.encode()).hexdigest()
         if user.password_hash != password_hash:
+            record_traffic('denial', 'invalid_credentials', user.license)
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         if not user.license or not user.license.is_active:
+            if user.license and user.license.expired_at:
+                record_traffic('denial', 'expired', user.license)
+                return jsonify({'success': False, 'message': 'License expired'}), 403
+            record_traffic('denial', 'no_license', user.license)
             return jsonify({'success': False, 'message': 'No active license'}), 403
         
         if user.license.expiry_date < datetime.utcnow():
+            record_traffic('denial', 'expired', user.license)
             return jsonify({'success': False, 'message': 'License expired'}), 403
         
         active_devices = DeviceAccess.query.filter_by(license_id=user.license_id, is_active=True).count()
         
         device = DeviceAccess.query.filter_by(user_id=user.id, hardware_id=hardware_id).first()
+        activated = device is None
         
         if device:
             device.last_access = datetime.utcnow()
@@ -1799,6 +3038,7 @@ def validate_login():
             device.is_active = True
         else:
             if active_devices >= user.license.max_devices:
+                record_traffic('denial', 'device_limit', user.license)
                 return jsonify({'success': False, 'message': f'Device limit reached ({user.license.max_devices} max)'}), 403
             
             device = DeviceAccess(
@@ -1820,6 +3060,10 @@ def validate_login():
         db.session.add(log)
         
         db.session.commit()
+        # Counted only once committed: a failed commit is counted as an error below
+        if activated:
+            record_traffic('activation', license=user.license)
+        record_traffic('login', license=user.license)
         
         return jsonify({
             'success': True,
@@ -1839,6 +3083,7 @@ def validate_login():
         })
         
     except Exception as e:
+        record_traffic('denial', 'error')
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
@@ -1846,26 +3091,142 @@ def validate_login():
 # Initialization
 # ==================
 
+def upgrade_schema():
+    """
+    Create missing tables, then add any columns and indexes that were added
+    to existing models after their tables were created. New columns on
+    existing models must be nullable.
+    """
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(db.text(
+                        f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'
+                    ))
+            # IF NOT EXISTS rather than checkfirst: SQLite does not reflect
+            # expression indexes such as lower(name)
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        for name in OBSOLETE_INDEXES:
+            conn.execute(db.text(f'DROP INDEX IF EXISTS {quote(name)}'))
+
+
 def init_db():
-    """Initialize database"""
-    with app.app_context():
-        db.create_all()
-        
-        if not AdminUser.query.filter_by(username='admin').first():
-            admin = AdminUser(username='admin', email='admin@gtms.com')
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ Default admin created: admin / admin123")
-
-@app.route('/create-tables')
+    """Initialize database (inside an app context)"""
+    upgrade_schema()
+
+    if not AdminUser.query.filter_by(username='admin').first():
+        admin = AdminUser(username='admin', email='admin@gtms.com')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        print("✅ Default admin created: admin / admin123")
+
+@admin_bp.route('/create-tables')
 def create_tables():
-    db.create_all()
+    upgrade_schema()
     return "Tables created successfully!"
 
+
+# ==================
+# Application Factory
+# ==================
+
+PROFILES = ('full', 'api')
+
+
+def create_app(profile=None, config=None):
+    """
+    Build the Flask app.
+
+    'full' (default) serves the admin panel and the API. 'api' serves only
+    the license API and /metrics: it never imports flask_mail, reportlab or
+    pandas and registers no admin routes, so API-only workers start faster.
+    The profile can also be set with GTMS_PROFILE.
+    """
+    profile = profile or os.environ.get('GTMS_PROFILE', 'full')
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown profile {profile!r}; expected one of {PROFILES}')
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(config or {})
+    app.config['PROFILE'] = profile
+
+    db.init_app(app)
+    with app.app_context():
+        metrics.instrument_engine(db.engine)
+
+    app.before_request(start_request_timer)
+    app.after_request(observe_request_latency)
+    if app.config['PROFILING_ENABLED']:
+        RequestProfiler(app)
+
+    shared_cache.init_app(app)
+    fragment_cache.init_app(app)
+    compression.init_app(app)
+
+    app.register_blueprint(api_bp)
+    if profile == 'full':
+        from flask_mail import Mail
+        Mail(app)
+        assets.init_app(app)
+        app.register_blueprint(admin_bp)
+
+    start_periodic_tasks(app)
+    return app
+
+
+def start_periodic_tasks(app):
+    """
+    In-process expiry sweeper, billing run, rollup flusher and log rotation.
+    Leave the intervals at 0 and run sweep_expired.py / billing_run.py /
+    rotate_activity_log.py from cron when running several workers.
+    """
+    if app.config['EXPIRY_SWEEP_INTERVAL']:
+        PeriodicTask(
+            app, 'expiry-sweeper', app.config['EXPIRY_SWEEP_INTERVAL'],
+            expire_lapsed, chunk_size=app.config['EXPIRY_SWEEP_CHUNK_SIZE']
+        ).start()
+
+    if app.config['BILLING_RUN_INTERVAL']:
+        PeriodicTask(
+            app, 'billing-run', app.config['BILLING_RUN_INTERVAL'],
+            run_billing, chunk_size=app.config['BILLING_CHUNK_SIZE']
+        ).start()
+
+    if app.config['ROLLUP_FLUSH_INTERVAL']:
+        PeriodicTask(app, 'traffic-rollups', app.config['ROLLUP_FLUSH_INTERVAL'], flush_traffic_rollups).start()
+
+    if app.config['ACTIVITY_LOG_ROTATE_INTERVAL']:
+        PeriodicTask(app, 'activity-log-rotation', app.config['ACTIVITY_LOG_ROTATE_INTERVAL'], rotate_activity_log).start()
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    """`from app import app` (scripts, gunicorn app:app) builds the default app on first use"""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == '__main__':
     os.makedirs('database', exist_ok=True)
-    init_db()
+    app = create_app()
+    print("USING DATABASE:", app.config['SQLALCHEMY_DATABASE_URI'])
+    with app.app_context():
+        init_db()
     
     print("=" * 60)
     print("🚀 GTMS License Server Starting...")
@@ -0,0 +1,116 @@
+"""
+Startup benchmark: how long a fresh worker takes before it can serve.
+
+    python bench_startup.py
+    python bench_startup.py --runs 20 --profile api
+
+For each profile, every run starts a new Python process (so nothing is
+cached in sys.modules) that times:
+
+    import   `import app`
+    create   create_app(profile)
+    first    the first POST /api/verify-license through the test client
+    total    all three
+
+The database is a SQLite file under the system temp directory whose schema
+is created once up front, so DDL is not part of the measurement. Reports the
+median and worst run per profile, plus the heavy modules each profile
+ended up importing.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ('pandas', 'numpy', 'reportlab', 'flask_mail')
+PHASES = ('import', 'create', 'first', 'total')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app(sys.argv[1])
+created = time.perf_counter()
+response = app.test_client().post('/api/verify-license', json={'license_key': 'BENCH', 'hardware_id': 'BENCH'})
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create': created - imported,
+    'first': served - created,
+    'total': served - started,
+    'status': response.status_code,
+    'heavy': [name for name in %r if name in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure app import time and time to first request')
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes per profile')
+    parser.add_argument('--profile', action='append', help='profile to measure (default: all)')
+    parser.add_argument('--json', help='write the results to this file')
+    return parser.parse_args()
+
+
+def prepare_database(path):
+    """Create the schema once so runs measure startup, not DDL"""
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}')
+    subprocess.run(
+        [sys.executable, '-c', 'from app import create_app, upgrade_schema\n'
+                               'with create_app("api").app_context(): upgrade_schema()'],
+        env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return env
+
+
+def run_once(profile, env):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, profile], env=env, check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    from app import PROFILES
+    profiles = args.profile or list(PROFILES)
+
+    path = os.path.join(tempfile.gettempdir(), 'gtms_bench_startup.db')
+    env = prepare_database(path)
+    # Periodic tasks would start threads in every child; keep them off
+    env.update(EXPIRY_SWEEP_INTERVAL='0', BILLING_RUN_INTERVAL='0',
+               ROLLUP_FLUSH_INTERVAL='0', ACTIVITY_LOG_ROTATE_INTERVAL='0')
+
+    results = {}
+    print(f"{'profile':8} {'phase':7} {'median ms':>10} {'max ms':>8}")
+    for profile in profiles:
+        runs = [run_once(profile, env) for _ in range(args.runs)]
+        if any(run['status'] >= 500 for run in runs):
+            print(f"✗ {profile}: first request failed with {runs[0]['status']}")
+        results[profile] = {
+            phase: {
+                'median_ms': statistics.median(run[phase] for run in runs) * 1000,
+                'max_ms': max(run[phase] for run in runs) * 1000,
+            }
+            for phase in PHASES
+        }
+        results[profile]['heavy_modules'] = runs[0]['heavy']
+        for phase in PHASES:
+            row = results[profile][phase]
+            print(f"{profile:8} {phase:7} {row['median_ms']:>10.1f} {row['max_ms']:>8.1f}")
+        print(f"{'':8} heavy modules loaded: {', '.join(runs[0]['heavy']) or 'none'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results saved to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
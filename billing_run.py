@@ -0,0 +1,32 @@
+"""
+Bill auto-renewing subscriptions that are due; meant to be run from cron.
+
+    python billing_run.py [--chunk-size 200]
+
+Each due subscription gets a pending Payment, is extended by one plan
+period, and gets a RenewalLog entry and an invoice. Re-running is safe:
+a billing cycle is never charged twice.
+"""
+
+import argparse
+
+from app import app, run_billing
+from utils.job_queue import invoice_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run auto-renew billing for due subscriptions')
+    parser.add_argument('--chunk-size', type=int, default=app.config['BILLING_CHUNK_SIZE'],
+                        help='subscriptions per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        billed = run_billing(chunk_size=args.chunk_size)
+
+    # Invoices render in the background; wait for them before exiting
+    invoice_queue.join()
+    print(f"✓ Billed {billed} subscriptions")
+
+
+if __name__ == '__main__':
+    main()
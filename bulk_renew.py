@@ -0,0 +1,61 @@
+"""
+Extend a filtered set of licenses or subscriptions from the command line.
+
+    python bulk_renew.py licenses --days 30 --client-id 4 --expiring-within 15
+    python bulk_renew.py subscriptions --days 365 --plan-type yearly --status active
+
+Runs the same set-based renewal as the admin panel: one UPDATE for the
+matching rows plus one INSERT ... SELECT into RenewalLog.
+"""
+
+import argparse
+
+from app import (
+    app, renew_licenses, renew_subscriptions,
+    license_renewal_filters, subscription_renewal_filters,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-extend licenses or subscriptions')
+    parser.add_argument('target', choices=['licenses', 'subscriptions'])
+    parser.add_argument('--days', type=int, required=True, help='days to add to the expiry / end date')
+    parser.add_argument('--ids', type=int, nargs='*', help='only these license / subscription ids')
+    parser.add_argument('--client-id', type=int)
+    parser.add_argument('--plan-type')
+    parser.add_argument('--expiring-within', type=int, help='only rows expiring within N days')
+    parser.add_argument('--product-name', help='licenses only')
+    parser.add_argument('--include-inactive', action='store_true', help='licenses only')
+    parser.add_argument('--status', help='subscriptions only, e.g. active')
+    parser.add_argument('--renewed-by', default='cli')
+    parser.add_argument('--notes')
+    args = parser.parse_args()
+
+    if args.days <= 0:
+        parser.error('--days must be positive')
+
+    criteria = {
+        'client_id': args.client_id,
+        'plan_type': args.plan_type,
+        'expiring_within': args.expiring_within,
+    }
+
+    with app.app_context():
+        if args.target == 'licenses':
+            criteria.update(
+                license_ids=args.ids,
+                product_name=args.product_name,
+                include_inactive=args.include_inactive,
+            )
+            extended = renew_licenses(args.days, license_renewal_filters(criteria),
+                                      renewed_by=args.renewed_by, notes=args.notes)
+        else:
+            criteria.update(subscription_ids=args.ids, status=args.status)
+            extended = renew_subscriptions(args.days, subscription_renewal_filters(criteria),
+                                           renewed_by=args.renewed_by, notes=args.notes)
+
+    print(f"✓ Extended {extended} {args.target} by {args.days} days")
+
+
+if __name__ == '__main__':
+    main()
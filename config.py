@@ -1,4 +1,12 @@
 import os
+import tempfile
+
+
+def user_runtime_dir():
+    """Per-user directory for files the workers share (created 0700 by their users)"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f'gtms-{os.getuid()}' if hasattr(os, 'getuid') else 'gtms')
+
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-super-secret-key-change-in-production')
@@ -16,6 +24,85 @@ class Config:
     APP_NAME = 'GTMS License Server'
     APP_VERSION = '1.0.0'
 
+    # Expiry sweeper: seconds between in-process runs (0 = disabled, use sweep_expired.py)
+    EXPIRY_SWEEP_INTERVAL = int(os.environ.get('EXPIRY_SWEEP_INTERVAL', 0))
+    EXPIRY_SWEEP_CHUNK_SIZE = 500
+
+    # Auto-renew billing: seconds between in-process runs (0 = disabled, use billing_run.py)
+    BILLING_RUN_INTERVAL = int(os.environ.get('BILLING_RUN_INTERVAL', 0))
+    BILLING_CHUNK_SIZE = 200
+
+    # API traffic rollups: seconds between flushes of the in-process counters
+    # (0 = write through at the end of every API request)
+    ROLLUP_FLUSH_INTERVAL = int(os.environ.get('ROLLUP_FLUSH_INTERVAL', 0))
+
+    # ActivityLog rotation: months kept in the hot table / in the database at all;
+    # older months are archived to ACTIVITY_LOG_ARCHIVE_DIR as .csv.gz files.
+    # Seconds between in-process runs (0 = disabled, use rotate_activity_log.py)
+    ACTIVITY_LOG_HOT_MONTHS = 3
+    ACTIVITY_LOG_RETENTION_MONTHS = 12
+    ACTIVITY_LOG_ARCHIVE_DIR = os.environ.get('ACTIVITY_LOG_ARCHIVE_DIR', 'archives')
+    ACTIVITY_LOG_ROTATE_INTERVAL = int(os.environ.get('ACTIVITY_LOG_ROTATE_INTERVAL', 0))
+    ACTIVITY_LOG_ROTATE_CHUNK_SIZE = 5000
+
+    # Per-request profiling: Server-Timing headers, JSON log lines on the
+    # 'gtms.profiling' logger and a slow-request log with the statements run
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 500))
+    PROFILING_SLOW_LOG = os.environ.get('PROFILING_SLOW_LOG', 'slow_requests.log')
+
+    # Prometheus /metrics; when set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Cache for license verdicts, dashboard counts and admin permissions:
+    # 'local' (per process), 'shared' (memory-mapped file shared by every
+    # process on the host) or 'redis' (CACHE_REDIS_URL). Writes invalidate it
+    # in all workers; the TTLs (seconds) bound staleness from anything else.
+    # Its generations also drive ETags and the revenue snapshot, so every
+    # entry point (server, cron scripts) must use the same backend: 'shared'
+    # is the default wherever it works. In-memory SQLite databases always
+    # get 'local', as no other process can see them.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'shared' if os.name == 'posix' else 'local')
+    CACHE_KEY_PREFIX = 'gtms:'
+    # The shared segment's directory must be private to the server's user
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH', os.path.join(user_runtime_dir(), 'cache'))
+    CACHE_SHARED_SLOTS = 8192
+    CACHE_SHARED_SLOT_SIZE = 1024
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    LICENSE_CACHE_TTL = 300
+    DASHBOARD_CACHE_TTL = 60
+    ADMIN_CACHE_TTL = 300
+
+    # Compiled templates are kept on disk so new workers skip compiling them
+    # (unset = Jinja's private per-user temp directory, '' = off; a directory
+    # set here must be private to the server's user). Fragments in
+    # {% cache %} tags live in the shared cache.
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    FRAGMENT_CACHE_TTL = 3600
+
+    # gzip / brotli (with the brotli package) for text responses of at least
+    # COMPRESS_MIN_SIZE bytes; streamed responses are always compressed.
+    # Levels: gzip 1-9, brotli 0-11.
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_MIMETYPES = (
+        'text/html', 'text/csv', 'text/plain', 'text/css', 'text/javascript',
+        'application/javascript', 'application/json', 'image/svg+xml',
+    )
+
+    # Lifetime of fingerprinted /assets/ URLs (see utils/assets.py)
+    ASSET_MAX_AGE = 365 * 24 * 3600
+
+    # Live dashboard events (utils/events.py). Empty EVENTS_SOCKET: this
+    # process streams /admin/events itself. Under gunicorn, run
+    # event_server.py (listening on EVENTS_BIND) and route /admin/events to it.
+    EVENTS_SOCKET = os.environ.get('EVENTS_SOCKET', '')
+    EVENTS_BIND = os.environ.get('EVENTS_BIND', '127.0.0.1:5001')
+    EVENTS_BACKLOG = 200
+    EVENTS_HEARTBEAT = 15
+
 
 
     # add these mail settings INSIDE the class, uppercase
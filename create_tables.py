@@ -1,6 +1,6 @@
-from app import app, db
+from app import app, upgrade_schema
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
         print("Tables created successfully.")
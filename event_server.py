@@ -0,0 +1,51 @@
+"""
+Live event server for the admin dashboard (server-sent events).
+
+    python event_server.py [--bind 127.0.0.1:5001] [--socket /tmp/gtms-events.sock]
+
+Run it next to gunicorn: workers send their dashboard events to it as
+datagrams on EVENTS_SOCKET (gunicorn.conf.py sets it), and the reverse
+proxy routes /admin/events here, e.g. for nginx:
+
+    location /admin/events {
+        proxy_pass http://127.0.0.1:5001;
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
+One asyncio thread holds every open dashboard, so an idle dashboard costs
+a socket instead of a gunicorn worker. Admins are recognised by the Flask
+session cookie, so SECRET_KEY must match the app's.
+"""
+
+import argparse
+import asyncio
+
+from flask import Flask
+
+from config import Config
+from utils.events import EventServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve live dashboard events')
+    parser.add_argument('--bind', default=Config.EVENTS_BIND, help='host:port for dashboard connections')
+    parser.add_argument('--socket', default=Config.EVENTS_SOCKET or '/tmp/gtms-events.sock',
+                        help='datagram socket the workers publish to (EVENTS_SOCKET)')
+    args = parser.parse_args()
+
+    # Only for the session cookie settings and signature; no database or routes
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(Config)
+
+    host, _, port = args.bind.rpartition(':')
+    server = EventServer(flask_app, args.socket)
+    print(f"✓ Serving dashboard events on {args.bind}, receiving on {args.socket}")
+    try:
+        asyncio.run(server.serve(host or '127.0.0.1', int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
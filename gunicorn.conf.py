@@ -0,0 +1,40 @@
+"""
+gunicorn settings for the license server.
+
+    gunicorn -c gunicorn.conf.py app:app
+    GTMS_PROFILE=api gunicorn -c gunicorn.conf.py app:app   # license API only
+
+Enables Prometheus multi-process mode: every worker writes its metric
+samples to PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them. The
+directory is emptied when gunicorn starts and dead workers are marked so
+their live gauges stop counting.
+
+Workers share one memory-mapped cache (CACHE_BACKEND=shared, the default)
+so an invalidation in one worker reaches all of them; it is recreated empty
+when gunicorn starts. Set CACHE_BACKEND=redis to share it across hosts.
+
+Live dashboard events go to event_server.py over EVENTS_SOCKET; run it
+alongside and route /admin/events to it (see its docstring).
+"""
+
+import os
+import shutil
+
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/gtms-prometheus')
+os.environ.setdefault('EVENTS_SOCKET', '/tmp/gtms-events.sock')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+
+def on_starting(server):
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+    from config import Config
+    if Config.CACHE_BACKEND == 'shared' and os.path.exists(Config.CACHE_SHARED_PATH):
+        os.remove(Config.CACHE_SHARED_PATH)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
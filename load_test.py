@@ -0,0 +1,326 @@
+"""
+Load test: simulate a fleet of GTMS desktops against the license API.
+
+    python load_test.py --desktops 50 --duration 30
+    python load_test.py --database-url postgresql+psycopg2://... --json results.json
+    python load_test.py --url http://staging:5000 --desktops 200 --baseline results.json
+
+Each virtual desktop has its own license_key, hardware_id and GTMS user
+(created on first run with a LOADTEST- prefix) and loops over a weighted mix
+of /api/verify-license, /api/validate, /api/login and
+/api/deactivate-license. Without --url the app is started in-process on a
+threaded local server against --database-url (default: a SQLite file under
+the system temp directory), so SQL statements per request can be counted too.
+With --url, run once in-process against the target's database first so the
+LOADTEST- licenses and users exist there.
+
+Reports throughput, p50/p95/p99 latency and errors per endpoint. --json
+saves the report; --baseline compares against a saved one.
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import numpy as np
+
+KEY_PREFIX = 'LOADTEST-'
+PASSWORD = 'loadtest'
+
+# Share of calls per endpoint; desktops verify on start-up and then mostly re-verify
+MIX = {
+    '/api/verify-license': 70,
+    '/api/validate': 15,
+    '/api/login': 10,
+    '/api/deactivate-license': 5,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulate GTMS desktops against the license API')
+    parser.add_argument('--desktops', type=int, default=20, help='virtual desktops (one thread each)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run, after the warm-up')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds excluded from the report')
+    parser.add_argument('--think', type=float, default=0, help='milliseconds each desktop waits between calls')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the call mix')
+    parser.add_argument('--url', help='test a running server instead of starting the app in-process')
+    parser.add_argument('--database-url', help='database for the in-process app (default: SQLite temp file)')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='compare with a report saved by --json')
+    return parser.parse_args()
+
+
+# ---- fixtures ----
+
+def desktop_identity(n):
+    return {
+        'license_key': f'{KEY_PREFIX}{n:06d}',
+        'hardware_id': f'LOADTEST-HW-{n:06d}',
+        'username': f'loadtest-{n:06d}',
+    }
+
+
+def ensure_desktops(count):
+    """Create the licenses and users the virtual desktops log in with"""
+    from datetime import datetime, timedelta
+    from app import db, upgrade_schema, License, GTMSUser, DeviceAccess
+
+    upgrade_schema()
+    existing = {key for (key,) in db.session.query(License.license_key)
+                .filter(License.license_key.like(f'{KEY_PREFIX}%'))}
+    now = datetime.utcnow()
+    missing = [n for n in range(count) if desktop_identity(n)['license_key'] not in existing]
+    if missing:
+        db.session.execute(db.insert(License), [{
+            'license_key': desktop_identity(n)['license_key'],
+            'company_name': f'Load Test {n:06d}',
+            'product_name': 'GTMS',
+            'max_users': 5,
+            'max_devices': 3,
+            'activation_date': now,
+            'expiry_date': now + timedelta(days=3650),
+            'created_at': now,
+            'is_active': True,
+        } for n in missing])
+        license_ids = dict(db.session.query(License.license_key, License.id)
+                           .filter(License.license_key.like(f'{KEY_PREFIX}%')))
+        password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+        db.session.execute(db.insert(GTMSUser), [{
+            'username': desktop_identity(n)['username'],
+            'password_hash': password_hash,
+            'full_name': f'Load Test {n:06d}',
+            'license_id': license_ids[desktop_identity(n)['license_key']],
+            'is_active': True,
+            'created_at': now,
+        } for n in missing])
+
+    # Start every run from the same state: no devices bound to test licenses
+    db.session.query(DeviceAccess).filter(DeviceAccess.hardware_id.like('LOADTEST-HW-%')) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return len(missing)
+
+
+# ---- in-process server ----
+
+class StatementCounter:
+    """SQL statements per request path, counted with SQLAlchemy cursor events"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        from flask import has_request_context, request
+        if self.active and has_request_context():
+            with self.lock:
+                self.counts[request.path] += 1
+
+
+def start_server(app, counter):
+    """Serve `app` on a free local port from a background thread"""
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+    from app import db
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+    # One access-log line per request would cost more than some requests
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+# ---- virtual desktops ----
+
+class Desktop(threading.Thread):
+    def __init__(self, n, base_url, args, started, stop):
+        super().__init__(name=f'desktop-{n}', daemon=True)
+        self.identity = desktop_identity(n)
+        self.url = urlsplit(base_url)
+        self.think = args.think / 1000.0
+        self.random = random.Random(args.seed * 100003 + n)
+        self.started = started
+        self.stop = stop
+        self.warmup_until = 0.0
+        self.samples = defaultdict(list)  # path -> [seconds]
+        self.errors = Counter()
+        self.connection = None
+
+    def payload(self, path):
+        identity = self.identity
+        if path in ('/api/verify-license', '/api/deactivate-license'):
+            return {'license_key': identity['license_key'], 'hardware_id': identity['hardware_id']}
+        if path == '/api/validate':
+            return {'username': identity['username'], 'password': PASSWORD, 'hardware_id': identity['hardware_id']}
+        return {'username': identity['username'], 'password': PASSWORD}
+
+    def call(self, path):
+        body = json.dumps(self.payload(path))
+        headers = {'Content-Type': 'application/json'}
+        for attempt in (1, 2):
+            if self.connection is None:
+                connection_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+                self.connection = connection_class(self.url.hostname, self.url.port, timeout=30)
+            try:
+                self.connection.request('POST', path, body, headers)
+                response = self.connection.getresponse()
+                response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.connection.close()
+                    self.connection = None
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed an idle keep-alive connection; reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+
+    def run(self):
+        self.started.wait()
+        paths, weights = list(MIX), list(MIX.values())
+        path = '/api/verify-license'
+        while not self.stop.is_set():
+            began = time.perf_counter()
+            try:
+                status = self.call(path)
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - began
+            if began >= self.warmup_until:
+                self.samples[path].append(elapsed)
+                if status != 200:
+                    self.errors[path] += 1
+            path = self.random.choices(paths, weights)[0]
+            if self.think:
+                time.sleep(self.think)
+
+
+def run_load(base_url, args, counter=None):
+    started, stop = threading.Event(), threading.Event()
+    desktops = [Desktop(n, base_url, args, started, stop) for n in range(args.desktops)]
+    for desktop in desktops:
+        desktop.start()
+
+    warmup_until = time.perf_counter() + args.warmup
+    for desktop in desktops:
+        desktop.warmup_until = warmup_until
+    started.set()
+    time.sleep(args.warmup)
+    if counter is not None:
+        counter.active = True
+    time.sleep(args.duration)
+    if counter is not None:
+        counter.active = False
+    stop.set()
+    for desktop in desktops:
+        desktop.join()
+
+    samples, errors = defaultdict(list), Counter()
+    for desktop in desktops:
+        for path, seconds in desktop.samples.items():
+            samples[path].extend(seconds)
+        errors.update(desktop.errors)
+    return samples, errors
+
+
+# ---- report ----
+
+def build_report(args, samples, errors, statements):
+    endpoints = {}
+    for path in MIX:
+        latencies = np.array(samples.get(path, []))
+        if not len(latencies):
+            continue
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        endpoints[path] = {
+            'requests': int(len(latencies)),
+            'errors': int(errors[path]),
+            'rps': len(latencies) / args.duration,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'statements_per_request': statements[path] / len(latencies) if statements is not None else None,
+        }
+    total = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {
+        'desktops': args.desktops,
+        'duration': args.duration,
+        'think_ms': args.think,
+        'target': args.url or 'in-process',
+        'total_rps': total / args.duration,
+        'endpoints': endpoints,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"\n{report['desktops']} desktops, {report['duration']:.0f}s, target {report['target']}")
+    print(f"{'endpoint':26} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'SQL/req':>8}")
+    for path, row in report['endpoints'].items():
+        statements = f"{row['statements_per_request']:.1f}" if row['statements_per_request'] is not None else '-'
+        print(f"{path:26} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {statements:>8}")
+        before = (baseline or {}).get('endpoints', {}).get(path)
+        if before:
+            print(f"{'  vs baseline':26} {'':>9} {'':>7} {change(row['rps'], before['rps']):>9} "
+                  f"{change(row['p50_ms'], before['p50_ms']):>8} {change(row['p95_ms'], before['p95_ms']):>8} "
+                  f"{change(row['p99_ms'], before['p99_ms']):>8}")
+    print(f"{'total':26} {'':>9} {'':>7} {report['total_rps']:>9.1f}")
+    if baseline:
+        print(f"{'  vs baseline':26} {'':>9} {'':>7} {change(report['total_rps'], baseline['total_rps']):>9}")
+
+
+def change(value, before):
+    return f'{(value - before) / before * 100:+.0f}%' if before else '-'
+
+
+def main():
+    args = parse_args()
+    counter = None
+
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        # Must be set before the app is built: Config reads it at import time
+        os.environ['DATABASE_URL'] = args.database_url or \
+            f"sqlite:///{os.path.join(tempfile.gettempdir(), 'gtms_load_test.db')}"
+        from app import app
+        with app.app_context():
+            created = ensure_desktops(args.desktops)
+        print(f"✓ {args.desktops} desktops ready ({created} created) on {os.environ['DATABASE_URL']}")
+        counter = StatementCounter()
+        server, base_url = start_server(app, counter)
+
+    print(f"Running {args.desktops} desktops against {base_url} for {args.warmup:.0f}s + {args.duration:.0f}s ...")
+    samples, errors = run_load(base_url, args, counter)
+    if not args.url:
+        server.shutdown()
+
+    report = build_report(args, samples, errors, counter.counts if counter else None)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report saved to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
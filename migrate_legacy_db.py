@@ -0,0 +1,199 @@
+"""
+Migrate a legacy license_server.db (models.Database schema) into the
+SQLAlchemy database configured for the app (DATABASE_URL).
+
+    python migrate_legacy_db.py --source license_server.db [--chunk-size 5000]
+
+Rows are streamed in primary-key order, one chunk per transaction. The
+last migrated legacy id of each table is committed together with its
+chunk, so the command can be interrupted and re-run: it resumes after the
+last completed chunk and never inserts a row twice. Licenses, admins and
+device bindings are additionally matched on their natural keys, so rows
+that already exist in the target are skipped.
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+
+from app import app, db, License, DeviceAccess, AdminUser, ActivityLog
+from models import LEGACY_DATE_FORMAT
+
+checkpoints = Table(
+    'legacy_migration_checkpoint', MetaData(),
+    Column('table_name', String(50), primary_key=True),
+    Column('last_id', Integer, nullable=False),
+)
+
+SUBSCRIPTION_TYPES = {
+    '1_month': 'monthly',
+    '3_months': 'quarterly',
+    '6_months': 'half_yearly',
+    '1_year': 'yearly',
+}
+
+
+def to_datetime(value):
+    """Legacy date (epoch seconds, or schema-0 local-time TEXT) to naive UTC"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value, LEGACY_DATE_FORMAT).timestamp()
+    return datetime.utcfromtimestamp(value)
+
+
+def stream(source, sql, last_id, chunk_size):
+    """Yield chunks of legacy rows with id > last_id, in id order"""
+    while True:
+        rows = source.execute(sql + ' WHERE id > ? ORDER BY id LIMIT ?', (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def get_checkpoint(table_name):
+    last_id = db.session.execute(
+        select(checkpoints.c.last_id).where(checkpoints.c.table_name == table_name)
+    ).scalar()
+    return last_id or 0
+
+
+def save_checkpoint(table_name, last_id):
+    updated = db.session.execute(
+        checkpoints.update().where(checkpoints.c.table_name == table_name).values(last_id=last_id)
+    ).rowcount
+    if not updated:
+        db.session.execute(checkpoints.insert().values(table_name=table_name, last_id=last_id))
+
+
+def migrate_licenses(source, chunk_size):
+    """licenses -> License, plus a DeviceAccess row for each bound hardware_id"""
+    migrated = devices = 0
+    for rows in stream(source, 'SELECT * FROM licenses', get_checkpoint('licenses'), chunk_size):
+        keys = [row['license_key'] for row in rows]
+        existing = set(db.session.scalars(select(License.license_key).where(License.license_key.in_(keys))))
+
+        new_licenses = [
+            {
+                'license_key': row['license_key'],
+                'company_name': row['customer_name'],
+                'contact_email': row['customer_email'],
+                'product_name': row['product_name'] or 'GTMS',
+                'subscription_type': SUBSCRIPTION_TYPES.get(row['subscription_type'], row['subscription_type']),
+                'max_devices': row['max_activations'] or 1,
+                'activation_date': to_datetime(row['start_date']),
+                'expiry_date': to_datetime(row['expiry_date']),
+                'created_at': to_datetime(row['created_at']),
+                'is_active': bool(row['is_active']),
+                'notes': 'Migrated from license_server.db',
+            }
+            for row in rows if row['license_key'] not in existing
+        ]
+        if new_licenses:
+            db.session.execute(db.insert(License), new_licenses)
+
+        bound = {row['license_key']: row for row in rows if row['hardware_id']}
+        if bound:
+            license_ids = dict(db.session.execute(
+                select(License.license_key, License.id).where(License.license_key.in_(bound))
+            ).all())
+            have_device = set(db.session.execute(
+                select(DeviceAccess.license_id, DeviceAccess.hardware_id)
+                .where(DeviceAccess.license_id.in_(license_ids.values()))
+            ).all())
+            new_devices = [
+                {
+                    'license_id': license_ids[key],
+                    'hardware_id': row['hardware_id'],
+                    'is_active': True,
+                    'first_access': to_datetime(row['start_date']),
+                    'last_access': to_datetime(row['last_validated'] or row['start_date']),
+                    'access_count': 1,
+                }
+                for key, row in bound.items()
+                if (license_ids[key], row['hardware_id']) not in have_device
+            ]
+            if new_devices:
+                db.session.execute(db.insert(DeviceAccess), new_devices)
+                devices += len(new_devices)
+
+        save_checkpoint('licenses', rows[-1]['id'])
+        db.session.commit()
+        migrated += len(new_licenses)
+    return migrated, devices
+
+
+def migrate_activation_logs(source, chunk_size):
+    """activation_logs -> ActivityLog; exactly-once via the checkpoint alone"""
+    migrated = 0
+    for rows in stream(source, 'SELECT * FROM activation_logs', get_checkpoint('activation_logs'), chunk_size):
+        db.session.execute(db.insert(ActivityLog), [
+            {
+                'action': row['action'].lower(),
+                'details': f"{row['license_key']} on {row['hardware_id']}",
+                'ip_address': row['ip_address'],
+                'timestamp': to_datetime(row['timestamp']),
+            }
+            for row in rows
+        ])
+        save_checkpoint('activation_logs', rows[-1]['id'])
+        db.session.commit()
+        migrated += len(rows)
+    return migrated
+
+
+def migrate_admins(source, chunk_size):
+    """admin_users -> AdminUser (no permissions; legacy SHA-256 hashes are kept)"""
+    migrated = 0
+    for rows in stream(source, 'SELECT * FROM admin_users', get_checkpoint('admin_users'), chunk_size):
+        usernames = [row['username'] for row in rows]
+        existing = set(db.session.scalars(select(AdminUser.username).where(AdminUser.username.in_(usernames))))
+        new_admins = [
+            {
+                'username': row['username'],
+                'password_hash': row['password_hash'],
+                'email': row['email'],
+                'role': 'Staff',
+                'is_active': True,
+                'join_date': to_datetime(row['created_at']),
+                'created_at': to_datetime(row['created_at']),
+            }
+            for row in rows if row['username'] not in existing
+        ]
+        if new_admins:
+            db.session.execute(db.insert(AdminUser), new_admins)
+        save_checkpoint('admin_users', rows[-1]['id'])
+        db.session.commit()
+        migrated += len(new_admins)
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate license_server.db into the SQLAlchemy schema')
+    parser.add_argument('--source', default='license_server.db', help='legacy SQLite database')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='rows per transaction')
+    args = parser.parse_args()
+
+    # Read-only, so the legacy file is never upgraded in place by accident
+    source = sqlite3.connect(f'file:{args.source}?mode=ro', uri=True)
+    source.row_factory = sqlite3.Row
+
+    with app.app_context():
+        db.create_all()
+        checkpoints.create(db.engine, checkfirst=True)
+
+        admins = migrate_admins(source, args.chunk_size)
+        print(f"✓ Admin users: {admins} migrated")
+        licenses, devices = migrate_licenses(source, args.chunk_size)
+        print(f"✓ Licenses: {licenses} migrated, {devices} device bindings created")
+        logs = migrate_activation_logs(source, args.chunk_size)
+        print(f"✓ Activation logs: {logs} migrated")
+
+    source.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,34 @@
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 import secrets
 import hashlib
+import time
+
+# Bump when the on-disk schema changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+# Format used by schema version 0, where dates were stored as local-time TEXT
+LEGACY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now():
+    """Current time as integer epoch seconds"""
+    return int(time.time())
+
+
+def _format_epoch(value):
+    """Render stored epoch seconds in the legacy local-time format"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value).strftime(LEGACY_DATE_FORMAT)
+
+
+def _legacy_to_epoch(value):
+    """Convert a schema-0 TEXT date to epoch seconds (used by the migration only)"""
+    if value is None or isinstance(value, int):
+        return value
+    return int(datetime.strptime(value, LEGACY_DATE_FORMAT).timestamp())
+
 
 class Database:
     def __init__(self, db_path='license_server.db'):
@@ -12,52 +39,114 @@ class Database:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        cursor.execute('PRAGMA user_version')
+        version = cursor.fetchone()[0]
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'licenses'")
+        if version < 1 and cursor.fetchone():
+            self._migrate_epoch_dates(conn)
+        
+        self._create_tables(cursor)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        
+        conn.commit()
+        conn.close()
+    
+    def _create_tables(self, cursor, suffix=''):
+        """Create the schema; dates are INTEGER epoch seconds"""
         # Licenses table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS licenses (
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS licenses{suffix} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 license_key TEXT UNIQUE NOT NULL,
                 customer_name TEXT NOT NULL,
                 customer_email TEXT NOT NULL,
                 product_name TEXT DEFAULT 'GTMS',
                 subscription_type TEXT NOT NULL,
-                start_date TEXT NOT NULL,
-                expiry_date TEXT NOT NULL,
+                start_date INTEGER NOT NULL,
+                expiry_date INTEGER NOT NULL,
                 hardware_id TEXT,
                 is_active INTEGER DEFAULT 1,
                 max_activations INTEGER DEFAULT 1,
                 current_activations INTEGER DEFAULT 0,
-                created_at TEXT NOT NULL,
-                last_validated TEXT
+                created_at INTEGER NOT NULL,
+                last_validated INTEGER
             )
         ''')
         
         # Activation logs table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activation_logs (
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS activation_logs{suffix} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 license_key TEXT NOT NULL,
                 hardware_id TEXT NOT NULL,
                 action TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
                 ip_address TEXT,
                 FOREIGN KEY (license_key) REFERENCES licenses (license_key)
             )
         ''')
         
         # Admin users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admin_users (
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS admin_users{suffix} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT UNIQUE NOT NULL,
                 password_hash TEXT NOT NULL,
                 email TEXT NOT NULL,
-                created_at TEXT NOT NULL
+                created_at INTEGER NOT NULL
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        if not suffix:
+            # The first hardware binding is logged by the database itself, so
+            # validate_license stays a single UPDATE ... RETURNING
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS log_first_activation
+                AFTER UPDATE OF hardware_id ON licenses
+                WHEN OLD.hardware_id IS NULL AND NEW.hardware_id IS NOT NULL
+                BEGIN
+                    INSERT INTO activation_logs (license_key, hardware_id, action, timestamp)
+                    VALUES (NEW.license_key, NEW.hardware_id, 'FIRST_ACTIVATION', NEW.last_validated);
+                END
+            ''')
+    
+    def _migrate_epoch_dates(self, conn):
+        """Schema 0 -> 1: rebuild tables so TEXT dates become INTEGER epoch seconds.
+        
+        The columns are rebuilt rather than updated in place because a TEXT
+        column would coerce the integers back into strings.
+        """
+        conn.create_function('to_epoch', 1, _legacy_to_epoch, deterministic=True)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        self._create_tables(cursor, suffix='_new')
+        
+        copies = {
+            'licenses': '''
+                INSERT INTO licenses_new
+                SELECT id, license_key, customer_name, customer_email, product_name,
+                       subscription_type, to_epoch(start_date), to_epoch(expiry_date),
+                       hardware_id, is_active, max_activations, current_activations,
+                       to_epoch(created_at), to_epoch(last_validated)
+                FROM licenses
+            ''',
+            'activation_logs': '''
+                INSERT INTO activation_logs_new
+                SELECT id, license_key, hardware_id, action, to_epoch(timestamp), ip_address
+                FROM activation_logs
+            ''',
+            'admin_users': '''
+                INSERT INTO admin_users_new
+                SELECT id, username, password_hash, email, to_epoch(created_at)
+                FROM admin_users
+            ''',
+        }
+        for table, copy_sql in copies.items():
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            if cursor.fetchone():
+                cursor.execute(copy_sql)
+                cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
     
     def generate_license_key(self):
         """Generate unique license key"""
@@ -69,117 +158,124 @@ class Database:
         cursor = conn.cursor()
         
         license_key = self.generate_license_key()
-        start_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Calculate expiry based on subscription type
-        if subscription_type == '1_month':
-            expiry = datetime.now() + timedelta(days=30)
-        elif subscription_type == '3_months':
-            expiry = datetime.now() + timedelta(days=90)
-        elif subscription_type == '6_months':
-            expiry = datetime.now() + timedelta(days=180)
-        elif subscription_type == '1_year':
-            expiry = datetime.now() + timedelta(days=365)
-        else:
-            expiry = datetime.now() + timedelta(days=30)
-        
-        expiry_date = expiry.strftime('%Y-%m-%d %H:%M:%S')
-        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        start_date = _now()
+        expiry_date = self._expiry_for(subscription_type, start_date)
         
         cursor.execute('''
             INSERT INTO licenses (license_key, customer_name, customer_email, product_name,
                                 subscription_type, start_date, expiry_date, created_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (license_key, customer_name, customer_email, product_name,
-              subscription_type, start_date, expiry_date, created_at))
+              subscription_type, start_date, expiry_date, start_date))
         
         conn.commit()
         conn.close()
         
         return license_key
     
-    def validate_license(self, license_key, hardware_id):
-        """Validate license and activate if needed"""
+    def create_licenses(self, customer_name, customer_email, subscription_type, count, product_name='GTMS'):
+        """Create `count` licenses for one customer in a single transaction"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM licenses WHERE license_key = ?', (license_key,))
-        license_data = cursor.fetchone()
+        keys = set()
+        while len(keys) < count:
+            fresh = {self.generate_license_key() for _ in range(count - len(keys))}
+            placeholders = ','.join('?' * len(fresh))
+            cursor.execute(f'SELECT license_key FROM licenses WHERE license_key IN ({placeholders})',
+                          tuple(fresh))
+            keys |= fresh - {row[0] for row in cursor.fetchall()}
         
-        if not license_data:
-            conn.close()
-            return {'valid': False, 'message': 'Invalid license key'}
+        start_date = _now()
+        expiry_date = self._expiry_for(subscription_type, start_date)
         
-        # Parse license data
-        cols = ['id', 'license_key', 'customer_name', 'customer_email', 'product_name',
-                'subscription_type', 'start_date', 'expiry_date', 'hardware_id',
-                'is_active', 'max_activations', 'current_activations', 'created_at', 'last_validated']
-        license = dict(zip(cols, license_data))
+        cursor.executemany('''
+            INSERT INTO licenses (license_key, customer_name, customer_email, product_name,
+                                subscription_type, start_date, expiry_date, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(key, customer_name, customer_email, product_name,
+               subscription_type, start_date, expiry_date, start_date) for key in keys])
         
-        # Check if license is active
-        if not license['is_active']:
-            conn.close()
-            return {'valid': False, 'message': 'License has been deactivated. Contact developer.'}
+        conn.commit()
+        conn.close()
         
-        # Check expiry
-        expiry_date = datetime.strptime(license['expiry_date'], '%Y-%m-%d %H:%M:%S')
-        if datetime.now() > expiry_date:
-            conn.close()
-            return {'valid': False, 'message': 'Subscription expired. Contact developer.'}
+        return list(keys)
+    
+    @staticmethod
+    def _expiry_for(subscription_type, start_date):
+        """Expiry (epoch seconds) for a subscription type starting at start_date"""
+        days = {'1_month': 30, '3_months': 90, '6_months': 180, '1_year': 365}.get(subscription_type, 30)
+        return start_date + days * 86400
+    
+    def validate_license(self, license_key, hardware_id):
+        """Validate license and activate if needed
         
-        # Check hardware ID binding
-        if license['hardware_id'] is None:
-            # First activation
-            cursor.execute('''
-                UPDATE licenses 
-                SET hardware_id = ?, current_activations = 1, last_validated = ?
-                WHERE license_key = ?
-            ''', (hardware_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), license_key))
-            
-            cursor.execute('''
-                INSERT INTO activation_logs (license_key, hardware_id, action, timestamp)
-                VALUES (?, ?, 'FIRST_ACTIVATION', ?)
-            ''', (license_key, hardware_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            
-            conn.commit()
-            conn.close()
-            
-            days_left = (expiry_date - datetime.now()).days
-            return {
-                'valid': True,
-                'message': 'License activated successfully',
-                'customer_name': license['customer_name'],
-                'expiry_date': license['expiry_date'],
-                'days_remaining': days_left
-            }
+        A single conditional UPDATE ... RETURNING binds the hardware id on
+        first use and refreshes last_validated; the row is only touched when
+        the license is active, unexpired and free or bound to this machine.
+        The database is only queried again to explain a rejection.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        now = _now()
+        changes_before = conn.total_changes
         
-        elif license['hardware_id'] == hardware_id:
-            # Valid hardware ID
-            cursor.execute('''
-                UPDATE licenses SET last_validated = ? WHERE license_key = ?
-            ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), license_key))
+        cursor.execute('''
+            UPDATE licenses
+            SET hardware_id = ?,
+                current_activations = CASE WHEN hardware_id IS NULL THEN 1 ELSE current_activations END,
+                last_validated = ?
+            WHERE license_key = ?
+              AND is_active = 1
+              AND expiry_date > ?
+              AND (hardware_id IS NULL OR hardware_id = ?)
+            RETURNING customer_name, expiry_date
+        ''', (hardware_id, now, license_key, now, hardware_id))
+        row = cursor.fetchall()
+        
+        if row:
             conn.commit()
+            # The log_first_activation trigger adds a second change when
+            # this call was the one that bound the hardware id
+            first_activation = conn.total_changes - changes_before > 1
             conn.close()
             
-            days_left = (expiry_date - datetime.now()).days
+            customer_name, expiry_date = row[0]
+            days_left = (expiry_date - now) // 86400
             return {
                 'valid': True,
-                'message': 'License valid',
-                'customer_name': license['customer_name'],
-                'expiry_date': license['expiry_date'],
+                'message': 'License activated successfully' if first_activation else 'License valid',
+                'customer_name': customer_name,
+                'expiry_date': _format_epoch(expiry_date),
                 'days_remaining': days_left
             }
-        else:
-            # Hardware ID mismatch
-            conn.close()
-            return {'valid': False, 'message': 'License already activated on another machine'}
+        
+        cursor.execute('''
+            SELECT is_active, expiry_date FROM licenses WHERE license_key = ?
+        ''', (license_key,))
+        license_data = cursor.fetchone()
+        conn.close()
+        
+        if not license_data:
+            return {'valid': False, 'message': 'Invalid license key'}
+        
+        is_active, expiry_date = license_data
+        if not is_active:
+            return {'valid': False, 'message': 'License has been deactivated. Contact developer.'}
+        if expiry_date <= now:
+            return {'valid': False, 'message': 'Subscription expired. Contact developer.'}
+        return {'valid': False, 'message': 'License already activated on another machine'}
     
     def get_all_licenses(self):
-        """Get all licenses"""
+        """Get all licenses, with dates rendered in the legacy format"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM licenses ORDER BY created_at DESC')
-        licenses = cursor.fetchall()
+        date_columns = {i for i, column in enumerate(cursor.description)
+                        if column[0] in ('start_date', 'expiry_date', 'created_at', 'last_validated')}
+        licenses = [tuple(_format_epoch(value) if i in date_columns else value
+                          for i, value in enumerate(row))
+                    for row in cursor.fetchall()]
         conn.close()
         return licenses
     
@@ -197,18 +293,22 @@ class Database:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('SELECT expiry_date FROM licenses WHERE license_key = ?', (license_key,))
-        result = cursor.fetchone()
-        
-        if result:
-            current_expiry = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S')
-            new_expiry = current_expiry + timedelta(days=days)
-            
-            cursor.execute('UPDATE licenses SET expiry_date = ? WHERE license_key = ?',
-                          (new_expiry.strftime('%Y-%m-%d %H:%M:%S'), license_key))
-            conn.commit()
-        
+        cursor.execute('UPDATE licenses SET expiry_date = expiry_date + ? WHERE license_key = ?',
+                      (days * 86400, license_key))
+        conn.commit()
+        conn.close()
+    
+    def extend_licenses(self, license_keys, days):
+        """Extend many licenses' expiry with a single UPDATE"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(license_keys))
+        cursor.execute(f'UPDATE licenses SET expiry_date = expiry_date + ? WHERE license_key IN ({placeholders})',
+                      (days * 86400, *license_keys))
+        conn.commit()
+        extended = cursor.rowcount
         conn.close()
+        return extended
     
     def create_admin(self, username, password, email):
         """Create admin user"""
@@ -216,7 +316,7 @@ class Database:
         cursor = conn.cursor()
         
         password_hash = hashlib.sha256(password.encode()).hexdigest()
-        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        created_at = _now()
         
         try:
             cursor.execute('''
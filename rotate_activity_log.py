@@ -0,0 +1,68 @@
+"""
+Rotate, partition and search the ActivityLog; meant to be run from cron.
+
+    python rotate_activity_log.py rotate
+    python rotate_activity_log.py partition        # PostgreSQL, once
+    python rotate_activity_log.py search --since 2024-01-01 --until 2024-04-01 --action login --contains 10.0.0.5
+
+`rotate` keeps ACTIVITY_LOG_HOT_MONTHS months in activity_log. Older months
+are detached (PostgreSQL partitions) or moved in chunks (SQLite) into
+activity_log_YYYYMM tables. Month tables past ACTIVITY_LOG_RETENTION_MONTHS
+are archived to ACTIVITY_LOG_ARCHIVE_DIR as .csv.gz and dropped; `search`
+queries those archives.
+"""
+
+import argparse
+from datetime import datetime
+
+from app import app, rotate_activity_log, partition_activity_log, search_activity_archive
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ActivityLog rotation and archives')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rotate', help='move / detach old months and archive expired ones')
+    commands.add_parser('partition', help='convert activity_log into monthly PostgreSQL partitions')
+    search = commands.add_parser('search', help='query archived months')
+    search.add_argument('--since', type=parse_date)
+    search.add_argument('--until', type=parse_date)
+    search.add_argument('--action')
+    search.add_argument('--user-id', type=int)
+    search.add_argument('--contains', help='text to look for in any text column')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rotate':
+            result = rotate_activity_log()
+            for name in result['created']:
+                print(f"✓ Created partition {name}")
+            for name in result['detached']:
+                print(f"✓ Detached partition {name}")
+            if result['moved']:
+                print(f"✓ Moved {result['moved']} rows out of activity_log")
+            for path in result['archived']:
+                print(f"✓ Archived {path}")
+        elif args.command == 'partition':
+            if partition_activity_log():
+                print("✓ activity_log converted to monthly partitions")
+            else:
+                print("✓ activity_log is already partitioned")
+        else:
+            equals = {}
+            if args.action:
+                equals['action'] = args.action
+            if args.user_id is not None:
+                equals['user_id'] = args.user_id
+            rows = search_activity_archive(args.since, args.until, args.contains, **equals)
+            if rows.empty:
+                print("No archived rows found")
+            else:
+                print(rows.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
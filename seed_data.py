@@ -0,0 +1,420 @@
+"""
+Fill the database with consistent synthetic data for benchmarks.
+
+    python seed_data.py --clients 1000 --activity-logs 1000000
+    python seed_data.py --clients 20000 --activity-logs 8000000 --seed 7
+
+Generates clients; licenses across products; GTMS users within each
+license's max_users; devices within max_devices; subscriptions with one
+payment per billing period; renewals for every period after the first; and
+activity logs weighted towards recent months. The same --seed always yields
+the same rows.
+
+Rows are built as numpy / pandas columns and written in --batch-size
+chunks, with COPY on PostgreSQL and multi-row executemany elsewhere. Ids
+continue after the current MAX(id) of each table, so seeding appends to
+existing data. Afterwards, run `python rotate_activity_log.py rotate` to
+move activity older than the hot window out of activity_log.
+"""
+
+import argparse
+import hashlib
+import io
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import (
+    app, db, upgrade_schema, ActivityLog, Client, DeviceAccess, GTMSUser, License, Payment, RenewalLog,
+    Subscription,
+)
+
+# Product -> (share of licenses, monthly price in INR)
+PRODUCTS = {
+    'GTMS': (0.55, 1000),
+    'GTMS Pro': (0.25, 2500),
+    'GTMS Lite': (0.15, 500),
+    'GTMS Analytics': (0.05, 4000),
+}
+
+# Subscription type -> (share of licenses, days per period, price in months)
+TERMS = {
+    'monthly': (0.40, 30, 1),
+    'yearly': (0.50, 365, 10),
+    'lifetime': (0.10, 36500, 60),
+}
+
+MAX_USERS = ([5, 10, 25, 50], [0.5, 0.3, 0.15, 0.05])
+MAX_DEVICES = ([3, 5, 10], [0.6, 0.3, 0.1])
+
+# Activity log action -> (share, details)
+ACTIONS = {
+    'login': (0.55, 'API login'),
+    'license_verified': (0.30, 'License verified'),
+    'device_registered': (0.08, 'New device registered'),
+    'logout': (0.05, 'Logged out'),
+    'password_changed': (0.02, 'Password changed'),
+}
+
+PAYMENT_METHODS = ['UPI', 'Card', 'Bank Transfer', 'Cash']
+
+PASSWORD = 'password'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate synthetic benchmark data')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--licenses-per-client', type=float, default=3.0, help='mean licenses per client')
+    parser.add_argument('--user-fill', type=float, default=0.4, help='share of max_users seats taken')
+    parser.add_argument('--device-fill', type=float, default=0.5, help='share of max_devices slots taken')
+    parser.add_argument('--renewal-rate', type=float, default=0.85, help='chance a license renews each period')
+    parser.add_argument('--subscription-share', type=float, default=0.7, help='licenses billed by a subscription')
+    parser.add_argument('--activity-logs', type=int, default=1000000)
+    parser.add_argument('--history-months', type=int, default=24, help='how far back data starts')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=50000, help='rows per INSERT / COPY batch')
+    return parser.parse_args()
+
+
+class Generator:
+    """Builds each table's rows as a DataFrame; ids continue after the existing ones"""
+
+    def __init__(self, args, now, next_ids):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.now = np.datetime64(now, 'us')
+        self.history = np.timedelta64(args.history_months * 30 * 86400, 's')
+        self.next_ids = next_ids
+
+    def ids(self, model, count):
+        start = self.next_ids[model]
+        self.next_ids[model] += count
+        return np.arange(start, start + count, dtype='int64')
+
+    def between(self, start, end):
+        """A random moment in [start, end] for each pair"""
+        span = (end - start).astype('timedelta64[us]').astype('int64')
+        return start + (self.rng.random(len(span)) * span).astype('timedelta64[us]')
+
+    def choice(self, options, count):
+        names, weights = list(options), np.array([value[0] for value in options.values()])
+        return self.rng.choice(np.array(names, dtype=object), count, p=weights / weights.sum())
+
+    # ---- tables ----
+
+    def clients(self):
+        n = self.args.clients
+        ids = self.ids(Client, n)
+        return pd.DataFrame({
+            'id': ids,
+            'name': [f'Synthetic Client {i}' for i in ids],
+            'contact_person': [f'Contact {i}' for i in ids],
+            'email': [f'client{i}@example.com' for i in ids],
+            'phone': self.rng.integers(7000000000, 9999999999, n).astype(str),
+            'status': np.where(self.rng.random(n) < 0.93, 'active', 'inactive'),
+            'created_at': self.now - (self.rng.random(n) * self.history).astype('timedelta64[us]'),
+        })
+
+    def licenses(self, clients):
+        counts = 1 + self.rng.poisson(max(self.args.licenses_per_client - 1, 0), len(clients))
+        owner = clients.loc[np.repeat(clients.index, counts)].reset_index(drop=True)
+        n = len(owner)
+        ids = self.ids(License, n)
+
+        created = self.between(owner['created_at'].to_numpy(), np.full(n, self.now))
+        term = self.choice(TERMS, n)
+        period = pd.Series(term).map({name: days for name, (_, days, _) in TERMS.items()}).to_numpy()
+        # Periods paid so far: renews with --renewal-rate, lifetime licenses are paid once.
+        # Only periods that have started by now can have been paid.
+        started = (self.now - created).astype('timedelta64[s]').astype('int64') // (period * 86400) + 1
+        periods = np.where(term == 'lifetime', 1,
+                           np.minimum(self.rng.geometric(1 - self.args.renewal_rate, n), started))
+        expiry = created + (period * periods * 86400).astype('timedelta64[s]')
+        expired = expiry < self.now
+
+        return pd.DataFrame({
+            'id': ids,
+            'client_id': owner['id'].to_numpy(),
+            'license_key': [f'GTMS-{i:016X}' for i in ids],
+            'company_name': owner['name'].to_numpy(),
+            'product_name': self.choice(PRODUCTS, n),
+            'max_users': self.rng.choice(MAX_USERS[0], n, p=MAX_USERS[1]),
+            'max_devices': self.rng.choice(MAX_DEVICES[0], n, p=MAX_DEVICES[1]),
+            'plan_type': 'Standard',
+            'subscription_type': term,
+            'activation_date': created,
+            'expiry_date': expiry,
+            'created_at': created,
+            'contact_email': owner['email'].to_numpy(),
+            'is_active': ~expired & (self.rng.random(n) > 0.02),
+            'expired_at': np.where(expired, expiry, np.datetime64('NaT')),
+        }), periods, period
+
+    def users(self, licenses):
+        counts = np.minimum(1 + self.rng.binomial(licenses['max_users'] - 1, self.args.user_fill),
+                            licenses['max_users'])
+        owner = licenses.loc[np.repeat(licenses.index, counts)].reset_index(drop=True)
+        n = len(owner)
+        ids = self.ids(GTMSUser, n)
+        created = self.between(owner['created_at'].to_numpy(), np.full(n, self.now))
+        return pd.DataFrame({
+            'id': ids,
+            'username': [f'user{i}' for i in ids],
+            'password_hash': hashlib.sha256(PASSWORD.encode()).hexdigest(),
+            'full_name': [f'User {i}' for i in ids],
+            'role': self.rng.choice(['Admin', 'Manager', 'User'], n, p=[0.1, 0.2, 0.7]),
+            'email': [f'user{i}@example.com' for i in ids],
+            'company_name': owner['company_name'].to_numpy(),
+            'license_id': owner['id'].to_numpy(),
+            'is_active': self.rng.random(n) < 0.97,
+            'created_at': created,
+            'last_login': self.between(created, np.full(n, self.now)),
+        }), counts
+
+    def devices(self, licenses, users, user_counts):
+        counts = self.rng.binomial(licenses['max_devices'], self.args.device_fill)
+        owner = licenses.loc[np.repeat(licenses.index, counts)].reset_index(drop=True)
+        n = len(owner)
+        ids = self.ids(DeviceAccess, n)
+
+        # Each device belongs to one of its license's users (users are contiguous per license)
+        first_user = np.concatenate([[0], np.cumsum(user_counts)[:-1]])
+        user_index = np.repeat(first_user, counts) + (self.rng.random(n) * np.repeat(user_counts, counts)).astype('int64')
+
+        until = np.minimum(owner['expiry_date'].to_numpy(), self.now)
+        first_access = self.between(owner['created_at'].to_numpy(), until)
+        return pd.DataFrame({
+            'id': ids,
+            'user_id': users['id'].to_numpy()[user_index],
+            'license_id': owner['id'].to_numpy(),
+            'hardware_id': [f'HW-{i:012X}' for i in ids],
+            'device_name': [f'DESKTOP-{i:06d}' for i in ids],
+            'os_info': self.rng.choice(['Windows 10', 'Windows 11', 'Windows Server 2019'], n),
+            'ip_address': self.ip_addresses(n),
+            'is_active': owner['is_active'].to_numpy() & (self.rng.random(n) < 0.9),
+            'first_access': first_access,
+            'last_access': self.between(first_access, until),
+            'access_count': self.rng.integers(1, 2000, n),
+        })
+
+    def subscriptions(self, licenses, periods, period):
+        billed = self.rng.random(len(licenses)) < self.args.subscription_share
+        owner = licenses[billed].reset_index(drop=True)
+        periods, period = periods[billed], period[billed]
+        n = len(owner)
+        ids = self.ids(Subscription, n)
+
+        term = owner['subscription_type'].to_numpy()
+        price = owner['product_name'].map({name: price for name, (_, price) in PRODUCTS.items()}).to_numpy()
+        months = pd.Series(term).map({name: months for name, (_, _, months) in TERMS.items()}).to_numpy()
+        end = owner['expiry_date'].to_numpy()
+        running = end > self.now
+        cancelled = self.rng.random(n) < 0.03
+        status = np.where(cancelled, 'cancelled', np.where(running, 'active', 'expired'))
+
+        frame = pd.DataFrame({
+            'id': ids,
+            'client_id': owner['client_id'].to_numpy(),
+            'license_id': owner['id'].to_numpy(),
+            'plan_name': owner['product_name'] + ' ' + pd.Series(term).str.title(),
+            'plan_type': term,
+            'amount': (price * months).astype('float64'),
+            'currency': 'INR',
+            'start_date': owner['created_at'].to_numpy(),
+            'end_date': end,
+            'next_billing_date': np.where((status == 'active') & (term != 'lifetime'), end, np.datetime64('NaT')),
+            'status': status,
+            'auto_renew': ~cancelled,
+            'created_at': owner['created_at'].to_numpy(),
+            'updated_at': owner['created_at'].to_numpy(),
+        })
+        return frame, periods, period
+
+    def payments(self, subscriptions, periods, period):
+        """One payment per paid period, and a renewal for every period after the first"""
+        owner = subscriptions.loc[np.repeat(subscriptions.index, periods)].reset_index(drop=True)
+        n = len(owner)
+        ids = self.ids(Payment, n)
+        number = np.arange(n) - np.repeat(np.cumsum(periods) - periods, periods)
+        length = (np.repeat(period, periods) * 86400).astype('timedelta64[s]')
+        paid_on = owner['start_date'].to_numpy() + number * length
+        # A few of the latest payments of running subscriptions are still pending
+        latest = number == np.repeat(periods, periods) - 1
+        pending = latest & (owner['status'].to_numpy() == 'active') & (self.rng.random(n) < 0.05)
+        # Periods are capped at the license's age; nothing is ever paid in the future
+        paid = paid_on <= self.now
+
+        payments = pd.DataFrame({
+            'id': ids,
+            'client_id': owner['client_id'].to_numpy(),
+            'subscription_id': owner['id'].to_numpy(),
+            'license_id': owner['license_id'].to_numpy(),
+            'amount': owner['amount'].to_numpy(),
+            'currency': 'INR',
+            'payment_method': self.rng.choice(PAYMENT_METHODS, n),
+            'transaction_id': [f'TXN{i:012d}' for i in ids],
+            'payment_date': paid_on,
+            'payment_for': np.where(number == 0, 'New ', 'Renewal: ') + owner['plan_name'].to_numpy(),
+            'invoice_number': [f'SYN-{i:010d}' for i in ids],
+            'invoice_generated': False,
+            'status': np.where(pending, 'pending', 'completed'),
+            'created_at': paid_on,
+            'created_by': 'seed',
+        })[paid].reset_index(drop=True)
+
+        renewed = (number > 0)[paid]
+        ids, paid_on, length = ids[paid], paid_on[paid], length[paid]
+        renewal_count = int(renewed.sum())
+        renewals = pd.DataFrame({
+            'id': self.ids(RenewalLog, renewal_count),
+            'client_id': payments['client_id'].to_numpy()[renewed],
+            'license_id': payments['license_id'].to_numpy()[renewed],
+            'subscription_id': payments['subscription_id'].to_numpy()[renewed],
+            'old_expiry_date': paid_on[renewed],
+            'new_expiry_date': (paid_on + length)[renewed],
+            'renewal_type': 'subscription_renewal',
+            'amount': payments['amount'].to_numpy()[renewed],
+            'payment_id': ids[renewed],
+            'renewed_by': 'billing',
+            'renewal_date': paid_on[renewed],
+        })
+        return payments, renewals
+
+    def activity_logs(self, user_ids, count):
+        """Activity log chunks of --batch-size, weighted towards recent months"""
+        details = {action: text for action, (_, text) in ACTIONS.items()}
+        for start in range(0, count, self.args.batch_size):
+            n = min(self.args.batch_size, count - start)
+            action = self.choice(ACTIONS, n)
+            age = (self.rng.beta(1, 3, n) * self.history).astype('timedelta64[us]')
+            yield pd.DataFrame({
+                'id': self.ids(ActivityLog, n),
+                'user_id': user_ids[self.rng.integers(0, len(user_ids), n)],
+                'action': action,
+                'details': pd.Series(action).map(details).to_numpy(),
+                'ip_address': self.ip_addresses(n),
+                'timestamp': self.now - age,
+            })
+
+    def ip_addresses(self, n):
+        octets = self.rng.integers(1, 255, (3, n)).astype(str)
+        return np.char.add(np.char.add(np.char.add(np.char.add(np.char.add('10.', octets[0]), '.'), octets[1]),
+                                       '.'), octets[2])
+
+
+# ---- writing ----
+
+def write(conn, model, frame, batch_size):
+    """Bulk-load `frame` into the model's table: COPY on PostgreSQL, executemany elsewhere"""
+    table = model.__table__
+    for start in range(0, len(frame), batch_size):
+        chunk = frame.iloc[start:start + batch_size]
+        if conn.dialect.name == 'postgresql':
+            copy_rows(conn, table, chunk)
+        elif conn.dialect.name == 'sqlite':
+            insert_rows(conn, table, chunk)
+        else:
+            rows = chunk.astype(object).where(chunk.notna(), None).to_dict('records')
+            conn.execute(table.insert(), rows)
+    return len(frame)
+
+
+def insert_rows(conn, table, frame):
+    """
+    executemany straight on the sqlite3 cursor. Columns are converted to
+    Python values as whole arrays and datetimes to the text SQLAlchemy stores,
+    which skips the per-row work of building and binding dicts.
+    """
+    columns = []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype.kind == 'M':
+            text = np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ').astype(object)
+            text[np.isnat(values)] = None
+            columns.append(text.tolist())
+        else:
+            columns.append(values.tolist())
+    quote = conn.dialect.identifier_preparer.quote
+    conn.exec_driver_sql(
+        f"INSERT INTO {quote(table.name)} ({', '.join(quote(name) for name in frame.columns)}) "
+        f"VALUES ({', '.join('?' * len(frame.columns))})",
+        list(zip(*columns)),
+    )
+
+
+def copy_rows(conn, table, frame):
+    quote = conn.dialect.identifier_preparer.quote
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S.%f')
+    buffer.seek(0)
+    columns = ', '.join(quote(column) for column in frame.columns)
+    cursor = conn.connection.driver_connection.cursor()
+    cursor.copy_expert(f'COPY {quote(table.name)} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def reset_sequences(conn, models):
+    """Move PostgreSQL id sequences past the explicitly inserted ids"""
+    if conn.dialect.name != 'postgresql':
+        return
+    for model in models:
+        name = model.__tablename__
+        conn.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))"
+        ))
+
+
+def main():
+    args = parse_args()
+    models = [Client, License, GTMSUser, DeviceAccess, Subscription, Payment, RenewalLog, ActivityLog]
+
+    with app.app_context():
+        upgrade_schema()
+        next_ids = {model: (db.session.query(db.func.max(model.id)).scalar() or 0) + 1 for model in models}
+        db.session.remove()
+        generator = Generator(args, datetime.utcnow(), next_ids)
+        started = time.perf_counter()
+
+        def load(conn, model, frame):
+            began = time.perf_counter()
+            count = write(conn, model, frame, args.batch_size)
+            print(f"✓ {model.__tablename__:14} {count:>12,} rows in {time.perf_counter() - began:6.1f}s")
+
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+
+            clients = generator.clients()
+            licenses, periods, period = generator.licenses(clients)
+            users, user_counts = generator.users(licenses)
+            devices = generator.devices(licenses, users, user_counts)
+            subscriptions, periods, period = generator.subscriptions(licenses, periods, period)
+            payments, renewals = generator.payments(subscriptions, periods, period)
+
+            load(conn, Client, clients)
+            load(conn, License, licenses)
+            load(conn, GTMSUser, users)
+            load(conn, DeviceAccess, devices)
+            load(conn, Subscription, subscriptions)
+            load(conn, Payment, payments)
+            load(conn, RenewalLog, renewals)
+
+        logged, began = 0, time.perf_counter()
+        for frame in generator.activity_logs(users['id'].to_numpy(), args.activity_logs):
+            # One transaction per batch keeps the WAL / journal small on huge runs
+            with db.engine.begin() as conn:
+                write(conn, ActivityLog, frame, args.batch_size)
+            logged += len(frame)
+        print(f"✓ {'activity_log':14} {logged:>12,} rows in {time.perf_counter() - began:6.1f}s")
+
+        with db.engine.begin() as conn:
+            reset_sequences(conn, models)
+
+        total = sum(len(frame) for frame in (clients, licenses, users, devices, subscriptions, payments, renewals))
+        print(f"✓ Seeded {total + logged:,} rows in {time.perf_counter() - started:.1f}s (seed {args.seed})")
+        print(f"  GTMS users log in with password '{PASSWORD}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+/*
+ * Search-as-you-type for large <select>s.
+ *
+ * <select data-typeahead="/admin/api/clients/search"> gets a search box
+ * above it. Options are fetched from the endpoint ({results: [{id, label}]})
+ * when the box or select is first focused and again as the user types,
+ * instead of rendering every row into the page. A blank <option value="">
+ * in the markup is kept at the top.
+ */
+(function () {
+    const DELAY_MS = 200;
+
+    function attach(select) {
+        const url = select.dataset.typeahead;
+        const blank = select.querySelector('option[value=""]');
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control form-control-sm mb-1';
+        input.placeholder = 'Type to search...';
+        input.autocomplete = 'off';
+        select.parentNode.insertBefore(input, select);
+
+        let timer = null;
+        let last = null;
+
+        function load(q) {
+            if (q === last) return;
+            last = q;
+            const separator = url.includes('?') ? '&' : '?';
+            fetch(url + separator + 'q=' + encodeURIComponent(q), {credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(data => {
+                    if (q !== last) return;  // a newer search is in flight
+                    const selected = select.value;
+                    const keep = selected ? select.querySelector('option:checked') : null;
+                    select.innerHTML = '';
+                    if (blank) select.appendChild(blank);
+                    data.results.forEach(item => {
+                        if (keep && String(item.id) === selected) return;
+                        select.add(new Option(item.label, item.id));
+                    });
+                    if (keep) select.add(keep, blank ? 1 : 0);
+                    select.value = selected;
+                });
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(input.value.trim()), DELAY_MS);
+        });
+        input.addEventListener('focus', () => load(input.value.trim()));
+        select.addEventListener('focus', () => load(input.value.trim()));
+    }
+
+    // Select `value` in a typeahead select, adding its option if it has not been fetched
+    window.typeaheadSelect = function (select, value, label) {
+        const id = String(value);
+        if (!Array.from(select.options).some(option => option.value === id)) {
+            select.add(new Option(label || id, id));
+        }
+        select.value = id;
+    };
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('select[data-typeahead]').forEach(attach);
+    });
+})();
@@ -0,0 +1,29 @@
+"""
+Expire lapsed subscriptions and licenses; meant to be run from cron.
+
+    python sweep_expired.py [--chunk-size 500]
+
+Active subscriptions past their end date become 'expired' and active
+licenses past their expiry date are deactivated, with every transition
+recorded in ActivityLog.
+"""
+
+import argparse
+
+from app import app, expire_lapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Expire lapsed subscriptions and licenses')
+    parser.add_argument('--chunk-size', type=int, default=app.config['EXPIRY_SWEEP_CHUNK_SIZE'],
+                        help='rows per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        subscriptions, licenses = expire_lapsed(chunk_size=args.chunk_size)
+
+    print(f"✓ Expired {subscriptions} subscriptions and {licenses} licenses")
+
+
+if __name__ == '__main__':
+    main()
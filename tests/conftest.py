@@ -0,0 +1,196 @@
+"""
+Shared fixtures: the Flask app on an in-memory SQLite database, seeded data
+and a query counter built on SQLAlchemy cursor events.
+"""
+
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+# Must be set before the app is built: Config reads it at import time
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event  # noqa: E402
+
+from app import (  # noqa: E402
+    app as flask_app, db, upgrade_schema, AdminUser, AdminActivityLog, ActivityLog, Client, DeviceAccess,
+    GTMSUser, License, Payment, RenewalLog, Subscription, TrafficRollup,
+)
+from utils import analytics, cohorts  # noqa: E402
+from utils.rollups import hour_bucket, traffic_buffer  # noqa: E402
+from utils.shared_cache import current_cache  # noqa: E402
+
+ADMIN_PASSWORD = 'admin123'
+USER_PASSWORD = 'user123'
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    flask_app.config.update(TESTING=True)
+    flask_app.extensions['mail'].suppress = True
+    # Invoices and archives are written relative to the working directory
+    workdir = tmp_path_factory.mktemp('work')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    yield flask_app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def database(app):
+    """A fresh schema and cold caches for every test"""
+    with app.app_context():
+        reset_database()
+        yield db
+        db.session.remove()
+
+
+def reset_database():
+    db.session.remove()
+    db.drop_all()
+    upgrade_schema()
+    analytics._cache.clear()
+    cohorts._state.clear()
+    traffic_buffer.drain()
+    current_cache().clear()
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(client):
+    """A test client logged in as an admin holding every permission"""
+    admin = create_admin()
+    with client.session_transaction() as sess:
+        sess['admin_id'] = admin.id
+        sess['admin_username'] = admin.username
+    return client
+
+
+def create_admin(username='admin'):
+    admin = AdminUser(
+        username=username, email=f'{username}@gtms.com', employee_code='EMP001', full_name='Test Admin',
+        can_manage_clients=True, can_manage_licenses=True, can_manage_payments=True, can_manage_users=True,
+    )
+    admin.set_password(ADMIN_PASSWORD)
+    db.session.add(admin)
+    db.session.commit()
+    return admin
+
+
+def seed(clients, now=None):
+    """
+    `clients` clients, each with two licenses (one user and one device each),
+    a subscription, a completed and a pending payment, a renewal, activity
+    logs and traffic rollups. The first client holds `clients` licenses so
+    per-client pages grow too. Returns the ids of the first of each.
+    """
+    now = now or datetime.utcnow()
+    admin = AdminUser.query.first() or create_admin()
+    for n in range(clients):
+        client = Client(name=f'Client {n}', contact_person=f'Contact {n}', email=f'client{n}@example.com',
+                        phone='9876543210', created_at=now - timedelta(days=400 - n))
+        db.session.add(client)
+        db.session.flush()
+
+        licenses = []
+        for k in range(max(2, clients) if n == 0 else 2):
+            license = License(
+                client_id=client.id, license_key=f'GTMS-{n:04d}-{k}', company_name=client.name,
+                product_name=('GTMS', 'GTMS Pro')[k % 2], contact_email=client.email, max_devices=3,
+                created_at=now - timedelta(days=300 - n), activation_date=now - timedelta(days=300 - n),
+                expiry_date=now + timedelta(days=5 + 30 * (k % 2)),
+            )
+            db.session.add(license)
+            db.session.flush()
+            licenses.append(license)
+
+            user = GTMSUser(username=f'user{n}-{k}', full_name=f'User {n}-{k}', license_id=license.id,
+                            company_name=client.name, email=f'user{n}-{k}@example.com')
+            user.set_password(USER_PASSWORD)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(DeviceAccess(user_id=user.id, license_id=license.id, hardware_id=f'HW-{n}-{k}',
+                                        device_name=f'Device {n}-{k}'))
+            db.session.add(ActivityLog(user_id=user.id, action='login', details='seed', timestamp=now))
+
+        subscription = Subscription(
+            client_id=client.id, license_id=licenses[0].id, plan_name='Yearly', plan_type='yearly',
+            amount=12000, start_date=now - timedelta(days=340), end_date=now + timedelta(days=25),
+            next_billing_date=now + timedelta(days=25),
+        )
+        db.session.add(subscription)
+        db.session.flush()
+        for status in ('completed', 'pending'):
+            db.session.add(Payment(
+                client_id=client.id, subscription_id=subscription.id, license_id=licenses[0].id,
+                amount=12000, payment_method='UPI', payment_for='Yearly plan', status=status,
+                invoice_number=f'INV-TEST-{n:04d}-{status}', payment_date=now - timedelta(days=40),
+            ))
+        db.session.add(RenewalLog(
+            client_id=client.id, license_id=licenses[0].id, old_expiry_date=now - timedelta(days=360),
+            new_expiry_date=licenses[0].expiry_date, renewal_type='license_renewal', renewed_by=admin.username,
+            renewal_date=now - timedelta(days=5),
+        ))
+        db.session.add(AdminActivityLog(admin_id=admin.id, action='client_created', details=client.name,
+                                        timestamp=now))
+        db.session.add(TrafficRollup(bucket=hour_bucket(now), endpoint='/api/verify-license',
+                                     event='verification', license_id=licenses[0].id,
+                                     product_name=licenses[0].product_name, count=n + 1))
+    db.session.commit()
+
+    return {
+        'admin_id': admin.id,
+        'client_id': Client.query.order_by(Client.id).first().id,
+        'license_key': License.query.order_by(License.id).first().license_key,
+        'license_id': License.query.order_by(License.id).first().id,
+        'user_id': GTMSUser.query.order_by(GTMSUser.id).first().id,
+        'username': GTMSUser.query.order_by(GTMSUser.id).first().username,
+        'device_id': DeviceAccess.query.order_by(DeviceAccess.id).first().id,
+        'hardware_id': DeviceAccess.query.order_by(DeviceAccess.id).first().hardware_id,
+        'subscription_id': Subscription.query.order_by(Subscription.id).first().id,
+        'payment_id': Payment.query.filter_by(status='completed').order_by(Payment.id).first().id,
+        'pending_payment_id': Payment.query.filter_by(status='pending').order_by(Payment.id).first().id,
+    }
+
+
+class QueryCounter:
+    """SQL statements executed on an engine while active"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(' '.join(statement.split()))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __str__(self):
+        return '\n'.join(f'  {n}. {statement}' for n, statement in enumerate(self.statements, 1))
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect every statement executed on `engine` (default: the app's) in the block"""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+@contextmanager
+def assert_max_queries(budget, engine=None):
+    """Fail if the block runs more than `budget` statements"""
+    with count_queries(engine) as counter:
+        yield counter
+    assert counter.count <= budget, f'{counter.count} queries (budget {budget}):\n{counter}'
@@ -0,0 +1,52 @@
+"""
+Request-scoped admin principal: permission flags come from the signed
+session and are reloaded only when edit_employee bumps the admin's version.
+"""
+
+from app import AdminUser
+from conftest import ADMIN_PASSWORD, count_queries, create_admin
+
+PERMISSIONS = {'can_manage_clients': 'on', 'can_manage_licenses': 'on',
+               'can_manage_payments': 'on', 'can_manage_users': 'on'}
+
+
+def admin_user_queries(counter):
+    return [statement for statement in counter.statements if 'FROM admin_user' in statement]
+
+
+def test_login_stores_permissions_in_session(client):
+    create_admin()
+    client.post('/admin/login', data={'username': 'admin', 'password': ADMIN_PASSWORD})
+    with client.session_transaction() as sess:
+        assert sess['admin_permissions']['can_manage_clients'] is True
+        assert sess['admin_permissions_version'] == 0
+
+
+def test_page_loads_skip_the_admin_query(admin_client):
+    admin_client.get('/admin/clients')  # loads the flags into the session once
+    with count_queries() as counter:
+        assert admin_client.get('/admin/clients').status_code == 200
+    assert not admin_user_queries(counter), counter
+
+
+def test_revocation_takes_effect_on_the_next_request(admin_client):
+    admin = AdminUser.query.one()
+    assert admin_client.get('/admin/clients').status_code == 200
+
+    revoked = dict(PERMISSIONS, full_name='Test Admin')
+    del revoked['can_manage_clients']
+    admin_client.post(f'/admin/employees/edit/{admin.id}', data=revoked)
+    assert AdminUser.query.one().permissions_version == 1
+
+    response = admin_client.get('/admin/clients')
+    assert response.status_code == 302
+    assert response.location.endswith('/admin/dashboard')
+    with admin_client.session_transaction() as sess:
+        assert sess['admin_permissions']['can_manage_clients'] is False
+        assert sess['admin_permissions_version'] == 1
+
+
+def test_logged_out_requests_are_redirected(client):
+    response = client.get('/admin/clients')
+    assert response.status_code == 302
+    assert response.location.endswith('/admin/login')
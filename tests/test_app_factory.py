@@ -0,0 +1,44 @@
+"""
+create_app profiles: the API-only profile registers no admin routes and
+never imports the heavy admin-only dependencies.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import PROFILES, create_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_api_profile_registers_only_the_api():
+    api = create_app('api')
+    endpoints = {rule.endpoint for rule in api.url_map.iter_rules()}
+    assert 'api.verify_license_api' in endpoints
+    assert 'api.prometheus_metrics' in endpoints
+    assert not {endpoint for endpoint in endpoints if endpoint.startswith('admin.')}
+    assert 'mail' not in api.extensions
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        create_app('worker')
+
+
+@pytest.mark.parametrize('profile', PROFILES)
+def test_heavy_modules_are_imported_lazily(profile):
+    code = (
+        'import json, sys\n'
+        'from app import create_app\n'
+        f'create_app({profile!r})\n'
+        "print(json.dumps([m for m in ('pandas', 'reportlab', 'flask_mail') if m in sys.modules]))\n"
+    )
+    env = dict(os.environ, DATABASE_URL='sqlite://')
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == ([] if profile == 'api' else ['flask_mail'])
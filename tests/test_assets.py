@@ -0,0 +1,67 @@
+"""
+Fingerprinted static assets: hashed URLs in templates, immutable cache
+headers and precompressed variants.
+"""
+
+import gzip
+import os
+import re
+
+import pytest
+
+from app import create_app
+from utils.assets import AssetManifest
+
+brotli = pytest.importorskip('brotli')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def asset_urls(html):
+    return re.findall(r'(/assets/[^"]+)"', html)
+
+
+def test_pages_link_fingerprinted_assets(admin_client):
+    urls = asset_urls(admin_client.get('/admin/dashboard').get_data(as_text=True))
+    assert len(urls) == 2
+    assert all(re.fullmatch(r'/assets/(css/style|js/typeahead)\.[0-9a-f]{12}\.(css|js)', url) for url in urls)
+
+
+def test_fingerprinted_url_is_immutable_and_precompressed(admin_client):
+    css = next(url for url in asset_urls(admin_client.get('/admin/dashboard').get_data(as_text=True))
+               if url.endswith('.css'))
+    with open(os.path.join(ROOT, 'static', 'css', 'style.css'), 'rb') as f:
+        source = f.read()
+
+    plain = admin_client.get(css)
+    assert plain.data == source
+    assert plain.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    assert plain.mimetype == 'text/css'
+
+    assert gzip.decompress(admin_client.get(css, headers={'Accept-Encoding': 'gzip'}).data) == source
+    br = admin_client.get(css, headers={'Accept-Encoding': 'gzip, br'})
+    assert br.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(br.data) == source
+
+
+def test_outdated_hash_serves_the_current_file_uncached(admin_client):
+    response = admin_client.get('/assets/css/style.000000000000.css')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert admin_client.get('/assets/css/missing.000000000000.css').status_code == 404
+    assert admin_client.get('/assets/css/style.css').status_code == 404
+
+
+def test_manifest_follows_file_changes(tmp_path):
+    (tmp_path / 'app.js').write_text('one')
+    manifest = AssetManifest(str(tmp_path))
+    first, version = manifest.assets['app.js'].url_name, manifest.version
+    (tmp_path / 'app.js').write_text('two')
+    manifest.refresh()
+    assert manifest.assets['app.js'].url_name != first
+    assert manifest.version != version
+
+
+def test_api_profile_has_no_asset_route():
+    assert 'asset' not in {rule.endpoint for rule in create_app('api').url_map.iter_rules()}
@@ -0,0 +1,81 @@
+"""
+Auto-renew billing run: every missed cycle of an overdue subscription is
+billed once, with an invoice number derived from the cycle date, and a
+second run on the same day bills nothing.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import Payment, RenewalLog, Subscription, db, run_billing
+from conftest import seed
+from utils.job_queue import invoice_queue
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Payment ids handed to the invoice queue instead of rendering PDFs"""
+    jobs = []
+    monkeypatch.setattr(invoice_queue, 'enqueue', lambda app, func, payment_ids: jobs.append(payment_ids))
+    return jobs
+
+
+def overdue_subscription(now, days_overdue, **columns):
+    ids = seed(1, now=now)
+    subscription = db.session.get(Subscription, ids['subscription_id'])
+    subscription.plan_type = 'monthly'
+    subscription.end_date = subscription.next_billing_date = now - timedelta(days=days_overdue)
+    for name, value in columns.items():
+        setattr(subscription, name, value)
+    db.session.commit()
+    return subscription
+
+
+def auto_renew_payments(subscription):
+    return Payment.query.filter_by(subscription_id=subscription.id, created_by='auto-renew') \
+        .order_by(Payment.payment_date).all()
+
+
+def test_overdue_cycles_are_caught_up_in_one_run(database, enqueued):
+    now = datetime(2026, 10, 19, 9, 0)
+    subscription = overdue_subscription(now, 100, status='expired')
+    first_cycle = subscription.next_billing_date
+
+    assert run_billing(chunk_size=1, now=now) == 4
+
+    cycles = [first_cycle + timedelta(days=30 * n) for n in range(4)]
+    payments = auto_renew_payments(subscription)
+    assert [p.payment_date for p in payments] == cycles
+    assert [p.invoice_number for p in payments] == \
+        [f'INV-{cycle.year}-AR{subscription.id}-{cycle:%Y%m%d}' for cycle in cycles]
+    assert payments[0].invoice_number == f'INV-2026-AR{subscription.id}-20260711'
+    assert {p.status for p in payments} == {'pending'}
+    assert sorted(id for job in enqueued for id in job) == sorted(p.id for p in payments)
+
+    assert subscription.status == 'active'
+    assert subscription.end_date == subscription.next_billing_date == first_cycle + timedelta(days=120)
+    renewals = RenewalLog.query.filter_by(subscription_id=subscription.id).order_by(RenewalLog.id).all()
+    assert [r.payment_id for r in renewals] == [p.id for p in payments]
+    assert renewals[-1].new_expiry_date == subscription.end_date
+
+
+def test_second_run_on_the_same_day_bills_nothing(database, enqueued):
+    now = datetime(2026, 10, 19, 9, 0)
+    subscription = overdue_subscription(now, 5)
+
+    assert run_billing(now=now) == 1
+    assert run_billing(now=now + timedelta(hours=8)) == 0
+    assert len(auto_renew_payments(subscription)) == 1
+    assert len(enqueued) == 1
+
+
+def test_cancelled_and_manual_subscriptions_are_skipped(database, enqueued):
+    now = datetime(2026, 10, 19, 9, 0)
+    overdue_subscription(now, 5, auto_renew=False)
+    assert run_billing(now=now) == 0
+    subscription = db.session.scalars(db.select(Subscription)).one()
+    subscription.auto_renew, subscription.status = True, 'cancelled'
+    db.session.commit()
+    assert run_billing(now=now) == 0
+    assert enqueued == []
@@ -0,0 +1,46 @@
+"""
+Bulk license issuance: quantities are validated before any list of seats
+is built, for the form and for every CSV row.
+"""
+
+import io
+
+import pytest
+
+from app import BULK_LICENSE_LIMIT, License
+from conftest import seed
+
+
+def issue(admin_client, **form):
+    admin_client.post('/admin/licenses/bulk', data=form, content_type='multipart/form-data')
+    with admin_client.session_transaction() as sess:
+        return sess.pop('_flashes')[-1][1]
+
+
+def test_quantity_issues_that_many(admin_client):
+    ids = seed(1)
+    before = License.query.count()
+    assert issue(admin_client, client_id=ids['client_id'], quantity='3') == '✓ 3 licenses created successfully!'
+    assert License.query.count() == before + 3
+
+
+@pytest.mark.parametrize('quantity, message', [
+    (str(10 ** 9), f'At most {BULK_LICENSE_LIMIT} licenses'),
+    ('0', 'at least 1'),
+    ('-5', 'at least 1'),
+    ('two', 'Invalid quantity'),
+])
+def test_bad_quantity_issues_nothing(admin_client, quantity, message):
+    ids = seed(1)
+    before = License.query.count()
+    assert message in issue(admin_client, client_id=ids['client_id'], quantity=quantity)
+    assert License.query.count() == before
+
+
+def test_csv_quantities_count_towards_the_limit(admin_client):
+    seed(1)
+    before = License.query.count()
+    rows = f'company_name,quantity\nAcme,{BULK_LICENSE_LIMIT - 1}\nGlobex,2\n'.encode()
+    message = issue(admin_client, csv_file=(io.BytesIO(rows), 'licenses.csv'))
+    assert message == f'✗ Error creating licenses: CSV line 3: At most {BULK_LICENSE_LIMIT} licenses can be issued at once'
+    assert License.query.count() == before
@@ -0,0 +1,77 @@
+"""
+Cohort report: later reads recompute only the cohorts whose clients
+changed, and the merged matrices match a full rebuild.
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app import Client, License, RenewalLog, db
+from conftest import seed
+from utils import cohorts
+from utils.cohorts import cohort_snapshot
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def seed_two_cohorts():
+    """Three clients; the last one's licenses start two months earlier and it has not renewed"""
+    seed(3, now=NOW)
+    client = Client.query.order_by(Client.id.desc()).first()
+    RenewalLog.query.filter_by(client_id=client.id).delete()
+    for license in License.query.filter_by(client_id=client.id):
+        license.created_at -= timedelta(days=61)
+    db.session.commit()
+    return client
+
+
+def assert_same_report(report, expected):
+    for name in ('renewal', 'retention', 'summary'):
+        pd.testing.assert_frame_equal(report[name], expected[name], check_dtype=False)
+
+
+def test_only_changed_cohorts_are_recomputed(database):
+    early_client = seed_two_cohorts()
+
+    report = cohort_snapshot(db.engine, now=NOW)
+    assert report['recomputed_cohorts'] == 2
+    assert list(report['summary']['clients']) == [1, 2]
+    assert list(report['summary']['renewed']) == [0, 2]
+    assert cohort_snapshot(db.engine, now=NOW)['recomputed_cohorts'] == 0
+
+    db.session.add(RenewalLog(client_id=early_client.id, renewal_type='license_renewal', renewed_by='admin',
+                              old_expiry_date=NOW, new_expiry_date=NOW + timedelta(days=365),
+                              renewal_date=NOW - timedelta(days=1)))
+    db.session.commit()
+
+    report = cohort_snapshot(db.engine, now=NOW)
+    assert report['recomputed_cohorts'] == 1
+    assert list(report['summary']['renewed']) == [1, 2]
+    cohorts._state.clear()
+    full = cohort_snapshot(db.engine, now=NOW)
+    assert full['recomputed_cohorts'] == 2
+    assert_same_report(report, full)
+
+
+def test_new_client_joins_its_cohort_incrementally(database):
+    seed_two_cohorts()
+    cohort_snapshot(db.engine, now=NOW)
+
+    client = Client(name='Late Client', created_at=NOW)
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(License(client_id=client.id, license_key='GTMS-LATE', company_name=client.name,
+                           created_at=NOW - timedelta(days=300), expiry_date=NOW + timedelta(days=65)))
+    db.session.commit()
+    report = cohort_snapshot(db.engine, now=NOW)
+    assert report['recomputed_cohorts'] == 1
+    assert list(report['summary']['clients']) == [1, 3]
+    cohorts._state.clear()
+    assert_same_report(report, cohort_snapshot(db.engine, now=NOW))
+
+
+def test_new_month_rebuilds_everything(database):
+    seed_two_cohorts()
+    cohort_snapshot(db.engine, now=NOW)
+    assert cohort_snapshot(db.engine, now=NOW + timedelta(days=31))['recomputed_cohorts'] == 2
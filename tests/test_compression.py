@@ -0,0 +1,78 @@
+"""
+gzip / brotli compression: negotiated per request, skipped for small,
+binary and already-encoded responses, and flushed per chunk when streamed.
+"""
+
+import gzip
+import zlib
+
+import pytest
+from flask import Response
+
+from app import create_app
+from conftest import seed
+
+brotli = pytest.importorskip('brotli')
+
+
+@pytest.fixture
+def stream_app():
+    app = create_app('api')
+    app.add_url_rule('/stream', 'stream', lambda: Response((f'row {n}\n' * 50 for n in range(3)),
+                                                           mimetype='text/csv'))
+    app.add_url_rule('/invoice.pdf', 'pdf', lambda: Response(b'%PDF-1.4' * 1000, mimetype='application/pdf'))
+    return app
+
+
+def test_gzip_page(admin_client):
+    seed(5)
+    plain = admin_client.get('/admin/payments')
+    response = admin_client.get('/admin/payments', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert int(response.headers['Content-Length']) < len(plain.data) / 3
+
+
+def test_brotli_is_preferred_unless_weighted_lower(admin_client):
+    seed(20)
+    response = admin_client.get('/admin/clients/export', headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data).startswith(b'ID,Company Name')
+    response = admin_client.get('/admin/clients/export', headers={'Accept-Encoding': 'br;q=0.5, gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_binary_and_unaccepted_responses_are_untouched(admin_client, stream_app):
+    assert 'Content-Encoding' not in admin_client.get('/admin/api/clients/search?q=zzz',
+                                                      headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in admin_client.get('/admin/payments', headers={'Accept-Encoding': 'zstd'}).headers
+    pdf = stream_app.test_client().get('/invoice.pdf', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in pdf.headers
+    assert pdf.data.startswith(b'%PDF')
+
+
+def test_not_modified_is_untouched(admin_client):
+    seed(1)
+    etag = admin_client.get('/admin/payments').headers['ETag']
+    response = admin_client.get('/admin/payments', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_response_is_flushed_per_chunk(stream_app):
+    response = stream_app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    first = decompressor.decompress(next(response.response))
+    assert first == b'row 0\n' * 50
+    rest = b''.join(decompressor.decompress(chunk) for chunk in response.response)
+    assert rest == b'row 1\n' * 50 + b'row 2\n' * 50
+    response.close()
+
+
+def test_compression_can_be_disabled():
+    app = create_app('api', {'COMPRESS_ENABLED': False})
+    app.add_url_rule('/big', 'big', lambda: Response('x' * 10000, mimetype='text/plain'))
+    assert 'Content-Encoding' not in app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'}).headers
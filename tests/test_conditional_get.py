@@ -0,0 +1,107 @@
+"""
+Conditional GET: pages, JSON endpoints and exports carry ETags built from
+cache generations, and a current copy is answered with a 304 before the
+view runs a query.
+"""
+
+import time
+
+import pytest
+
+from app import AdminUser, Client, License, create_app, db
+from conftest import assert_max_queries, seed
+
+PAGES = ['/admin/licenses', '/admin/payments', '/admin/dashboard', '/admin/api/clients/search?q=client',
+         '/admin/clients/export']
+
+
+@pytest.mark.parametrize('url', PAGES)
+def test_current_copy_is_a_304_without_queries(admin_client, url):
+    seed(2)
+    first = admin_client.get(url)
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('W/"')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    with assert_max_queries(0):
+        again = admin_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert not again.data
+
+
+def test_write_changes_the_etag(admin_client):
+    seed(1)
+    etag = admin_client.get('/admin/licenses').headers['ETag']
+    License.query.filter_by(license_key='GTMS-0000-0').one().is_active = False
+    db.session.commit()
+    response = admin_client.get('/admin/licenses', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_unrelated_write_keeps_the_etag(admin_client):
+    seed(1)
+    etag = admin_client.get('/admin/payments').headers['ETag']
+    License.query.filter_by(license_key='GTMS-0000-0').one().is_active = False
+    db.session.commit()
+    assert admin_client.get('/admin/payments', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_differs_per_query_string(admin_client):
+    seed(1)
+    everything = admin_client.get('/admin/licenses').headers['ETag']
+    assert admin_client.get('/admin/licenses?product=GTMS', headers={'If-None-Match': everything}).status_code == 200
+
+
+def test_page_with_flash_messages_is_not_tagged(admin_client):
+    seed(1)
+    response = admin_client.post('/admin/clients/add', data={'name': 'New Client', 'email': 'new@example.com'},
+                                 follow_redirects=True)
+    assert 'New Client' in response.get_data(as_text=True)
+    assert 'ETag' not in response.headers
+    assert 'ETag' in admin_client.get('/admin/clients').headers
+
+
+def test_if_modified_since(admin_client):
+    seed(1)
+    assert 'Last-Modified' not in admin_client.get('/admin/payments').headers  # changed this second
+    time.sleep(1.1)
+    first = admin_client.get('/admin/payments')
+    assert first.last_modified is not None
+    headers = {'If-Modified-Since': first.headers['Last-Modified']}
+    assert admin_client.get('/admin/payments', headers=headers).status_code == 304
+
+    admin_client.post('/admin/clients/add', data={'name': 'New Client', 'email': 'new@example.com'})
+    assert admin_client.get('/admin/payments', headers=headers).status_code == 200
+
+
+def test_login_is_checked_before_the_etag(client, admin_client):
+    seed(1)
+    etag = admin_client.get('/admin/licenses').headers['ETag']
+    with client.session_transaction() as sess:
+        sess.clear()
+    assert client.get('/admin/licenses', headers={'If-None-Match': etag}).status_code == 302
+
+
+def test_write_from_another_process_changes_the_etag(tmp_path):
+    """A cron script's app on the same database shares the cache by default"""
+    config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'gtms.db'}",
+              'CACHE_SHARED_PATH': str(tmp_path / 'cache')}
+    server, cron = create_app('full', config), create_app('full', config)
+    with server.app_context():
+        db.create_all()
+        seed(1)
+        admin_id = AdminUser.query.first().id  # the default admin
+    client = server.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_id'] = admin_id
+    etag = client.get('/admin/clients').headers['ETag']
+
+    with cron.app_context():
+        db.session.get(Client, 1).name = 'Renamed Client'
+        db.session.commit()
+
+    response = client.get('/admin/clients', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Renamed Client' in response.data
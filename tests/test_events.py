@@ -0,0 +1,175 @@
+"""
+Live dashboard events: what gets published, the in-process SSE stream and
+the asyncio event server fed over a datagram socket.
+"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+from flask import Flask
+
+from app import TrafficRollup, db
+from config import Config
+from conftest import seed
+from utils.events import EventBus, EventServer, bus, publish_event
+
+
+@pytest.fixture
+def published():
+    """Events published on this process's bus during the test"""
+    events = []
+    bus.subscribe(events.append)
+    yield events
+    bus.unsubscribe(events.append)
+
+
+def test_bus_replays_the_backlog_after_last_event_id():
+    events = EventBus(backlog=3)
+    for n in range(5):
+        events.publish('verification', {'n': n})
+    received = []
+    missed = events.subscribe(received.append, last_id=3)
+    assert [event['data']['n'] for event in missed] == [3, 4]
+    events.publish('login', {})
+    assert [event['type'] for event in received] == ['login']
+    assert events.subscribe(received.append) == []
+
+
+def test_api_outcomes_are_published(client, published):
+    ids = seed(1)
+    published.clear()  # seeding publishes its payments
+    client.post('/api/verify-license', json={'license_key': ids['license_key'], 'hardware_id': ids['hardware_id']})
+    client.post('/api/verify-license', json={'license_key': 'UNKNOWN', 'hardware_id': 'HW'})
+    assert [(event['type'], event['data']['reason']) for event in published] == \
+        [('verification', ''), ('denial', 'invalid_key')]
+    assert published[0]['data']['company'] == 'Client 0'
+
+
+def traffic_counts():
+    rows = db.session.query(TrafficRollup.event, TrafficRollup.reason, db.func.sum(TrafficRollup.count)) \
+        .group_by(TrafficRollup.event, TrafficRollup.reason)
+    return {(event, reason): count for event, reason, count in rows}
+
+
+def test_failed_commit_counts_only_the_error(client, published, monkeypatch):
+    ids = seed(1)
+    published.clear()
+    before = traffic_counts()
+
+    def fail():
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    response = client.post('/api/verify-license', json={'license_key': ids['license_key'], 'hardware_id': 'NEW-HW'})
+    assert response.status_code == 500
+    assert [(event['type'], event['data']['reason']) for event in published] == [('denial', 'error')]
+    monkeypatch.undo()
+    db.session.rollback()
+    after = traffic_counts()
+    assert {key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key)} == \
+        {('denial', 'error'): 1}
+
+
+def test_payments_are_published_after_commit(admin_client, published):
+    ids = seed(1)
+    published.clear()
+    admin_client.post('/admin/payments/add', data={'client_id': ids['client_id'], 'amount': '1180',
+                                                   'payment_method': 'UPI', 'payment_for': 'Renewal'})
+    admin_client.post(f"/admin/payments/mark-paid/{ids['pending_payment_id']}")
+    payments = [event['data'] for event in published if event['type'] == 'payment']
+    assert [(p['payments'][0]['client'], p['payments'][0]['status']) for p in payments] == \
+        [('Client 0', 'completed'), ('Client 0', 'completed')]
+    assert payments[0]['payments'][0]['amount'] == 1180
+
+
+def test_bulk_renewal_is_published(admin_client, published):
+    seed(2)
+    admin_client.post('/admin/licenses/renew', data={'days': '30'})
+    renewal = next(event['data'] for event in published if event['type'] == 'renewal')
+    assert renewal['count'] == 4
+    assert len(renewal['renewals']) == 4
+    assert renewal['renewals'][0]['type'] == 'extension'
+
+
+def test_stream_sends_backlog_and_new_events(app, admin_client):
+    first = bus.publish('login', {'reason': ''})
+    bus.publish('verification', {'reason': ''})
+    response = admin_client.get('/admin/events', headers={'Last-Event-ID': str(first['id'])}, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 5000\n\n'
+    assert b'event: verification' in next(chunks)
+    bus.publish('activation', {'company': 'Client 0'})
+    assert next(chunks).startswith(b'id: %d\nevent: activation\ndata: {"company": "Client 0"}' % (first['id'] + 2))
+    response.close()
+
+
+def test_stream_is_left_to_the_event_server(app, admin_client):
+    app.config['EVENTS_SOCKET'] = '/tmp/gtms-test-events.sock'
+    try:
+        assert admin_client.get('/admin/events').status_code == 204
+    finally:
+        app.config['EVENTS_SOCKET'] = ''
+    assert admin_client.get('/admin/events', buffered=False).status_code == 200
+
+
+@pytest.fixture
+def event_server(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(Config)
+    server = EventServer(flask_app, str(tmp_path / 'events.sock'))
+    address, ready = [], threading.Event()
+    loop = asyncio.new_event_loop()
+
+    async def run():
+        try:
+            await server.serve('127.0.0.1', 0, lambda sockname: (address.append(sockname), ready.set()))
+        except asyncio.CancelledError:
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+
+    task = loop.create_task(run())
+    thread = threading.Thread(target=loop.run_until_complete, args=(task,), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield server, address[0], flask_app
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+    loop.run_until_complete(asyncio.sleep(0))  # let the cancelled connections finish
+    loop.close()
+
+
+def sse_request(address, cookie=''):
+    conn = socket.create_connection(address, timeout=5)
+    conn.sendall(f'GET /admin/events HTTP/1.1\r\nHost: x\r\nCookie: {cookie}\r\n\r\n'.encode())
+    return conn
+
+
+def read_until(conn, marker):
+    data = b''
+    while marker not in data:
+        chunk = conn.recv(4096)
+        assert chunk, data
+        data += chunk
+    return data
+
+
+def test_event_server_streams_worker_events(app, event_server):
+    server, address, flask_app = event_server
+    cookie = flask_app.session_interface.get_signing_serializer(flask_app).dumps({'admin_id': 1})
+
+    denied = sse_request(address)
+    assert read_until(denied, b'\r\n\r\n').startswith(b'HTTP/1.1 401')
+
+    conn = sse_request(address, f'session={cookie}')
+    assert b'text/event-stream' in read_until(conn, b'retry: 5000\n\n')
+    app.config['EVENTS_SOCKET'] = server.socket_path
+    try:
+        with app.app_context():
+            publish_event('payment', count=1, payments=[{'client': 'Client 0'}])
+    finally:
+        app.config['EVENTS_SOCKET'] = ''
+    assert b'event: payment\ndata: {"count": 1, "payments": [{"client": "Client 0"}]}' in read_until(conn, b'\n\n')
+    conn.close()
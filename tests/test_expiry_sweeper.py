@@ -0,0 +1,43 @@
+"""
+Expiry sweeper: lapsed subscriptions and licenses are flipped chunk by
+chunk, each transition is logged once, and re-runs find nothing to do.
+"""
+
+from datetime import datetime, timedelta
+
+from app import ActivityLog, License, Subscription, db, expire_lapsed
+from conftest import seed
+
+
+def test_lapsed_rows_are_expired_and_logged_once(database):
+    now = datetime.utcnow()
+    seed(3, now=now)
+    later = now + timedelta(days=10)  # past the 5-day licenses, before the subscriptions end
+
+    assert expire_lapsed(chunk_size=2, now=later) == (0, 4)
+    lapsed = License.query.filter(License.expiry_date < later).all()
+    assert len(lapsed) == 4
+    assert all(not license.is_active and license.expired_at == later for license in lapsed)
+    assert License.query.filter_by(is_active=True).count() == License.query.count() - 4
+    logs = ActivityLog.query.filter_by(action='license_expired').all()
+    assert sorted(log.details for log in logs) == \
+        sorted(f'License {license.license_key} ({license.company_name}) expired' for license in lapsed)
+
+    end = now + timedelta(days=30)
+    assert expire_lapsed(chunk_size=2, now=end) == (3, 0)
+    assert {s.status for s in Subscription.query} == {'expired'}
+    assert ActivityLog.query.filter_by(action='subscription_expired').count() == 3
+
+    assert expire_lapsed(chunk_size=2, now=end) == (0, 0)
+    assert ActivityLog.query.filter(ActivityLog.action.like('%_expired')).count() == 7
+
+
+def test_cancelled_subscriptions_are_left_alone(database):
+    ids = seed(1)
+    subscription = db.session.get(Subscription, ids['subscription_id'])
+    subscription.status = 'cancelled'
+    db.session.commit()
+
+    assert expire_lapsed(now=datetime.utcnow() + timedelta(days=400))[0] == 0
+    db.session.refresh(subscription)
+    assert subscription.status == 'cancelled'
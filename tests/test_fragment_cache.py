@@ -0,0 +1,58 @@
+"""
+{% cache %} fragments are rendered once per data version, and compiled
+templates persist in the bytecode cache directory.
+"""
+
+import os
+import re
+
+import pytest
+from flask import render_template
+
+from app import create_app
+from conftest import count_queries, seed
+
+
+def product_queries(counter):
+    return [statement for statement in counter.statements if 'SELECT DISTINCT license.product_name' in statement]
+
+
+def test_product_options_render_once_per_version(admin_client):
+    seed(2)
+    with count_queries() as cold:
+        admin_client.get('/admin/licenses')
+    with count_queries() as warm:
+        page = admin_client.get('/admin/licenses').get_data(as_text=True)
+    assert len(product_queries(cold)) == 2  # filter buttons and the add form's options
+    assert not product_queries(warm)
+    assert warm.count < cold.count
+    assert '>GTMS Pro</option>' in page
+
+
+def test_license_change_renders_the_fragment_again(admin_client):
+    ids = seed(1)
+    assert 'GTMS Enterprise' not in admin_client.get('/admin/licenses').get_data(as_text=True)
+    admin_client.post('/admin/licenses/add', data={'client_id': ids['client_id'], 'product_name': 'GTMS Enterprise',
+                                                   'subscription_type': 'yearly'})
+    assert '>GTMS Enterprise</option>' in admin_client.get('/admin/licenses').get_data(as_text=True)
+
+
+def test_product_filter_is_keyed_by_selection(admin_client):
+    seed(1)
+    active = re.compile(r'btn-outline-secondary active">\s*(.+?)\s*</a>')
+    assert active.findall(admin_client.get('/admin/licenses').get_data(as_text=True)) == ['All Products']
+    assert active.findall(admin_client.get('/admin/licenses?product=GTMS Pro').get_data(as_text=True)) == ['GTMS Pro']
+
+
+def test_bytecode_cache_is_written(tmp_path):
+    app = create_app(config={'JINJA_BYTECODE_CACHE_DIR': str(tmp_path)})
+    with app.test_request_context():
+        render_template('login.html')
+    assert any(path.suffix == '.cache' for path in tmp_path.iterdir())
+
+
+def test_bytecode_cache_refuses_a_shared_directory(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(RuntimeError, match='no group/other permissions'):
+        create_app(config={'JINJA_BYTECODE_CACHE_DIR': str(tmp_path)})
+    assert create_app(config={'JINJA_BYTECODE_CACHE_DIR': ''}).jinja_env.bytecode_cache is None
@@ -0,0 +1,76 @@
+"""
+Log rotation on SQLite: months leaving the hot window move to month
+tables in chunks, months past retention are archived to .csv.gz, and the
+archives stay searchable.
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from utils.log_partitions import LogRotation
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "logs.db"}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE activity_log '
+                          '(id INTEGER PRIMARY KEY, action TEXT, details TEXT, timestamp DATETIME)'))
+    yield engine
+    engine.dispose()
+
+
+def add_logs(engine, *rows):
+    with engine.begin() as conn:
+        conn.execute(text('INSERT INTO activity_log (action, details, timestamp) '
+                          'VALUES (:action, :details, :timestamp)'),
+                     [{'action': action, 'details': details, 'timestamp': timestamp}
+                      for action, details, timestamp in rows])
+
+
+def hot_months(engine):
+    with engine.connect() as conn:
+        return sorted({row[:7] for row in conn.execute(text('SELECT timestamp FROM activity_log')).scalars()})
+
+
+def test_rotation_moves_archives_and_searches(engine, tmp_path):
+    # Two rows a month from 2025-06 to 2026-10
+    add_logs(engine, *[
+        (action, f'{action} {year}-{month:02d}', datetime(year, month, day))
+        for year, month in [(2025, m) for m in range(6, 13)] + [(2026, m) for m in range(1, 11)]
+        for action, day in (('login', 3), ('license_expired', 20))
+    ])
+    rotation = LogRotation('activity_log', archive_dir=str(tmp_path / 'archives'))
+
+    result = rotation.rotate(engine, now=NOW, hot_months=3, retention_months=12, chunk_size=3)
+
+    assert hot_months(engine) == ['2026-08', '2026-09', '2026-10']
+    assert result['moved'] == 28
+    with engine.connect() as conn:
+        assert sorted(rotation.month_tables(conn)) == [f'activity_log_2025{m:02d}' for m in (11, 12)] + \
+            [f'activity_log_2026{m:02d}' for m in range(1, 8)]
+    assert [path.rsplit('/', 1)[1] for path in result['archived']] == \
+        [f'activity_log_2025{m:02d}.csv.gz' for m in range(6, 11)]
+
+    found = rotation.search_archive(since=datetime(2025, 7, 1), until=datetime(2025, 9, 1), action='license_expired')
+    assert list(found['details']) == ['license_expired 2025-07', 'license_expired 2025-08']
+    assert list(rotation.search_archive(contains='2025-10')['action']) == ['login', 'license_expired']
+
+    assert rotation.rotate(engine, now=NOW, chunk_size=3) == {'created': [], 'detached': [], 'moved': 0, 'archived': []}
+
+
+def test_late_rows_for_an_archived_month_get_their_own_file(engine, tmp_path):
+    rotation = LogRotation('activity_log', archive_dir=str(tmp_path / 'archives'))
+    add_logs(engine, ('login', 'first', datetime(2025, 6, 1)))  # stored without microseconds
+    rotation.rotate(engine, now=NOW)
+    add_logs(engine, ('login', 'late', datetime(2025, 6, 2)))
+
+    assert [path.rsplit('/', 1)[1] for path in rotation.rotate(engine, now=NOW)['archived']] == \
+        ['activity_log_202506-2.csv.gz']
+    assert 'activity_log_202506' not in inspect(engine).get_table_names()
+    assert list(rotation.search_archive(since=datetime(2025, 6, 1), until=datetime(2025, 7, 1))['details']) == \
+        ['first', 'late']
@@ -0,0 +1,76 @@
+"""
+Legacy database migration: chunks are checkpointed so an interrupted run
+resumes where it stopped, re-runs insert nothing, and migrated admins'
+SHA-256 hashes are upgraded on their first login.
+"""
+
+import sys
+
+import pytest
+
+import migrate_legacy_db
+from app import ActivityLog, AdminUser, DeviceAccess, License, db
+from models import Database
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    """A legacy database with one admin, three licenses (two bound) and their logs"""
+    legacy = Database(str(tmp_path / 'license_server.db'))
+    legacy.create_admin('legacy', 'secret', 'legacy@gtms.com')
+    keys = legacy.create_licenses('Acme', 'ops@acme.test', '1_year', 3)
+    for n, key in enumerate(sorted(keys)[:2]):
+        legacy.validate_license(key, f'HW-{n}')
+    return legacy
+
+
+@pytest.fixture
+def migrate(database, legacy, monkeypatch):
+    def migrate():
+        monkeypatch.setattr(sys, 'argv', ['migrate_legacy_db.py', '--source', legacy.db_path, '--chunk-size', '1'])
+        migrate_legacy_db.main()
+        db.session.expire_all()
+
+    yield migrate
+    migrate_legacy_db.checkpoints.drop(db.engine, checkfirst=True)
+
+
+def counts():
+    return License.query.count(), DeviceAccess.query.count(), ActivityLog.query.count(), AdminUser.query.count()
+
+
+def test_interrupted_run_resumes_and_reruns_are_idempotent(migrate, monkeypatch):
+    save_checkpoint = migrate_legacy_db.save_checkpoint
+
+    def interrupt(table_name, last_id):
+        if table_name == 'activation_logs' and last_id > 1:
+            raise KeyboardInterrupt
+        save_checkpoint(table_name, last_id)
+
+    monkeypatch.setattr(migrate_legacy_db, 'save_checkpoint', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        migrate()
+    assert counts() == (3, 2, 1, 1)  # the second log chunk was rolled back
+
+    monkeypatch.setattr(migrate_legacy_db, 'save_checkpoint', save_checkpoint)
+    migrate()
+    assert counts() == (3, 2, 2, 1)
+    migrate()
+    assert counts() == (3, 2, 2, 1)
+
+    assert {log.action for log in ActivityLog.query} == {'first_activation'}
+    assert sorted(device.hardware_id for device in DeviceAccess.query) == ['HW-0', 'HW-1']
+    assert {license.subscription_type for license in License.query} == {'yearly'}
+
+
+def test_legacy_password_is_rehashed_on_login(migrate, client):
+    migrate()
+    admin = AdminUser.query.filter_by(username='legacy').one()
+    assert admin.has_legacy_password
+
+    client.post('/admin/login', data={'username': 'legacy', 'password': 'secret'})
+    db.session.refresh(admin)
+    assert not admin.has_legacy_password
+    assert admin.check_password('secret')
+    with client.session_transaction() as sess:
+        assert sess['admin_id'] == admin.id
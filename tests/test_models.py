@@ -0,0 +1,108 @@
+"""
+Legacy sqlite models: schema-0 databases migrate to epoch dates and
+validation binds, refreshes and logs in one statement.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from models import LEGACY_DATE_FORMAT, SCHEMA_VERSION, Database
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / 'license_server.db'))
+
+
+def query(database, sql, params=()):
+    conn = sqlite3.connect(database.db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def activation_logs(database):
+    return query(database, 'SELECT license_key, hardware_id, action FROM activation_logs')
+
+
+def test_schema_0_dates_are_migrated(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE licenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, license_key TEXT UNIQUE NOT NULL,
+            customer_name TEXT NOT NULL, customer_email TEXT NOT NULL,
+            product_name TEXT DEFAULT 'GTMS', subscription_type TEXT NOT NULL,
+            start_date TEXT NOT NULL, expiry_date TEXT NOT NULL, hardware_id TEXT,
+            is_active INTEGER DEFAULT 1, max_activations INTEGER DEFAULT 1,
+            current_activations INTEGER DEFAULT 0, created_at TEXT NOT NULL, last_validated TEXT);
+        CREATE TABLE activation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, license_key TEXT NOT NULL, hardware_id TEXT NOT NULL,
+            action TEXT NOT NULL, timestamp TEXT NOT NULL, ip_address TEXT);
+        CREATE TABLE admin_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL, email TEXT NOT NULL, created_at TEXT NOT NULL);
+        INSERT INTO licenses (license_key, customer_name, customer_email, subscription_type,
+                              start_date, expiry_date, hardware_id, created_at, last_validated)
+        VALUES ('AAAA-BBBB', 'Acme', 'ops@acme.test', '1_year',
+                '2026-01-01 09:00:00', '2099-01-01 09:00:00', 'HW-1', '2026-01-01 09:00:00', NULL);
+        INSERT INTO activation_logs (license_key, hardware_id, action, timestamp)
+        VALUES ('AAAA-BBBB', 'HW-1', 'FIRST_ACTIVATION', '2026-01-02 10:30:00');
+        INSERT INTO admin_users (username, password_hash, email, created_at)
+        VALUES ('admin', 'x', 'admin@acme.test', '2026-01-01 08:00:00');
+    ''')
+    conn.close()
+
+    database = Database(path)
+
+    assert query(database, 'PRAGMA user_version') == [(SCHEMA_VERSION,)]
+    start, expiry, created, validated = query(
+        database, 'SELECT start_date, expiry_date, created_at, last_validated FROM licenses')[0]
+    assert start == int(time.mktime(time.strptime('2026-01-01 09:00:00', LEGACY_DATE_FORMAT)))
+    assert isinstance(expiry, int) and created == start and validated is None
+    assert query(database, 'SELECT typeof(timestamp) FROM activation_logs') == [('integer',)]
+    assert query(database, 'SELECT typeof(created_at) FROM admin_users') == [('integer',)]
+
+    license = database.get_all_licenses()[0]
+    assert (license[1], license[6], license[7]) == ('AAAA-BBBB', '2026-01-01 09:00:00', '2099-01-01 09:00:00')
+    assert database.validate_license('AAAA-BBBB', 'HW-1')['message'] == 'License valid'
+
+
+def test_first_activation_binds_and_logs_once(database):
+    key = database.create_license('Acme', 'ops@acme.test', '1_year')
+
+    result = database.validate_license(key, 'HW-1')
+    assert result['valid'] is True
+    assert result['message'] == 'License activated successfully'
+    assert result['days_remaining'] in (364, 365)
+    assert activation_logs(database) == [(key, 'HW-1', 'FIRST_ACTIVATION')]
+
+    assert database.validate_license(key, 'HW-1')['message'] == 'License valid'
+    assert activation_logs(database) == [(key, 'HW-1', 'FIRST_ACTIVATION')]
+    assert query(database, 'SELECT current_activations FROM licenses') == [(1,)]
+
+
+@pytest.mark.parametrize('setup, message', [
+    ('UPDATE licenses SET expiry_date = 0', 'Subscription expired. Contact developer.'),
+    ('UPDATE licenses SET is_active = 0', 'License has been deactivated. Contact developer.'),
+    ("UPDATE licenses SET hardware_id = 'HW-OTHER', last_validated = 1", 'License already activated on another machine'),
+])
+def test_rejections_leave_the_license_untouched(database, setup, message):
+    key = database.create_license('Acme', 'ops@acme.test', '1_month')
+    conn = sqlite3.connect(database.db_path)
+    conn.execute(setup)
+    conn.execute('DELETE FROM activation_logs')
+    conn.commit()
+    conn.close()
+    before = query(database, 'SELECT hardware_id, last_validated FROM licenses')
+
+    assert database.validate_license(key, 'HW-1') == {'valid': False, 'message': message}
+    assert query(database, 'SELECT hardware_id, last_validated FROM licenses') == before
+    assert activation_logs(database) == []
+
+
+def test_unknown_key_is_rejected(database):
+    assert database.validate_license('NOPE', 'HW-1') == {'valid': False, 'message': 'Invalid license key'}
@@ -0,0 +1,162 @@
+"""
+N+1 regression guard: every admin and API route runs the same number of SQL
+statements whether the database holds a few clients or many.
+"""
+
+from collections import namedtuple
+
+import pytest
+
+from conftest import USER_PASSWORD, assert_max_queries, count_queries, reset_database, seed
+
+SMALL = 2
+LARGE = 12
+
+Route = namedtuple('Route', 'endpoint method path form json', defaults=(None, None))
+
+ROUTES = [
+    # Dashboard and reports
+    Route('admin.dashboard', 'GET', '/admin/dashboard'),
+    Route('admin.revenue_report', 'GET', '/admin/reports'),
+    Route('admin.cohort_report', 'GET', '/admin/reports/cohorts'),
+    Route('admin.traffic_report', 'GET', '/admin/reports/traffic'),
+    Route('admin.timeseries_api', 'GET', '/admin/api/timeseries?metric=verifications'),
+    Route('api.prometheus_metrics', 'GET', '/metrics'),
+
+    # Employees
+    Route('admin.employees_list', 'GET', '/admin/employees'),
+    Route('admin.employee_detail', 'GET', '/admin/employees/{admin_id}'),
+    Route('admin.edit_employee', 'POST', '/admin/employees/edit/{admin_id}',
+          form={'full_name': 'Renamed Admin', 'can_manage_clients': 'on', 'can_manage_licenses': 'on',
+                'can_manage_payments': 'on', 'can_manage_users': 'on'}),
+    Route('admin.add_employee', 'GET', '/admin/employees/add'),
+    Route('admin.add_employee', 'POST', '/admin/employees/add',
+          form={'username': 'staff', 'email': 'staff@gtms.com', 'password': 'staff123'}),
+    Route('admin.admin_login', 'GET', '/admin/login'),
+    Route('admin.admin_login', 'POST', '/admin/login', form={'username': 'admin', 'password': 'admin123'}),
+    Route('admin.admin_logout', 'GET', '/admin/logout'),
+
+    # GTMS users and devices
+    Route('admin.users_list', 'GET', '/admin/users'),
+    Route('admin.add_user', 'POST', '/admin/users/add',
+          form={'username': 'new-user', 'full_name': 'New User', 'password': 'secret', 'license_id': '{license_id}'}),
+    Route('admin.edit_user', 'POST', '/admin/users/edit/{user_id}',
+          form={'full_name': 'Renamed User', 'license_id': '{license_id}', 'is_active': 'true'}),
+    Route('admin.toggle_user_status', 'POST', '/admin/users/toggle-status/{user_id}/0'),
+    Route('admin.delete_user', 'POST', '/admin/users/delete/{user_id}'),
+    Route('admin.devices_list', 'GET', '/admin/devices'),
+    Route('admin.deactivate_device', 'POST', '/admin/devices/deactivate/{device_id}'),
+
+    # Clients
+    Route('admin.clients_list', 'GET', '/admin/clients'),
+    Route('admin.add_client', 'POST', '/admin/clients/add', form={'name': 'New Client', 'email': 'new@example.com'}),
+    Route('admin.edit_client', 'POST', '/admin/clients/edit/{client_id}', form={'name': 'Renamed Client'}),
+    Route('admin.delete_client', 'POST', '/admin/clients/delete/{client_id}'),
+    Route('admin.toggle_client_status', 'POST', '/admin/clients/toggle-status/{client_id}/inactive'),
+    Route('admin.view_client', 'GET', '/admin/clients/view/{client_id}'),
+    Route('admin.export_clients', 'GET', '/admin/clients/export'),
+
+    # Subscriptions and payments
+    Route('admin.subscriptions_list', 'GET', '/admin/subscriptions'),
+    Route('admin.add_subscription', 'POST', '/admin/subscriptions/add',
+          form={'client_id': '{client_id}', 'plan_type': 'monthly', 'plan_name': 'Monthly', 'amount': '1000'}),
+    Route('admin.bulk_renew_subscriptions', 'POST', '/admin/subscriptions/renew', form={'days': '30'}),
+    Route('admin.payments_list', 'GET', '/admin/payments'),
+    Route('admin.outstanding_payments', 'GET', '/admin/payments/outstanding'),
+    Route('admin.mark_payment_paid', 'POST', '/admin/payments/mark-paid/{pending_payment_id}'),
+    Route('admin.add_payment', 'POST', '/admin/payments/add',
+          form={'client_id': '{client_id}', 'amount': '1180', 'payment_method': 'UPI', 'payment_for': 'Renewal'}),
+    Route('admin.generate_invoice', 'GET', '/admin/payments/generate-invoice/{payment_id}'),
+
+    # Licenses
+    Route('admin.licenses_list', 'GET', '/admin/licenses'),
+    Route('admin.add_license', 'POST', '/admin/licenses/add',
+          form={'client_id': '{client_id}', 'product_name': 'GTMS', 'subscription_type': 'yearly'}),
+    Route('admin.bulk_add_license', 'POST', '/admin/licenses/bulk',
+          form={'client_id': '{client_id}', 'quantity': '5', 'send_emails': 'on'}),
+    Route('admin.bulk_renew_licenses', 'POST', '/admin/licenses/renew', form={'days': '30'}),
+
+    # Typeahead search
+    Route('admin.search_clients', 'GET', '/admin/api/clients/search?q=cli'),
+    Route('admin.search_licenses', 'GET', '/admin/api/licenses/search?q=cli&active=1'),
+    Route('admin.search_users', 'GET', '/admin/api/users/search?q=user'),
+
+    # GTMS application API
+    Route('api.verify_license_api', 'POST', '/api/verify-license',
+          json={'license_key': '{license_key}', 'hardware_id': '{hardware_id}'}),
+    Route('api.activate_license_api', 'POST', '/api/activate-license',
+          json={'license_key': '{license_key}', 'hardware_id': 'HW-NEW'}),
+    Route('api.deactivate_license_api', 'POST', '/api/deactivate-license',
+          json={'license_key': '{license_key}', 'hardware_id': '{hardware_id}'}),
+    Route('api.api_login', 'POST', '/api/login', json={'username': '{username}', 'password': USER_PASSWORD}),
+    Route('api.validate_login', 'POST', '/api/validate',
+          json={'username': '{username}', 'password': USER_PASSWORD, 'hardware_id': '{hardware_id}'}),
+]
+
+# Routes that are not part of the admin panel or API proper
+NOT_COVERED = {
+    'static',
+    'asset',                # fingerprinted static files, served from memory
+    'admin.event_stream',   # endless SSE stream, no queries
+    'admin.test_email',     # sends a real email
+    'admin.create_tables',  # DDL only
+}
+
+
+def fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    return value
+
+
+def measure(client, route, clients):
+    """Seed `clients` clients, then count the statements one request to `route` runs"""
+    reset_database()
+    ids = seed(clients)
+    with client.session_transaction() as sess:
+        sess['admin_id'] = ids['admin_id']
+        sess['admin_username'] = 'admin'
+
+    with count_queries() as counter:
+        response = client.open(fill(route.path, ids), method=route.method,
+                               data=fill(route.form, ids), json=fill(route.json, ids))
+    assert response.status_code < 500, response.get_data(as_text=True)[:500]
+    return counter
+
+
+@pytest.mark.parametrize('route', ROUTES, ids=lambda route: f'{route.method} {route.endpoint}')
+def test_query_count_does_not_grow_with_rows(client, route):
+    small = measure(client, route, SMALL)
+    large = measure(client, route, LARGE)
+    assert large.count <= small.count, (
+        f'{route.method} {route.path}: {small.count} queries with {SMALL} clients, '
+        f'{large.count} with {LARGE}:\n{large}'
+    )
+
+
+def test_every_route_is_covered(app):
+    covered = {route.endpoint for route in ROUTES}
+    missing = {rule.endpoint for rule in app.url_map.iter_rules()} - covered - NOT_COVERED
+    assert not missing, f'Add these endpoints to ROUTES: {sorted(missing)}'
+
+
+# Statements per call on the GTMS application's hot paths, including the
+# traffic rollup write-through
+API_BUDGETS = {
+    'api.verify_license_api': 6,
+    'api.activate_license_api': 7,
+    'api.deactivate_license_api': 3,
+    'api.api_login': 6,
+    'api.validate_login': 10,
+}
+
+
+@pytest.mark.parametrize('route', [route for route in ROUTES if route.endpoint in API_BUDGETS],
+                         ids=lambda route: route.endpoint)
+def test_api_query_budget(client, route):
+    ids = seed(SMALL)
+    with assert_max_queries(API_BUDGETS[route.endpoint]):
+        response = client.post(fill(route.path, ids), json=fill(route.json, ids))
+    assert response.status_code == 200, response.get_json()
@@ -0,0 +1,79 @@
+"""
+Bulk renewals: one INSERT ... SELECT logs the old and new dates, one UPDATE
+shifts them, and lapsed licenses or subscriptions are revived.
+"""
+
+from datetime import datetime, timedelta
+
+from app import (
+    License, RenewalLog, Subscription, db, license_renewal_filters, renew_licenses, renew_subscriptions,
+    subscription_renewal_filters,
+)
+from conftest import seed
+
+
+def test_licenses_are_extended_and_logged(database):
+    ids = seed(2)
+    lapsed = License.query.filter_by(client_id=ids['client_id']).order_by(License.id).first()
+    lapsed.expiry_date = datetime.utcnow() - timedelta(days=10)
+    lapsed.is_active, lapsed.expired_at = False, datetime.utcnow() - timedelta(days=10)
+    db.session.commit()
+    before = {license.id: license.expiry_date for license in License.query.filter_by(client_id=ids['client_id'])}
+    others = {license.id: license.expiry_date for license in License.query.filter(License.client_id != ids['client_id'])}
+
+    extended = renew_licenses(30, license_renewal_filters({'client_id': ids['client_id']}),
+                              renewed_by='admin', notes='goodwill')
+
+    assert extended == len(before) == 2
+    db.session.expire_all()
+    after = {license.id: license.expiry_date for license in License.query.filter_by(client_id=ids['client_id'])}
+    assert after == {id: expiry + timedelta(days=30) for id, expiry in before.items()}
+    assert lapsed.is_active and lapsed.expired_at is None
+
+    logs = RenewalLog.query.filter_by(renewal_type='extension').order_by(RenewalLog.license_id).all()
+    assert [(log.license_id, log.old_expiry_date, log.new_expiry_date) for log in logs] == \
+        [(id, before[id], after[id]) for id in sorted(before)]
+    assert {(log.client_id, log.renewed_by, log.notes) for log in logs} == {(ids['client_id'], 'admin', 'goodwill')}
+    assert {license.id: license.expiry_date
+            for license in License.query.filter(License.client_id != ids['client_id'])} == others
+
+
+def test_short_extensions_leave_lapsed_licenses_inactive(database):
+    ids = seed(1)
+    license = db.session.get(License, ids['license_id'])
+    license.expiry_date = datetime.utcnow() - timedelta(days=10)
+    license.is_active, license.expired_at = False, datetime.utcnow() - timedelta(days=10)
+    db.session.commit()
+
+    assert renew_licenses(5, license_renewal_filters({'license_ids': [license.id]})) == 1
+    db.session.refresh(license)
+    assert not license.is_active and license.expired_at is not None
+
+
+def test_expired_subscriptions_are_revived(database):
+    ids = seed(1)
+    subscription = db.session.get(Subscription, ids['subscription_id'])
+    subscription.status = 'expired'
+    subscription.end_date = subscription.next_billing_date = datetime.utcnow() - timedelta(days=3)
+    db.session.commit()
+    old_end = subscription.end_date
+
+    assert renew_subscriptions(30, subscription_renewal_filters({'status': 'expired'}), renewed_by='admin') == 1
+
+    db.session.refresh(subscription)
+    assert subscription.status == 'active'
+    assert subscription.end_date == subscription.next_billing_date == old_end + timedelta(days=30)
+    log = RenewalLog.query.filter_by(subscription_id=subscription.id).one()
+    assert (log.renewal_type, log.old_expiry_date, log.new_expiry_date) == \
+        ('subscription_renewal', old_end, subscription.end_date)
+
+
+def test_route_rejects_non_positive_extensions(admin_client):
+    ids = seed(1)
+    expiry = db.session.get(License, ids['license_id']).expiry_date
+    admin_client.post('/admin/licenses/renew', data={'days': '0', 'license_ids': [ids['license_id']]})
+    with admin_client.session_transaction() as sess:
+        assert sess.pop('_flashes')[-1][1] == '✗ Extension must be at least one day.'
+    admin_client.post('/admin/licenses/renew', data={'days': '7', 'license_ids': [ids['license_id']]})
+    db.session.expire_all()
+    assert db.session.get(License, ids['license_id']).expiry_date == expiry + timedelta(days=7)
@@ -0,0 +1,266 @@
+"""
+Shared cache backends, generation invalidation across processes, and the
+license and dashboard caches in the app.
+"""
+
+import fnmatch
+import os
+import socketserver
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app import License, Payment, create_app, db, revenue_metrics
+from conftest import assert_max_queries, count_queries, seed
+from utils.shared_cache import LocalBackend, RedisBackend, SharedCache, SharedMemoryBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """Just enough of the Redis protocol (RESP2) for RedisBackend"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, list):
+            self.wfile.write(b'*%d\r\n' % len(value))
+            for item in value:
+                self.reply(item)
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        data = self.server.data
+        while (args := self.read_command()) is not None:
+            command = args[0].upper()
+            with self.server.lock:
+                now = time.time()
+                for key in [key for key, (_, expires) in data.items() if expires and expires < now]:
+                    del data[key]
+                if command == b'GET':
+                    self.reply(data.get(args[1], (None, 0))[0])
+                elif command == b'SET':
+                    ttl = int(args[4]) / 1000 if len(args) > 4 and args[3].upper() == b'PX' else 0
+                    data[args[1]] = (args[2], now + ttl if ttl else 0)
+                    self.wfile.write(b'+OK\r\n')
+                elif command in (b'INCR', b'INCRBY'):
+                    value = int(data.get(args[1], (b'0', 0))[0]) + (int(args[2]) if len(args) > 2 else 1)
+                    data[args[1]] = (str(value).encode(), 0)
+                    self.reply(value)
+                elif command == b'DEL':
+                    self.reply(sum(data.pop(key, None) is not None for key in args[1:]))
+                elif command == b'SCAN':
+                    pattern = args[args.index(b'MATCH') + 1].decode() if b'MATCH' in args else '*'
+                    self.reply([b'0', [key for key in data if fnmatch.fnmatch(key.decode(), pattern)]])
+                else:  # CLIENT SETINFO, SELECT, PING
+                    self.wfile.write(b'+OK\r\n')
+
+
+@pytest.fixture
+def redis_url():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RespHandler)
+    server.daemon_threads = True
+    server.data, server.lock = {}, threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'redis://127.0.0.1:{server.server_address[1]}/0'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['local', 'shared', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'local':
+        return LocalBackend()
+    if request.param == 'shared':
+        return SharedMemoryBackend(str(tmp_path / 'cache'), slots=64, slot_size=256)
+    return RedisBackend(request.getfixturevalue('redis_url'), prefix='test:')
+
+
+def test_get_set_and_ttl(backend):
+    cache = SharedCache(backend, prefix='test:')
+    assert cache.get('licenses', 'KEY') is None
+    cache.set('licenses', 'KEY', {'valid': True})
+    cache.set('licenses', 'SHORT', 1, ttl=0.05)
+    assert cache.get('licenses', 'KEY') == {'valid': True}
+    assert cache.get('licenses', 'SHORT') == 1
+    time.sleep(0.1)
+    assert cache.get('licenses', 'SHORT') is None
+
+
+def test_invalidate_bumps_only_its_namespace(backend):
+    cache = SharedCache(backend, prefix='test:')
+    cache.set('licenses', 'KEY', 'license')
+    cache.set('admins', 1, 'admin')
+    cache.invalidate('licenses')
+    assert cache.get('licenses', 'KEY') is None
+    assert cache.get('admins', 1) == 'admin'
+    assert cache.generation('licenses') == 1
+
+
+def test_get_or_set_caches_none(backend):
+    cache = SharedCache(backend, prefix='test:')
+    calls = []
+    for _ in range(2):
+        assert cache.get_or_set('licenses', 'UNKNOWN', lambda: calls.append(1)) is None
+    assert len(calls) == 1
+
+
+def test_invalidation_during_load_is_not_overwritten(backend):
+    cache = SharedCache(backend, prefix='test:')
+
+    def load():
+        cache.invalidate('licenses')  # another worker commits while this one reads
+        return 'OLD'
+
+    assert cache.get_or_set('licenses', 'KEY', load) == 'OLD'
+    assert cache.get('licenses', 'KEY') is None
+    assert cache.get_or_set('licenses', 'KEY', lambda: 'NEW') == 'NEW'
+
+
+def test_epoch_and_last_modified(backend):
+    cache = SharedCache(backend, prefix='test:')
+    token, started = cache.epoch()
+    assert cache.epoch() == (token, started)
+    assert cache.last_modified('licenses') is None
+    cache.invalidate('licenses')
+    assert started <= cache.last_modified('licenses') <= time.time()
+    cache.clear()
+    assert cache.epoch()[0] != token
+    assert cache.last_modified('licenses') is None
+
+
+def test_shared_memory_eviction_keeps_counters(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / 'cache'), slots=8, slot_size=128)
+    cache = SharedCache(backend)
+    cache.invalidate('licenses')
+    for n in range(100):
+        cache.set('licenses', n, n)
+    assert cache.generation('licenses') == 1
+    assert cache.get('licenses', 99) == 99
+    assert not backend.set('too-big', b'x' * 200)
+
+
+def test_shared_memory_is_seen_by_other_processes(tmp_path):
+    path = str(tmp_path / 'cache')
+    cache = SharedCache(SharedMemoryBackend(path))
+    cache.set('licenses', 'KEY', 'cached')
+    worker = (
+        'import sys\n'
+        'from utils.shared_cache import SharedCache, SharedMemoryBackend\n'
+        'cache = SharedCache(SharedMemoryBackend(sys.argv[1]))\n'
+        "print(cache.get('licenses', 'KEY'))\n"
+        "cache.invalidate('licenses')\n"
+    )
+    result = subprocess.run([sys.executable, '-c', worker, path], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'cached'
+    assert cache.get('licenses', 'KEY') is None
+
+
+def test_shared_memory_creates_a_private_directory(tmp_path):
+    path = tmp_path / 'gtms-runtime' / 'cache'
+    SharedCache(SharedMemoryBackend(str(path))).set('licenses', 'KEY', 'cached')
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_shared_memory_refuses_files_others_can_write(tmp_path):
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(RuntimeError, match='no group/other permissions'):
+        SharedMemoryBackend(str(tmp_path / 'cache'))
+
+    os.chmod(tmp_path, 0o700)
+    path = tmp_path / 'cache'
+    path.write_bytes(b'planted')
+    os.chmod(path, 0o666)
+    cache = SharedCache(SharedMemoryBackend(str(path)))
+    assert cache.get('licenses', 'KEY', 'default') == 'default'  # nothing is read from it
+    assert path.read_bytes() == b'planted'
+
+
+def test_backend_failure_is_a_miss():
+    cache = SharedCache(RedisBackend('redis://127.0.0.1:1/0'))
+    assert cache.get_or_set('licenses', 'KEY', lambda: 'loaded') == 'loaded'
+    cache.invalidate('licenses')
+
+
+def test_verify_reuses_the_cached_license(client):
+    ids = seed(2)
+    payload = {'license_key': ids['license_key'], 'hardware_id': ids['hardware_id']}
+    with count_queries() as cold:
+        client.post('/api/verify-license', json=payload)
+    with assert_max_queries(cold.count - 1):
+        assert client.post('/api/verify-license', json=payload).status_code == 200
+
+
+def test_license_change_reaches_other_workers(tmp_path):
+    """Two apps on one database and one shared segment, like two gunicorn workers"""
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'gtms.db'}",
+        'CACHE_BACKEND': 'shared',
+        'CACHE_SHARED_PATH': str(tmp_path / 'cache'),
+    }
+    first, second = create_app('api', config), create_app('api', config)
+    with first.app_context():
+        db.create_all()
+        ids = seed(1)
+    payload = {'license_key': ids['license_key'], 'hardware_id': ids['hardware_id']}
+    assert first.test_client().post('/api/verify-license', json=payload).status_code == 200
+
+    with second.app_context():
+        License.query.filter_by(license_key=ids['license_key']).one().is_active = False
+        db.session.commit()
+
+    response = first.test_client().post('/api/verify-license', json=payload)
+    assert response.status_code == 403
+    assert response.get_json()['message'] == 'License has been deactivated'
+
+
+def test_payment_from_another_process_refreshes_revenue(tmp_path):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'gtms.db'}",
+        'CACHE_BACKEND': 'shared',
+        'CACHE_SHARED_PATH': str(tmp_path / 'cache'),
+    }
+    first, second = create_app('api', config), create_app('api', config)
+    with first.app_context():
+        db.create_all()
+        ids = seed(1)
+        before = revenue_metrics()
+        assert revenue_metrics() is before
+
+    with second.app_context():
+        db.session.get(Payment, ids['pending_payment_id']).status = 'completed'
+        db.session.commit()
+
+    with first.app_context():
+        after = revenue_metrics()
+    assert after['outstanding_count'] == before['outstanding_count'] - 1
+    assert after['total_revenue'] > before['total_revenue']
+
+
+def test_admin_write_refreshes_dashboard_counts(admin_client):
+    seed(1)
+    assert b'Client 1' not in admin_client.get('/admin/dashboard').data
+    with count_queries() as warm:
+        admin_client.get('/admin/dashboard')
+    admin_client.post('/admin/clients/add', data={'name': 'Client 1', 'email': 'c1@example.com'})
+    with count_queries() as after_write:
+        admin_client.get('/admin/dashboard')
+    assert after_write.count > warm.count
@@ -0,0 +1,43 @@
+"""
+Time series API: ranges are validated (naive UTC, bounded span) and
+answered with 400s instead of failing inside pandas.
+"""
+
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import pytest
+
+from conftest import seed
+
+
+def timeseries(admin_client, query):
+    return admin_client.get(f'/admin/api/timeseries?{query}')
+
+
+def test_timezone_aware_dates_are_converted_to_utc(admin_client):
+    seed(1)
+    response = timeseries(admin_client, 'metric=verifications&start=2026-10-01T05:30:00%2B05:30&end=2026-10-08')
+    assert response.status_code == 200
+    assert response.get_json()['start'] == '2026-10-01T00:00:00'
+
+    response = timeseries(admin_client, 'metric=revenue&start=2026-10-01T00:00:00Z&end=2026-10-02T00:00:00Z')
+    assert response.status_code == 200
+    assert response.get_json()['raw_points'] == 1
+
+    yesterday = quote((datetime.now(timezone.utc) - timedelta(days=1)).isoformat())
+    assert timeseries(admin_client, f'metric=logins&start={yesterday}').status_code == 200  # end defaults to now
+
+
+@pytest.mark.parametrize('query', [
+    'start=1600-01-01',
+    'start=2026-01-01&end=9999-12-31',
+    'start=2020-01-01&end=2026-01-01',
+    'start=2026-02-01&end=2026-01-01',
+    'start=0001-01-01T00:00:00%2B01:00',
+    'start=yesterday',
+])
+def test_bad_ranges_are_rejected(admin_client, query):
+    response = timeseries(admin_client, f'metric=verifications&{query}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
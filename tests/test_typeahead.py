@@ -0,0 +1,114 @@
+"""
+Typeahead search endpoints: case-insensitive prefix matches, capped at a
+limit, and the list pages no longer load whole tables for their selects.
+"""
+
+from sqlalchemy import literal, select
+
+from app import AdminUser, Client, License, db
+from conftest import count_queries, seed
+from utils.sql_functions import fold, prefix_match
+
+
+def results(admin_client, url):
+    response = admin_client.get(url)
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_clients_match_name_prefix_case_insensitively(admin_client):
+    seed(12)
+    labels = [item['label'] for item in results(admin_client, '/admin/api/clients/search?q=cLIENT 1')]
+    assert labels == ['Client 1', 'Client 10', 'Client 11']
+    assert results(admin_client, '/admin/api/clients/search?q=nobody') == []
+
+
+def test_limit_is_respected_and_capped(admin_client):
+    seed(60)
+    assert len(results(admin_client, '/admin/api/clients/search')) == 20
+    assert len(results(admin_client, '/admin/api/clients/search?limit=5')) == 5
+    assert len(results(admin_client, '/admin/api/clients/search?limit=1000')) == 50
+
+
+def test_licenses_match_key_or_company(admin_client):
+    seed(2)
+    by_key = results(admin_client, '/admin/api/licenses/search?q=gtms-0001')
+    assert [item['license_key'] for item in by_key] == ['GTMS-0001-0', 'GTMS-0001-1']
+    assert by_key[0]['label'] == 'Client 1 (GTMS-0001-0)'
+    assert len(results(admin_client, '/admin/api/licenses/search?q=client 0')) == 2
+
+
+def test_non_ascii_names_match_in_either_case(admin_client):
+    db.session.add_all([Client(name='Élan Systems', email='elan@example.com'),
+                        Client(name='Ölmühle Nord', email='oel@example.com')])
+    db.session.commit()
+    for q in ('élan', 'ÉLAN', 'Élan s'):
+        assert [item['label'] for item in results(admin_client, f'/admin/api/clients/search?q={q}')] == \
+            ['Élan Systems']
+    assert [item['label'] for item in results(admin_client, '/admin/api/clients/search?q=ölmühle')] == \
+        ['Ölmühle Nord']
+
+
+def test_prefix_range_handles_the_last_code_points(database):
+    def matches(value, prefix):
+        return db.session.scalar(select(prefix_match(fold(literal(value)), prefix)))
+
+    assert matches('ab\U0010ffff', 'ab\U0010ffff')
+    assert matches('ab\U0010ffffz', 'ab\U0010ffff')
+    assert not matches('ac', 'ab\U0010ffff')
+    assert matches('\U0010ffff', '\U0010ffff')
+    assert matches('a\ud7ffx', 'a\ud7ff')
+    assert not matches('a\ue000', 'a\ud7ff')
+
+
+def test_active_filter(admin_client):
+    seed(1)
+    License.query.filter_by(license_key='GTMS-0000-0').one().is_active = False
+    db.session.commit()
+    keys = [item['license_key'] for item in results(admin_client, '/admin/api/licenses/search?q=GTMS&active=1')]
+    assert keys == ['GTMS-0000-1']
+
+
+def test_users_match_username_or_full_name(admin_client):
+    seed(2)
+    assert [item['username'] for item in results(admin_client, '/admin/api/users/search?q=USER1')] == \
+        ['user1-0', 'user1-1']
+    assert [item['label'] for item in results(admin_client, '/admin/api/users/search?q=user 0-1')] == \
+        ['User 0-1 (user0-1)']
+
+
+def test_devices_are_filtered_by_the_picked_user(admin_client):
+    ids = seed(2)
+    html = admin_client.get(f"/admin/devices?user_id={ids['user_id']}").get_data(as_text=True)
+    assert 'data-typeahead="/admin/api/users/search"' in html
+    assert f'<option value="{ids["user_id"]}" selected>User 0-0 (user0-0)</option>' in html
+    assert 'HW-0-0' in html and 'HW-1-0' not in html
+    assert admin_client.get('/admin/devices?user_id=999999').status_code == 404
+
+
+def test_search_needs_login(client):
+    assert client.get('/admin/api/clients/search?q=a').status_code == 302
+
+
+def test_search_needs_a_permission_of_the_pages_using_it(admin_client):
+    seed(1)
+    admin = AdminUser.query.one()
+    admin.can_manage_clients = admin.can_manage_licenses = admin.can_manage_users = False
+    db.session.commit()
+    assert admin_client.get('/admin/api/clients/search?q=c').status_code == 200  # payments
+    for url in ('/admin/api/licenses/search?q=GTMS', '/admin/api/users/search?q=user'):
+        response = admin_client.get(url)
+        assert response.status_code == 302
+        assert response.location.endswith('/admin/dashboard')
+    assert '/admin/api/users/search' not in admin_client.get('/admin/devices').get_data(as_text=True)
+
+
+def test_list_pages_do_not_load_whole_tables(admin_client):
+    seed(3)
+    for page in ('/admin/licenses', '/admin/payments', '/admin/subscriptions', '/admin/users'):
+        with count_queries() as counter:
+            html = admin_client.get(page).get_data(as_text=True)
+        assert 'data-typeahead=' in html
+        assert not [statement for statement in counter.statements if 'FROM client ORDER BY client.name' in statement]
+        assert not [statement for statement in counter.statements
+                    if statement.startswith('SELECT') and 'FROM license \nWHERE license.is_active' in statement]
@@ -0,0 +1,161 @@
+"""
+Revenue analytics: MRR, ARR, churn, expansion and per-product revenue.
+
+Subscription and payment columns are bulk-loaded into DataFrames with
+read_sql (in chunks) and every metric is computed with vectorized pandas
+operations. Results are cached per day and per data version: callers pass
+the shared cache generations of the tables involved, so a write from any
+process (another worker, billing_run.py, sweep_expired.py) gives the next
+read a new key.
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from utils.metrics import CACHE_REQUESTS
+
+# Months covered by one billing period of each recurring plan type.
+# Lifetime plans are one-off sales: they are reported separately and add
+# nothing to MRR.
+PLAN_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+# Window used for churn / expansion / new MRR
+CHURN_WINDOW_DAYS = 30
+
+READ_CHUNK_SIZE = 50000
+
+SUBSCRIPTION_SQL = '''
+    SELECT id, client_id, plan_type, amount, status, start_date, end_date
+    FROM subscription
+'''
+
+PAYMENT_SQL = '''
+    SELECT p.amount, p.status, p.payment_date,
+           COALESCE(l.product_name, sl.product_name) AS product_name
+    FROM payment p
+    LEFT JOIN license l ON l.id = p.license_id
+    LEFT JOIN subscription s ON s.id = p.subscription_id
+    LEFT JOIN license sl ON sl.id = s.license_id
+'''
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def read_frame(connectable, sql, parse_dates=(), params=None, chunksize=READ_CHUNK_SIZE):
+    """Run a query through read_sql in chunks and concatenate the result"""
+    chunks = pd.read_sql(sql, connectable, params=params, chunksize=chunksize)
+    frame = pd.concat(list(chunks), ignore_index=True)
+    # SQLite hands back DATETIME text with and without microseconds;
+    # read_sql's own parse_dates infers one format and drops the rest as NaT
+    for column in parse_dates:
+        frame[column] = pd.to_datetime(frame[column], format='ISO8601')
+    return frame
+
+
+def load_subscriptions(connectable):
+    subs = read_frame(connectable, SUBSCRIPTION_SQL, parse_dates=['start_date', 'end_date'])
+    subs['plan_type'] = subs['plan_type'].astype('category')
+    subs['status'] = subs['status'].astype('category')
+    subs['amount'] = subs['amount'].astype('float64')
+    return subs
+
+
+def load_payments(connectable):
+    payments = read_frame(connectable, PAYMENT_SQL, parse_dates=['payment_date'])
+    payments['status'] = payments['status'].astype('category')
+    payments['product_name'] = payments['product_name'].fillna('Unassigned')
+    payments['amount'] = payments['amount'].astype('float64')
+    return payments
+
+
+def monthly_value(subs):
+    """Each subscription's amount normalized to one month (0 for lifetime)"""
+    months = subs['plan_type'].astype(object).map(PLAN_MONTHS).astype('float64')
+    return (subs['amount'] / months).fillna(0.0)
+
+
+def mrr_by_client(subs, value, at):
+    """MRR per client from subscriptions running at time `at`"""
+    running = (subs['start_date'] <= at) & (subs['end_date'] > at) & (subs['status'] != 'cancelled')
+    return value[running].groupby(subs.loc[running, 'client_id']).sum()
+
+
+def compute_revenue_metrics(subs, payments, now=None):
+    """All revenue metrics from the subscription and payment frames"""
+    now = now or datetime.utcnow()
+    window_start = now - timedelta(days=CHURN_WINDOW_DAYS)
+    value = monthly_value(subs)
+
+    active = (subs['status'] == 'active') & (subs['end_date'] > now)
+    mrr = float(value[active].sum())
+
+    # Client-level MRR movement across the churn window
+    before = mrr_by_client(subs, value, window_start)
+    after = value[active].groupby(subs.loc[active, 'client_id']).sum()
+    movement = pd.concat([before.rename('before'), after.rename('after')], axis=1).fillna(0.0)
+    delta = movement['after'] - movement['before']
+    churned = (movement['before'] > 0) & (movement['after'] == 0)
+    retained = (movement['before'] > 0) & (movement['after'] > 0)
+    mrr_before = float(movement['before'].sum())
+    clients_before = int((movement['before'] > 0).sum())
+
+    plan_mrr = value[active].groupby(subs.loc[active, 'plan_type'].astype(object)).sum()
+    lifetime = active & (subs['plan_type'] == 'lifetime')
+
+    completed = payments[payments['status'] == 'completed']
+    pending = payments[payments['status'] == 'pending']
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    recent = completed[completed['payment_date'] >= month_start - pd.DateOffset(months=11)]
+    monthly_revenue = recent.groupby(recent['payment_date'].dt.to_period('M'))['amount'].sum()
+
+    return {
+        'computed_at': now,
+        'mrr': mrr,
+        'arr': mrr * 12,
+        'active_subscriptions': int(active.sum()),
+        'mrr_by_plan': {plan: float(amount) for plan, amount in plan_mrr.items()},
+        'lifetime_subscriptions': int(lifetime.sum()),
+        'lifetime_value': float(subs.loc[lifetime, 'amount'].sum()),
+
+        'new_mrr': float(movement.loc[movement['before'] == 0, 'after'].sum()),
+        'expansion_mrr': float(delta[retained].clip(lower=0).sum()),
+        'contraction_mrr': float(abs(delta[retained].clip(upper=0).sum())),
+        'churned_mrr': float(movement.loc[churned, 'before'].sum()),
+        'churned_clients': int(churned.sum()),
+        'customer_churn_rate': churned.sum() / clients_before if clients_before else 0.0,
+        'revenue_churn_rate': movement.loc[churned, 'before'].sum() / mrr_before if mrr_before else 0.0,
+
+        'total_revenue': float(completed['amount'].sum()),
+        'month_revenue': float(completed.loc[completed['payment_date'] >= month_start, 'amount'].sum()),
+        'outstanding_amount': float(pending['amount'].sum()),
+        'outstanding_count': int(len(pending)),
+        'revenue_by_product': {
+            product: float(amount)
+            for product, amount in completed.groupby('product_name')['amount'].sum()
+            .sort_values(ascending=False).items()
+        },
+        'revenue_by_month': [(month.strftime('%Y-%m'), float(amount)) for month, amount in monthly_revenue.items()],
+    }
+
+
+def revenue_snapshot(engine, version=(), today=None):
+    """Revenue metrics for `engine`, computed once per day and data `version`"""
+    key = (str(engine.url), today or date.today(), version)
+    with _cache_lock:
+        snapshot = _cache.get(key)
+    if snapshot is not None:
+        CACHE_REQUESTS.labels(cache='revenue', result='hit').inc()
+        return snapshot
+
+    CACHE_REQUESTS.labels(cache='revenue', result='miss').inc()
+    with engine.connect() as conn:
+        snapshot = compute_revenue_metrics(load_subscriptions(conn), load_payments(conn))
+
+    with _cache_lock:
+        for stale in [k for k in _cache if k[0] == key[0]]:
+            del _cache[stale]
+        _cache[key] = snapshot
+    return snapshot
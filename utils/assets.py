@@ -0,0 +1,128 @@
+"""
+Fingerprinted static assets, without a build step.
+
+At startup every file under static/ is hashed into a manifest. Templates
+call asset_url('css/style.css'), which gives /assets/css/style.<hash>.css.
+That URL never changes content, so it is served with a year-long
+"immutable" Cache-Control and browsers stop revalidating it. Editing the
+file changes the hash and the URL.
+
+Text assets are compressed once, at startup, with gzip and brotli (when
+installed) at their highest levels. The encoding is picked from
+Accept-Encoding per request.
+
+A URL with an outdated hash still serves the current file, without the
+long-lived headers. This covers pages rendered before a deploy. In debug
+mode files are hashed again when they change.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import abort, current_app, request, url_for
+
+from utils.compression import brotli, encodings
+
+HASH_LENGTH = 12
+
+
+class Asset:
+    def __init__(self, path, name):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.mtime = os.path.getmtime(path)
+        self.digest = hashlib.sha256(self.data).hexdigest()[:HASH_LENGTH]
+        root, ext = os.path.splitext(name)
+        self.url_name = f'{root}.{self.digest}{ext}'
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.variants = {}
+
+    def precompress(self, compressible):
+        if self.mimetype not in compressible:
+            return
+        compressed = {'gzip': gzip.compress(self.data, 9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(self.data, quality=11)
+        self.variants = {encoding: data for encoding, data in compressed.items() if len(data) < len(self.data)}
+
+
+class AssetManifest:
+    """Logical name ('css/style.css') -> Asset, for every file under `folder`"""
+
+    def __init__(self, folder, compressible=()):
+        self.folder = folder
+        self.compressible = compressible
+        self.assets = {}
+        self.refresh()
+
+    def refresh(self):
+        """Hash new and changed files again; drop removed ones"""
+        seen = set()
+        for directory, _, files in os.walk(self.folder):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                seen.add(name)
+                current = self.assets.get(name)
+                if current is None or current.mtime != os.path.getmtime(path):
+                    asset = Asset(path, name)
+                    asset.precompress(self.compressible)
+                    self.assets[name] = asset
+        for name in set(self.assets) - seen:
+            del self.assets[name]
+        self.version = hashlib.sha256(
+            ''.join(sorted(asset.url_name for asset in self.assets.values())).encode()).hexdigest()[:HASH_LENGTH]
+
+    def lookup(self, url_name):
+        """(asset, current) for a fingerprinted name; current is False for an outdated hash"""
+        directory, _, filename = url_name.rpartition('/')
+        root, dot, ext = filename.rpartition('.')
+        stem, _, digest = root.rpartition('.')
+        if not dot or not stem:
+            return None, False
+        name = f'{directory}/{stem}.{ext}' if directory else f'{stem}.{ext}'
+        asset = self.assets.get(name)
+        return asset, asset is not None and asset.digest == digest
+
+
+def current_manifest():
+    manifest = current_app.extensions['assets']
+    if current_app.debug:
+        manifest.refresh()
+    return manifest
+
+
+def asset_url(filename):
+    """Fingerprinted URL of a file under static/ (plain static URL if it is not in the manifest)"""
+    asset = current_manifest().assets.get(filename)
+    if asset is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=asset.url_name)
+
+
+def serve_asset(filename):
+    asset, current = current_manifest().lookup(filename)
+    if asset is None:
+        abort(404)
+
+    encoding = request.accept_encodings.best_match([e for e in encodings() if e in asset.variants])
+    response = current_app.response_class(asset.variants.get(encoding, asset.data), mimetype=asset.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    if current:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['ASSET_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def init_app(app):
+    app.extensions['assets'] = AssetManifest(app.static_folder, app.config['COMPRESS_MIMETYPES'])
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
@@ -0,0 +1,223 @@
+"""
+Cohort analysis: clients grouped by the month of their first license.
+
+For every cohort the renewal matrix holds the share of clients that renewed
+(RenewalLog) in each month after joining, and the retention matrix the share
+still covered by a license expiry_date or a non-cancelled subscription
+end_date. Both are pandas pivots over the whole history.
+
+Matrices are cached per database and refreshed incrementally: each read
+compares cheap high-water marks (last RenewalLog / License id, latest
+Subscription.updated_at) with the previous refresh and recomputes only the
+cohorts of clients that changed since. A new calendar month, or deleted rows,
+trigger a full rebuild.
+"""
+
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from utils.analytics import read_frame
+from utils.metrics import CACHE_REQUESTS
+
+# Matrix columns: months since the cohort month (0 = the joining month)
+MAX_OFFSET_MONTHS = 24
+
+# Client ids per IN (...) list when loading changed cohorts
+IN_CHUNK_SIZE = 500
+
+MEMBERS_SQL = '''
+    SELECT client_id, MIN(created_at) AS first_license
+    FROM license WHERE client_id IS NOT NULL {where}
+    GROUP BY client_id
+'''
+
+COVERAGE_SQL = '''
+    SELECT client_id, MAX(expiry_date) AS covered_until
+    FROM license WHERE client_id IS NOT NULL {where}
+    GROUP BY client_id
+    UNION ALL
+    SELECT client_id, MAX(end_date) AS covered_until
+    FROM subscription WHERE status != 'cancelled' {where}
+    GROUP BY client_id
+'''
+
+RENEWALS_SQL = '''
+    SELECT client_id, renewal_date
+    FROM renewal_log WHERE client_id IS NOT NULL {where}
+'''
+
+WATERMARK_SQL = '''
+    SELECT (SELECT MAX(id) FROM renewal_log) AS renewal_id,
+           (SELECT COUNT(*) FROM renewal_log) AS renewal_count,
+           (SELECT MAX(id) FROM license) AS license_id,
+           (SELECT COUNT(*) FROM license) AS license_count,
+           (SELECT MAX(updated_at) FROM subscription) AS subscription_updated
+'''
+
+CHANGED_CLIENTS_SQL = '''
+    SELECT client_id FROM renewal_log WHERE id > :renewal_id
+    UNION
+    SELECT client_id FROM license WHERE id > :license_id AND client_id IS NOT NULL
+    UNION
+    SELECT client_id FROM subscription WHERE updated_at > :subscription_updated
+'''
+
+_state = {}
+_lock = threading.Lock()
+
+
+def month_index(dates):
+    """Datetimes to consecutive month numbers (year * 12 + month - 1)"""
+    return dates.dt.year * 12 + dates.dt.month - 1
+
+
+def month_label(index):
+    return f'{index // 12}-{index % 12 + 1:02d}'
+
+
+def query_clients(conn, sql, client_ids=None, parse_dates=()):
+    """Run a {where}-templated query for every client, or for client_ids in chunks"""
+    if client_ids is None:
+        return read_frame(conn, text(sql.format(where='')), parse_dates)
+
+    stmt = text(sql.format(where='AND client_id IN :ids')).bindparams(bindparam('ids', expanding=True))
+    ids = [int(client_id) for client_id in client_ids]
+    return pd.concat([
+        read_frame(conn, stmt, parse_dates, params={'ids': ids[i:i + IN_CHUNK_SIZE]})
+        for i in range(0, len(ids), IN_CHUNK_SIZE)
+    ], ignore_index=True)
+
+
+def load_cohorts(conn, client_ids=None):
+    """client_id -> cohort month number"""
+    members = query_clients(conn, MEMBERS_SQL, client_ids, parse_dates=['first_license'])
+    return pd.Series(month_index(members['first_license']).to_numpy(dtype='int64'),
+                     index=members['client_id'].to_numpy(dtype='int64'))
+
+
+def compute_cohorts(cohort, coverage, renewals, current_month):
+    """Renewal matrix, retention matrix and per-cohort summary for the clients in `cohort`"""
+    offsets = np.arange(MAX_OFFSET_MONTHS + 1)
+    size = cohort.value_counts().sort_index()
+    # Cells later than the current month have not been observed yet
+    observed = pd.DataFrame((size.index.to_numpy()[:, None] + offsets) <= current_month,
+                            index=size.index, columns=offsets)
+
+    # A client is retained k months in while some license / subscription
+    # still covers that month
+    until = (month_index(coverage['covered_until']).groupby(coverage['client_id']).max()
+             .reindex(cohort.index).fillna(cohort).to_numpy())
+    tenure = until - cohort.to_numpy()
+    retention = (pd.DataFrame(tenure[:, None] >= offsets, index=cohort.index, columns=offsets)
+                 .groupby(cohort.to_numpy()).mean().where(observed))
+
+    renewal_cohort = renewals['client_id'].map(cohort)
+    renewals = renewals.assign(
+        cohort=renewal_cohort,
+        offset=month_index(renewals['renewal_date']) - renewal_cohort,
+    ).dropna(subset=['cohort']).astype({'cohort': 'int64', 'offset': 'int64'})
+    renewed = renewals.groupby('cohort')['client_id'].nunique()
+    windowed = renewals[renewals['offset'].between(0, MAX_OFFSET_MONTHS)]
+    renewal = (windowed.pivot_table(index='cohort', columns='offset', values='client_id', aggfunc='nunique')
+               .reindex(index=size.index, columns=offsets).fillna(0)
+               .div(size, axis=0).where(observed))
+
+    summary = pd.DataFrame({
+        'clients': size,
+        'renewed': renewed.reindex(size.index).fillna(0).astype('int64'),
+        'retained': pd.Series(until >= current_month, index=cohort.index)
+                    .groupby(cohort.to_numpy()).sum().reindex(size.index).astype('int64'),
+    })
+    return renewal, retention, summary
+
+
+def build_state(conn, cohort, current_month, client_ids=None):
+    """Matrices for `cohort`, loading coverage and renewals for client_ids only"""
+    coverage = query_clients(conn, COVERAGE_SQL, client_ids, parse_dates=['covered_until'])
+    renewals = query_clients(conn, RENEWALS_SQL, client_ids, parse_dates=['renewal_date'])
+    return compute_cohorts(cohort, coverage, renewals, current_month)
+
+
+def cohort_report(state):
+    """Label the cached matrices by month and add the per-year roll-up"""
+    renewal, retention, summary = state['renewal'], state['retention'], state['summary']
+    labels = [month_label(index) for index in summary.index]
+
+    years = summary.groupby(summary.index // 12).sum()
+    years['renewal_rate'] = years['renewed'] / years['clients']
+    years['retention_rate'] = years['retained'] / years['clients']
+
+    summary = summary.assign(renewal_rate=summary['renewed'] / summary['clients'],
+                             retention_rate=summary['retained'] / summary['clients'])
+    return {
+        'computed_at': state['computed_at'],
+        'recomputed_cohorts': state['recomputed_cohorts'],
+        'offsets': list(renewal.columns),
+        'renewal': renewal.set_axis(labels),
+        'retention': retention.set_axis(labels),
+        'summary': summary.set_axis(labels),
+        'years': years,
+    }
+
+
+def _full_refresh(conn, marks, now):
+    current_month = now.year * 12 + now.month - 1
+    cohort = load_cohorts(conn)
+    renewal, retention, summary = build_state(conn, cohort, current_month)
+    return {
+        'marks': marks, 'month': current_month, 'computed_at': now, 'cohort': cohort,
+        'renewal': renewal, 'retention': retention, 'summary': summary,
+        'recomputed_cohorts': len(summary),
+    }
+
+
+def _incremental_refresh(conn, state, marks, now):
+    previous = state['marks']
+    changed = conn.execute(text(CHANGED_CLIENTS_SQL), {
+        'renewal_id': previous['renewal_id'] or 0,
+        'license_id': previous['license_id'] or 0,
+        'subscription_updated': previous['subscription_updated'] or datetime.min,
+    }).scalars().all()
+    fresh = load_cohorts(conn, changed) if changed else pd.Series(dtype='int64')
+    cohort = state['cohort']
+    affected = set(cohort.reindex(changed).dropna().astype('int64')) | set(fresh)
+    cohort = pd.concat([cohort.drop(changed, errors='ignore'), fresh]).sort_index()
+
+    members = cohort[cohort.isin(affected)]
+    parts = build_state(conn, members, state['month'], members.index) if len(members) else None
+
+    merged = {}
+    for position, name in enumerate(('renewal', 'retention', 'summary')):
+        frames = [state[name].drop(list(affected), errors='ignore')]
+        if parts is not None:
+            frames.append(parts[position])
+        merged[name] = pd.concat(frames).sort_index()
+
+    return dict(state, marks=marks, computed_at=now, cohort=cohort,
+                recomputed_cohorts=len(affected), **merged)
+
+
+def cohort_snapshot(engine, now=None):
+    """Cohort renewal / retention report for `engine`, refreshed incrementally"""
+    now = now or datetime.utcnow()
+    key = str(engine.url)
+    with _lock, engine.connect() as conn:
+        marks = dict(conn.execute(text(WATERMARK_SQL)).mappings().one())
+        state = _state.get(key)
+        if (state is None or state['month'] != now.year * 12 + now.month - 1
+                or marks['license_count'] < state['marks']['license_count']
+                or marks['renewal_count'] < state['marks']['renewal_count']):
+            state = _full_refresh(conn, marks, now)
+            CACHE_REQUESTS.labels(cache='cohorts', result='miss').inc()
+        elif marks != state['marks']:
+            state = _incremental_refresh(conn, state, marks, now)
+            CACHE_REQUESTS.labels(cache='cohorts', result='partial').inc()
+        else:
+            state = dict(state, recomputed_cohorts=0)
+            CACHE_REQUESTS.labels(cache='cohorts', result='hit').inc()
+        _state[key] = state
+    return cohort_report(state)
@@ -0,0 +1,121 @@
+"""
+gzip / brotli response compression, negotiated through Accept-Encoding.
+
+Text responses (COMPRESS_MIMETYPES: HTML, CSV, JSON, JS, CSS) of at least
+COMPRESS_MIN_SIZE bytes are compressed in an after_request hook. Anything
+else, including PDFs and images that are compressed already, is left as
+is. Brotli is preferred when the brotli package is installed and the
+client accepts it, gzip otherwise.
+
+Streamed responses (generators, send_file) are compressed chunk by chunk,
+with a flush after every chunk, so each part still reaches the client as
+soon as it is produced.
+"""
+
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+class GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def encodings():
+    """Content codings this process can produce, preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compressor(encoding, config):
+    if encoding == 'br':
+        return BrotliStream(config['COMPRESS_BROTLI_QUALITY'])
+    return GzipStream(config['COMPRESS_LEVEL'])
+
+
+def compress_stream(chunks, stream):
+    for chunk in chunks:
+        data = stream.compress(chunk) + stream.flush()
+        if data:
+            yield data
+    yield stream.finish()
+
+
+class Compression:
+    """Compresses the app's responses; see the module docstring"""
+
+    def __init__(self, app):
+        self.config = app.config
+        app.after_request(self.compress)
+
+    def compressible(self, response):
+        return (
+            response.status_code == 200
+            and response.mimetype in self.config['COMPRESS_MIMETYPES']
+            and 'Content-Encoding' not in response.headers
+            and 'no-transform' not in response.headers.get('Cache-Control', '')
+        )
+
+    def compress(self, response):
+        if not self.compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(encodings())
+        if encoding is None or request.method == 'HEAD':
+            return response
+        stream = compressor(encoding, self.config)
+
+        if response.is_streamed or response.direct_passthrough:
+            source = response.response
+            response.response = compress_stream(response.iter_encoded(), stream)
+            if hasattr(source, 'close'):
+                response.call_on_close(source.close)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(stream.compress(data) + stream.finish())
+
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Accept-Ranges', None)  # ranges would be of the identity bytes
+        # The compressed bytes differ from the identity ones
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def init_app(app):
+    if app.config['COMPRESS_ENABLED']:
+        Compression(app)
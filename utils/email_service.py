@@ -2,14 +2,12 @@ from flask_mail import Message
 from flask import render_template, current_app
 import os
 
-def send_templated_email(subject, recipients, template_name, **kwargs):
-    """
-    Send an HTML email rendered from a Jinja template.
-    Optional: attachment_path=<full path to PDF>.
-    """
-    # Get mail instance from current app context
-    mail = current_app.extensions['mail']
+from utils.job_queue import email_queue
+from utils.profiling import profile_span
+
 
+def _build_message(subject, recipients, template_name, **kwargs):
+    """Render a templated email into a flask_mail Message"""
     if isinstance(recipients, str):
         recipients = [recipients]
 
@@ -33,4 +31,36 @@ def send_templated_email(subject, recipients, template_name, **kwargs):
         except Exception as e:
             print("Error attaching file:", e)
 
-    mail.send(msg)
+    return msg
+
+
+def send_templated_email(subject, recipients, template_name, **kwargs):
+    """
+    Send an HTML email rendered from a Jinja template.
+    Optional: attachment_path=<full path to PDF>.
+    """
+    # Get mail instance from current app context
+    mail = current_app.extensions['mail']
+    msg = _build_message(subject, recipients, template_name, **kwargs)
+    with profile_span('smtp'):
+        mail.send(msg)
+
+
+def send_templated_emails(emails):
+    """
+    Send many templated emails over a single SMTP connection.
+    Each item is a dict of send_templated_email keyword arguments.
+    """
+    mail = current_app.extensions['mail']
+    with mail.connect() as conn:
+        for email in emails:
+            try:
+                conn.send(_build_message(**email))
+            except Exception as e:
+                print(f"Error sending email to {email.get('recipients')}:", e)
+
+
+def queue_templated_emails(emails):
+    """Hand a batch of emails to the background email queue as one job"""
+    if emails:
+        email_queue.enqueue(current_app._get_current_object(), send_templated_emails, list(emails))
@@ -0,0 +1,237 @@
+"""
+Live events for the admin dashboard, pushed as server-sent events (SSE).
+
+publish_event('verification', company=...) hands an event to an EventBus, which
+keeps the last EVENTS_BACKLOG events (for clients reconnecting with
+Last-Event-ID) and passes each one to the open streams.
+
+    EVENTS_SOCKET empty   the bus of this process; /admin/events streams it
+                          (single-process servers, development, tests)
+    EVENTS_SOCKET set     the bus of event_server.py: every worker sends
+                          its events there as datagrams on that socket,
+                          and the reverse proxy routes /admin/events to it
+
+Under gunicorn the second form keeps idle dashboards off the workers: one
+asyncio thread holds all the connections. Publishing never blocks the
+request; an event that cannot be delivered is dropped.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+from collections import deque
+from http.cookies import SimpleCookie
+
+from flask import Response, current_app, stream_with_context
+
+
+class EventBus:
+    """Numbered in-process events with a bounded backlog and subscriber callbacks"""
+
+    def __init__(self, backlog=200):
+        self._events = deque(maxlen=backlog)
+        self._ids = itertools.count(1)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = {'id': next(self._ids), 'type': event_type, 'data': data}
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event)
+        return event
+
+    def subscribe(self, callback, last_id=None):
+        """Start calling callback(event); returns the backlog after `last_id` (none if None)"""
+        with self._lock:
+            self._subscribers.add(callback)
+            if last_id is None:
+                return []
+            return [event for event in self._events if event['id'] > last_id]
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.discard(callback)
+
+
+bus = EventBus()
+
+_sender = None
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def publish_event(event_type, **data):
+    """Send a dashboard event (see the module docstring); never raises"""
+    path = current_app.config['EVENTS_SOCKET']
+    if not path:
+        bus.publish(event_type, data)
+        return
+
+    global _sender
+    try:
+        if _sender is None or _sender[0] != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            _sender = (os.getpid(), sock)
+        _sender[1].sendto(json.dumps({'type': event_type, 'data': data}, default=str).encode(), path)
+    except OSError:
+        pass  # event server not running, or its queue is full
+
+
+def stream_response(last_id=None):
+    """SSE response from this process's bus; holds a thread while the client is connected"""
+    heartbeat = current_app.config['EVENTS_HEARTBEAT']
+    events = queue.Queue(maxsize=current_app.config['EVENTS_BACKLOG'])
+
+    def deliver(event):
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            pass  # a stalled client misses events rather than blocking publishers
+
+    def generate():
+        missed = bus.subscribe(deliver, last_event_id(last_id))
+        try:
+            yield 'retry: 5000\n\n'
+            for event in missed:
+                yield format_event(event)
+            while True:
+                try:
+                    yield format_event(events.get(timeout=heartbeat))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            bus.unsubscribe(deliver)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+class EventServer:
+    """
+    asyncio SSE server for event_server.py. Receives events as JSON
+    datagrams on `socket_path` and streams them on GET /admin/events to
+    clients whose Flask session cookie holds an admin_id.
+    """
+
+    PATH = '/admin/events'
+    MAX_HEADER = 16384
+
+    def __init__(self, flask_app, socket_path):
+        self.config = flask_app.config
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.socket_path = socket_path
+        self.bus = EventBus(self.config['EVENTS_BACKLOG'])
+
+    # ---- events from the workers ----
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data)
+            self.bus.publish(message['type'], message['data'])
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    def connection_made(self, transport):
+        pass
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+    # ---- dashboard connections ----
+
+    def admin_session(self, cookie_header):
+        morsel = SimpleCookie(cookie_header).get(self.config['SESSION_COOKIE_NAME'])
+        if morsel is None:
+            return None
+        try:
+            session = self.serializer.loads(morsel.value, max_age=self.max_age)
+        except Exception:
+            return None
+        return session if session.get('admin_id') is not None else None
+
+    async def read_request(self, reader):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        if len(head) > self.MAX_HEADER:
+            raise ValueError('request head too large')
+        request_line, *lines = head.decode('latin-1').split('\r\n')
+        method, target, _ = request_line.split(' ', 2)
+        headers = {}
+        for line in lines:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return method, target.split('?', 1)[0], headers
+
+    async def handle(self, reader, writer):
+        events = asyncio.Queue(maxsize=self.config['EVENTS_BACKLOG'])
+
+        def deliver(event):
+            try:
+                events.put_nowait(event)
+            except asyncio.QueueFull:
+                writer.close()  # too slow to keep up; it reconnects with Last-Event-ID
+
+        subscribed = False
+        try:
+            method, path, headers = await self.read_request(reader)
+            if method != 'GET' or path != self.PATH:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                return
+            if self.admin_session(headers.get('cookie', '')) is None:
+                writer.write(b'HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                return
+
+            missed = self.bus.subscribe(deliver, last_event_id(headers.get('last-event-id')))
+            subscribed = True
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                         b'X-Accel-Buffering: no\r\n\r\nretry: 5000\n\n')
+            writer.write(''.join(format_event(event) for event in missed).encode())
+            await writer.drain()
+            while not writer.is_closing():
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=self.config['EVENTS_HEARTBEAT'])
+                    writer.write(format_event(event).encode())
+                except asyncio.TimeoutError:
+                    writer.write(b': keep-alive\n\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            if subscribed:
+                self.bus.unsubscribe(deliver)
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        loop = asyncio.get_running_loop()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.socket_path)
+        await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        server = await asyncio.start_server(self.handle, host, port, limit=self.MAX_HEADER)
+        if ready is not None:
+            ready(server.sockets[0].getsockname())
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,66 @@
+"""
+Template caching: a persistent Jinja bytecode cache and a {% cache %} tag.
+
+Compiled templates are written to JINJA_BYTECODE_CACHE_DIR, so a new
+worker loads them instead of compiling every template again. Loading them
+runs their code, so the directory must be private to this user: Jinja's own
+per-user directory by default, and a configured one is checked like the
+shared cache's.
+
+{% cache %} stores a rendered fragment in the shared cache (namespace
+'fragments'). The key is the template name, the tag's arguments and
+APP_VERSION. Pass data_version(namespace, ...) so the fragment is rendered
+again after the data changes:
+
+    {% cache 'product-options', data_version('licenses') %}
+        {% for name in products|map(attribute='product_name') %}<option>{{ name }}</option>{% endfor %}
+    {% endcache %}
+
+Views can hand the template an unexecuted query: on a hit the loop never
+runs, so neither does the query.
+"""
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from utils.shared_cache import current_cache, private_directory
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [nodes.Const(parser.name), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        key = ':'.join(str(part) for part in [*parts, current_app.config['APP_VERSION']])
+        cache = current_cache()
+        html = cache.get('fragments', key)
+        if html is None:
+            html = str(caller())
+            cache.set('fragments', key, html, ttl=current_app.config['FRAGMENT_CACHE_TTL'])
+        return Markup(html)
+
+
+def data_version(*namespaces):
+    """Current generations of shared cache namespaces, for fragment keys"""
+    cache = current_cache()
+    return '-'.join(str(cache.generation(namespace)) for namespace in namespaces)
+
+
+def init_app(app):
+    directory = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if directory is None:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()  # creates and checks its own 0700 directory
+    elif directory:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(private_directory(directory))
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['data_version'] = data_version
@@ -0,0 +1,59 @@
+import queue
+import threading
+import traceback
+
+from utils.metrics import JOB_QUEUE_DEPTH
+
+
+class JobQueue:
+    """
+    In-process FIFO of background jobs drained by one daemon worker thread.
+    Each job runs inside the app context of the app that enqueued it, so
+    jobs can use render_template, current_app and db.session.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        JOB_QUEUE_DEPTH.labels(queue=name).set(0)
+
+    def enqueue(self, app, func, *args, **kwargs):
+        """Schedule func(*args, **kwargs) to run in the background"""
+        self._queue.put((app, func, args, kwargs))
+        JOB_QUEUE_DEPTH.labels(queue=self.name).set(self._queue.qsize())
+        self._ensure_worker()
+
+    def depth(self):
+        """Number of jobs waiting to run"""
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued job has finished"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name=f'{self.name}-worker', daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            app, func, args, kwargs = self._queue.get()
+            try:
+                with app.app_context():
+                    func(*args, **kwargs)
+            except Exception:
+                print(f"[{self.name}] job {getattr(func, '__name__', func)} failed:")
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+                JOB_QUEUE_DEPTH.labels(queue=self.name).set(self._queue.qsize())
+
+
+email_queue = JobQueue('email')
+invoice_queue = JobQueue('invoice')
@@ -0,0 +1,319 @@
+"""
+Monthly partitioning, rotation and archival for append-only log tables.
+
+The hot table (e.g. activity_log) only keeps the most recent months:
+
+* PostgreSQL: partition() converts the table once into a native declarative
+  partitioned table (PARTITION BY RANGE on the timestamp column) with one
+  partition per month, named <table>_YYYYMM, plus a DEFAULT partition.
+  rotate() pre-creates upcoming partitions and DETACHes the months that left
+  the hot window, which only touches catalog metadata.
+* SQLite, or a PostgreSQL table that has not been converted: rotate() moves
+  the rows of months that left the hot window into <table>_YYYYMM tables
+  with chunked INSERT ... SELECT / DELETE, one transaction per chunk.
+
+Month tables older than the retention window are written to
+<archive_dir>/<table>_YYYYMM.csv.gz and dropped. search_archive() scans
+those files with pandas.
+"""
+
+import csv
+import glob
+import gzip
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, bindparam, func, inspect, select, text
+from sqlalchemy.sql import column, table
+
+ARCHIVE_CHUNK_SIZE = 10000
+
+MONTH_SUFFIX = re.compile(r'_(\d{6})(?:-\d+)?(?:\.csv\.gz)?$')
+
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+class LogRotation:
+    """Partitioning / rotation / archival of one log table by a DateTime column"""
+
+    def __init__(self, table_name, column_name='timestamp', archive_dir='archives'):
+        self.table = table_name
+        self.column = column_name
+        self.archive_dir = archive_dir
+        self._hot = table(table_name, column('id', Integer), column(column_name, DateTime))
+
+    def month_table(self, month):
+        return f'{self.table}_{month:%Y%m}'
+
+    def month_of(self, name):
+        """Month encoded in a month table or archive file name, or None"""
+        if not os.path.basename(name).startswith(f'{self.table}_'):
+            return None
+        match = MONTH_SUFFIX.search(name)
+        return datetime.strptime(match.group(1), '%Y%m') if match else None
+
+    def month_tables(self, conn):
+        """{table name: month} for every <table>_YYYYMM table in the database"""
+        tables = {}
+        for name in inspect(conn).get_table_names():
+            month = self.month_of(name)
+            if month and name == self.month_table(month):
+                tables[name] = month
+        return tables
+
+    def _quote(self, conn, name):
+        return conn.dialect.identifier_preparer.quote(name)
+
+    # ---- PostgreSQL native partitioning ----
+
+    def is_partitioned(self, conn):
+        if conn.dialect.name != 'postgresql':
+            return False
+        kind = conn.execute(text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)'),
+                            {'name': self.table}).scalar()
+        return kind == 'p'
+
+    def attached_partitions(self, conn):
+        if not self.is_partitioned(conn):
+            return set()
+        return set(conn.execute(text('''
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(:name)
+        '''), {'name': self.table}).scalars())
+
+    def _create_partition(self, conn, month):
+        """Create and attach the partition for `month`, moving matching rows out of DEFAULT"""
+        parent, key = self._quote(conn, self.table), self._quote(conn, self.column)
+        name = self._quote(conn, self.month_table(month))
+        default = self._quote(conn, f'{self.table}_default')
+        start, end = month, add_months(month, 1)
+
+        conn.execute(text(f'CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        conn.execute(text(f'''
+            WITH moved AS (
+                DELETE FROM {default} WHERE {key} >= :start AND {key} < :end RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        '''), {'start': start, 'end': end})
+        conn.execute(text(
+            f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        ))
+
+    def ensure_partitions(self, conn, now, months_ahead=2):
+        """Make sure partitions exist from this month to `months_ahead` months out"""
+        existing = self.month_tables(conn)
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(month_start(now), offset)
+            if self.month_table(month) not in existing:
+                self._create_partition(conn, month)
+                created.append(self.month_table(month))
+        return created
+
+    def partition(self, engine, now=None, months_ahead=2):
+        """
+        One-time conversion of the table into a PostgreSQL partitioned table,
+        in a single transaction. The primary key becomes (id, column) because
+        it has to include the partition key; indexes must be recreated on
+        the new parent afterwards. Returns False if already partitioned.
+        """
+        now = now or datetime.utcnow()
+        with engine.begin() as conn:
+            if conn.dialect.name != 'postgresql':
+                raise ValueError('native partitioning requires PostgreSQL')
+            if self.is_partitioned(conn):
+                return False
+
+            parent, key = self._quote(conn, self.table), self._quote(conn, self.column)
+            legacy = self._quote(conn, f'{self.table}_unpartitioned')
+            sequence = conn.execute(text('SELECT pg_get_serial_sequence(:name, :column)'),
+                                    {'name': self.table, 'column': 'id'}).scalar()
+            foreign_keys = conn.execute(text('''
+                SELECT pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = to_regclass(:name) AND contype = 'f'
+            '''), {'name': self.table}).scalars().all()
+
+            conn.execute(text(f'ALTER TABLE {parent} RENAME TO {legacy}'))
+            if sequence:
+                conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+            # Partition keys are part of the primary key and cannot be NULL
+            conn.execute(text(f'UPDATE {legacy} SET {key} = :epoch WHERE {key} IS NULL'),
+                         {'epoch': datetime(1970, 1, 1)})
+
+            conn.execute(text(
+                f'CREATE TABLE {parent} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ({key})'
+            ))
+            conn.execute(text(f'ALTER TABLE {parent} ALTER COLUMN {key} SET NOT NULL'))
+            for definition in foreign_keys:
+                conn.execute(text(f'ALTER TABLE {parent} ADD {definition}'))
+            conn.execute(text(
+                f'CREATE TABLE {self._quote(conn, self.table + "_default")} PARTITION OF {parent} DEFAULT'
+            ))
+
+            # Rows that had no timestamp stay in the DEFAULT partition
+            first = conn.execute(text(f'SELECT MIN({key}) FROM {legacy} WHERE {key} > :epoch'),
+                                 {'epoch': datetime(1970, 1, 1)}).scalar() or now
+            month, last = month_start(first), add_months(month_start(now), months_ahead)
+            while month <= last:
+                self._create_partition(conn, month)
+                month = add_months(month, 1)
+
+            conn.execute(text(f'INSERT INTO {parent} SELECT * FROM {legacy}'))
+            conn.execute(text(f'DROP TABLE {legacy}'))
+            # Added once the old table (and its <table>_pkey index name) is gone
+            conn.execute(text(f'ALTER TABLE {parent} ADD PRIMARY KEY (id, {key})'))
+            if sequence:
+                conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {parent}.id'))
+        return True
+
+    # ---- Rotation ----
+
+    def _move_month_chunks(self, engine, hot_since, chunk_size):
+        """Fallback: move rows older than hot_since into month tables, chunk by chunk"""
+        hot, key = self._hot, self._hot.c[self.column]
+        moved = 0
+        while True:
+            with engine.begin() as conn:
+                first = conn.execute(select(func.min(key)).where(key < hot_since)).scalar()
+                if first is None:
+                    break
+                if isinstance(first, str):
+                    first = datetime.fromisoformat(first)
+                month = month_start(first)
+                # No lower bound: nothing is older than `first`, and on SQLite
+                # '2025-06-01 00:00:00' sorts before the bound parameter
+                # '2025-06-01 00:00:00.000000', which would select no rows
+                ids = conn.execute(
+                    select(hot.c.id)
+                    .where(key < min(add_months(month, 1), hot_since))
+                    .order_by(hot.c.id).limit(chunk_size)
+                ).scalars().all()
+
+                source, target = self._quote(conn, self.table), self._quote(conn, self.month_table(month))
+                by_id = bindparam('ids', expanding=True)
+                conn.execute(text(f'CREATE TABLE IF NOT EXISTS {target} AS SELECT * FROM {source} WHERE 1 = 0'))
+                conn.execute(text(f'INSERT INTO {target} SELECT * FROM {source} WHERE id IN :ids')
+                             .bindparams(by_id), {'ids': ids})
+                conn.execute(text(f'DELETE FROM {source} WHERE id IN :ids').bindparams(by_id), {'ids': ids})
+            moved += len(ids)
+        return moved
+
+    def rotate(self, engine, now=None, hot_months=3, retention_months=12, chunk_size=5000):
+        """
+        Keep `hot_months` months (including the current one) in the hot table
+        and `retention_months` months in the database; archive the rest.
+        Returns {'created': [...], 'detached': [...], 'moved': n, 'archived': [...]}.
+        """
+        now = now or datetime.utcnow()
+        hot_since = add_months(month_start(now), -(hot_months - 1))
+        keep_since = add_months(month_start(now), -(retention_months - 1))
+        result = {'created': [], 'detached': [], 'moved': 0, 'archived': []}
+
+        with engine.begin() as conn:
+            partitioned = self.is_partitioned(conn)
+            if partitioned:
+                result['created'] = self.ensure_partitions(conn, now)
+
+        if partitioned:
+            with engine.connect() as conn:
+                attached = self.attached_partitions(conn)
+                tables = self.month_tables(conn)
+            for name in sorted(attached):
+                month = tables.get(name)
+                if month and month < hot_since:
+                    with engine.begin() as conn:
+                        conn.execute(text(
+                            f'ALTER TABLE {self._quote(conn, self.table)} DETACH PARTITION {self._quote(conn, name)}'
+                        ))
+                    result['detached'].append(name)
+        else:
+            result['moved'] = self._move_month_chunks(engine, hot_since, chunk_size)
+
+        with engine.connect() as conn:
+            attached = self.attached_partitions(conn)
+            tables = self.month_tables(conn)
+        for name, month in sorted(tables.items(), key=lambda item: item[1]):
+            if month < keep_since and name not in attached:
+                result['archived'].append(self.archive(engine, name))
+        return result
+
+    # ---- Archives ----
+
+    def archive(self, engine, name):
+        """Write a month table to <archive_dir>/<name>.csv.gz, then drop it"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f'{name}.csv.gz')
+        suffix = 1
+        while os.path.exists(path):
+            # Rows that reached an already archived month later on
+            suffix += 1
+            path = os.path.join(self.archive_dir, f'{name}-{suffix}.csv.gz')
+
+        partial = path + '.partial'
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                text(f'SELECT * FROM {self._quote(conn, name)} ORDER BY id')
+            )
+            with gzip.open(partial, 'wt', newline='') as archive:
+                writer = csv.writer(archive)
+                writer.writerow(result.keys())
+                for rows in result.partitions(ARCHIVE_CHUNK_SIZE):
+                    writer.writerows(rows)
+        os.replace(partial, path)
+
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE {self._quote(conn, name)}'))
+        return path
+
+    def archive_files(self, since=None, until=None):
+        """Archive files whose month overlaps [since, until)"""
+        paths = []
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, f'{self.table}_*.csv.gz'))):
+            month = self.month_of(path)
+            if month is None:
+                continue
+            if since and add_months(month, 1) <= since:
+                continue
+            if until and month >= until:
+                continue
+            paths.append(path)
+        return paths
+
+    def search_archive(self, since=None, until=None, contains=None, **equals):
+        """
+        Rows from the archive files in [since, until) whose columns equal
+        `equals` and, if given, with `contains` in any text column.
+        """
+        import pandas as pd
+
+        frames = []
+        for path in self.archive_files(since, until):
+            for chunk in pd.read_csv(path, chunksize=ARCHIVE_CHUNK_SIZE, compression='gzip'):
+                chunk[self.column] = pd.to_datetime(chunk[self.column], format='ISO8601')
+                mask = pd.Series(True, index=chunk.index)
+                if since:
+                    mask &= chunk[self.column] >= since
+                if until:
+                    mask &= chunk[self.column] < until
+                for name, value in equals.items():
+                    mask &= chunk[name] == value
+                if contains:
+                    text_columns = chunk.select_dtypes(include='object')
+                    mask &= text_columns.apply(
+                        lambda values: values.str.contains(contains, case=False, na=False, regex=False)
+                    ).any(axis=1)
+                frames.append(chunk[mask])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values(self.column)
@@ -0,0 +1,98 @@
+"""
+Prometheus metrics for the license server.
+
+Counters and histograms are updated on the request path. Gauges that need
+the database (active licenses / devices) are refreshed at most every
+INVENTORY_TTL seconds per process, so a scrape never scans tables.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) before
+the app is imported: every worker then writes its samples to that
+directory and /metrics aggregates all of them.
+"""
+
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from sqlalchemy import event
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+INVENTORY_TTL = 60
+
+REQUEST_LATENCY = Histogram(
+    'gtms_http_request_duration_seconds', 'Request latency by route',
+    ['method', 'endpoint', 'status'],
+)
+API_OUTCOMES = Counter(
+    'gtms_api_outcomes_total', 'License verification and login outcomes',
+    ['endpoint', 'outcome'],
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'gtms_db_pool_checkout_seconds', 'Time spent waiting for a pooled database connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKED_OUT = Gauge(
+    'gtms_db_pool_checked_out', 'Database connections currently checked out',
+    multiprocess_mode='livesum',
+)
+JOB_QUEUE_DEPTH = Gauge(
+    'gtms_job_queue_depth', 'Jobs waiting in the background queues',
+    ['queue'], multiprocess_mode='livesum',
+)
+CACHE_REQUESTS = Counter(
+    'gtms_cache_requests_total', 'Cache lookups by result (hit, partial, miss)',
+    ['cache', 'result'],
+)
+ACTIVE_LICENSES = Gauge(
+    'gtms_active_licenses', 'Active, unexpired licenses', multiprocess_mode='mostrecent',
+)
+ACTIVE_DEVICES = Gauge(
+    'gtms_active_devices', 'Active device bindings', multiprocess_mode='mostrecent',
+)
+
+_inventory_lock = threading.Lock()
+_inventory_refreshed = 0.0
+
+
+def instrument_engine(engine):
+    """Time pool checkouts and track checked-out connections for `engine`"""
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    event.listen(pool, 'checkout', lambda *args: POOL_CHECKED_OUT.inc())
+    event.listen(pool, 'checkin', lambda *args: POOL_CHECKED_OUT.dec())
+
+
+def refresh_inventory(count_func):
+    """Update the license / device gauges from count_func() once per INVENTORY_TTL"""
+    global _inventory_refreshed
+    with _inventory_lock:
+        if time.monotonic() - _inventory_refreshed < INVENTORY_TTL and _inventory_refreshed:
+            return
+        licenses, devices = count_func()
+        ACTIVE_LICENSES.set(licenses)
+        ACTIVE_DEVICES.set(devices)
+        _inventory_refreshed = time.monotonic()
+
+
+def render_metrics():
+    """(body, content type) of the Prometheus text exposition"""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
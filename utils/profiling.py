@@ -0,0 +1,163 @@
+"""
+Optional per-request profiling.
+
+RequestProfiler records, for every request:
+  * wall time
+  * SQL statement count and time (SQLAlchemy cursor events)
+  * Jinja render time (Flask template signals)
+  * named spans around external calls (profile_span('pdf'), 'smtp', ...)
+
+The numbers are sent back as a Server-Timing header (visible in the
+browser dev tools) and logged as one JSON line per request on the
+'gtms.profiling' logger. Requests slower than the slow threshold are also
+written, with their slowest and most repeated statements, to the slow log.
+"""
+
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('gtms.profiling')
+slow_logger = logging.getLogger('gtms.profiling.slow')
+
+# Statements kept per request for the slow log
+MAX_RECORDED_STATEMENTS = 200
+
+
+def _profile():
+    """The current request's profile, or None outside profiled requests"""
+    if not has_request_context():
+        return None
+    return g.get('_profile')
+
+
+@contextmanager
+def profile_span(name):
+    """Time an external call (PDF rendering, SMTP, ...) as a Server-Timing entry"""
+    profile = _profile()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile['spans'][name] = profile['spans'].get(name, 0.0) + time.perf_counter() - started
+
+
+class RequestProfiler:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_seconds = app.config.get('PROFILING_SLOW_MS', 500) / 1000.0
+
+        if app.config.get('PROFILING_SLOW_LOG') and not slow_logger.handlers:
+            handler = RotatingFileHandler(app.config['PROFILING_SLOW_LOG'], maxBytes=5 * 1024 * 1024, backupCount=3)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_logger.addHandler(handler)
+        if not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        event.listen(Engine, 'before_cursor_execute', self._query_started)
+        event.listen(Engine, 'after_cursor_execute', self._query_finished)
+
+    # ---- request ----
+
+    def _start(self):
+        g._profile = {
+            'started': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'statements': [],
+            'template_time': 0.0,
+            'render_started': [],
+            'spans': {},
+        }
+
+    def _finish(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        total = time.perf_counter() - profile['started']
+
+        timings = [
+            f'sql;dur={profile["sql_time"] * 1000:.1f};desc="{profile["sql_count"]} queries"',
+            f'tpl;dur={profile["template_time"] * 1000:.1f};desc="templates"',
+        ]
+        timings += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in profile['spans'].items()]
+        timings.append(f'total;dur={total * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 1),
+            'sql_count': profile['sql_count'],
+            'sql_ms': round(profile['sql_time'] * 1000, 1),
+            'template_ms': round(profile['template_time'] * 1000, 1),
+            'spans_ms': {name: round(seconds * 1000, 1) for name, seconds in profile['spans'].items()},
+        }
+        logger.info(json.dumps(line))
+
+        if total >= self.slow_seconds:
+            statements = profile['statements']
+            repeated = Counter(statement for statement, _ in statements)
+            line['slowest_statements'] = [
+                {'ms': round(seconds * 1000, 1), 'sql': statement}
+                for statement, seconds in sorted(statements, key=lambda item: -item[1])[:10]
+            ]
+            line['repeated_statements'] = [
+                {'count': count, 'sql': statement}
+                for statement, count in repeated.most_common(5) if count > 1
+            ]
+            slow_logger.warning(json.dumps(line))
+        return response
+
+    # ---- templates ----
+
+    def _render_started(self, sender, template, context, **extra):
+        profile = _profile()
+        if profile is not None:
+            profile['render_started'].append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        profile = _profile()
+        if profile is not None and profile['render_started']:
+            started = profile['render_started'].pop()
+            # Only count the outermost render; includes and emails rendered
+            # inside another render are part of it already
+            if not profile['render_started']:
+                profile['template_time'] += time.perf_counter() - started
+
+    # ---- SQL ----
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if _profile() is not None:
+            conn.info.setdefault('_profile_query_started', []).append(time.perf_counter())
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _profile()
+        started = conn.info.get('_profile_query_started')
+        if profile is None or not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        profile['sql_count'] += 1
+        profile['sql_time'] += seconds
+        if len(profile['statements']) < MAX_RECORDED_STATEMENTS:
+            profile['statements'].append((' '.join(statement.split()), seconds))
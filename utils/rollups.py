@@ -0,0 +1,39 @@
+import threading
+from collections import Counter
+
+
+def hour_bucket(moment):
+    """Start of the hour containing `moment`"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class CounterBuffer:
+    """
+    Thread-safe in-process counters keyed by tuples. Request handlers add to
+    it; a flusher drains everything in one batch and upserts the totals.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self._counts[key] += amount
+
+    def merge(self, counts):
+        """Put drained counts back, e.g. after a failed flush"""
+        with self._lock:
+            self._counts.update(counts)
+
+    def drain(self):
+        """Return all pending counts and start again from zero"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def __len__(self):
+        return len(self._counts)
+
+
+traffic_buffer = CounterBuffer()
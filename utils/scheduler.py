@@ -0,0 +1,37 @@
+import threading
+import traceback
+
+
+class PeriodicTask:
+    """
+    Run func(*args, **kwargs) every `interval` seconds in a daemon thread,
+    inside the app context. The first run happens immediately on start().
+    """
+
+    def __init__(self, app, name, interval, func, *args, **kwargs):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.func(*self.args, **self.kwargs)
+            except Exception:
+                print(f"[{self.name}] run failed:")
+                traceback.print_exc()
+            self._stop.wait(self.interval)
@@ -0,0 +1,464 @@
+"""
+Cache shared by every worker process, with generation-counter invalidation.
+
+Entries live in a namespace ('licenses', 'dashboard', 'admins', ...). Each
+namespace has a generation counter that is part of every key, so
+invalidate('licenses') bumps one counter and every worker stops seeing the
+old entries at once; they are never read again and age out or get
+overwritten.
+
+Backends (CACHE_BACKEND):
+
+    local   a dict in this process (Windows, in-memory SQLite databases)
+    shared  a memory-mapped file that every process on the host maps
+            (default: workers and cron scripts see each other's writes)
+            (CACHE_SHARED_PATH, /dev/shm when available); POSIX only.
+            The file and its directory must belong to this user and be
+            closed to everyone else, or the backend refuses to start:
+            whoever can write the file could run code in every worker.
+    redis   any server speaking the Redis protocol (CACHE_REDIS_URL);
+            needs the redis package
+
+Values are pickled. A failing backend (e.g. Redis down) counts as a miss
+and never fails the request.
+"""
+
+import hashlib
+import mmap
+import os
+import pickle
+import stat
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy.engine import make_url
+
+from utils.metrics import CACHE_REQUESTS
+
+BACKENDS = ('local', 'shared', 'redis')
+
+_MISSING = object()
+
+
+def check_private(st, path):
+    """Raise unless `st` (an lstat result) is owned by this user and has no group/other permissions"""
+    if stat.S_ISLNK(st.st_mode):
+        raise RuntimeError(f'{path} is a symlink')
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f'{path} must be owned by uid {os.getuid()} with no group/other permissions')
+
+
+def private_directory(path):
+    """Create `path` with mode 0700 if missing; raise unless it is private to this user"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(f'{path} is not a directory')
+    check_private(st, path)
+    return path
+
+
+def key_hash(key):
+    """Stable 64-bit hash of an encoded key (never 0, which marks an empty slot)"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') | 1
+
+
+class LocalBackend:
+    """Per-process dict; the oldest entries are dropped past `max_entries`"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires and expires < time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=0):
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (value, time.time() + ttl if ttl else 0)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class SharedMemoryBackend:
+    """
+    Fixed-size hash table in a memory-mapped file.
+
+    Layout: a header, `counter_slots` (hash, value) counters, then `slots`
+    entry slots of `slot_size` bytes each (hash, expiry, value length, key
+    length, key, value). A key probes PROBE consecutive slots; when they are
+    all taken, the one expiring soonest is overwritten. Counters have their
+    own region so eviction can never reset a generation. Values that do not
+    fit in a slot are not cached.
+
+    Every operation holds an flock on the file (shared for reads), so
+    workers see consistent slots. The file is reopened after a fork. Its
+    directory is created private (0700) and both are checked to belong to
+    this user before anything is read from them.
+    """
+
+    MAGIC = b'GTMSCACH'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIIII')
+    HEADER_SIZE = 64
+    COUNTER = struct.Struct('<Qq')
+    SLOT = struct.Struct('<QdIH')
+    PROBE = 8
+    MAX_KEY = 250
+
+    def __init__(self, path, slots=8192, slot_size=1024, counter_slots=256):
+        try:
+            import fcntl
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='shared' needs fcntl (POSIX); use 'local' or 'redis'")
+        self._fcntl = fcntl
+        private_directory(os.path.dirname(os.path.abspath(path)))
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.counter_slots = counter_slots
+        self.entries_offset = self.HEADER_SIZE + counter_slots * self.COUNTER.size
+        self.size = self.entries_offset + slots * slot_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    # ---- file and locking ----
+
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            check_private(os.fstat(fd), self.path)
+        except RuntimeError:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            header = self.HEADER.pack(self.MAGIC, self.VERSION, self.counter_slots, self.slots, self.slot_size)
+            if os.fstat(self._fd).st_size != self.size or os.pread(self._fd, self.HEADER.size, 0) != header:
+                # New segment, or one laid out with other settings: start empty
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, header, 0)
+            self._map = mmap.mmap(self._fd, self.size)
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """The mapped segment, with this process's threads and other workers locked out"""
+        with self._lock:
+            self._open()
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX if exclusive else self._fcntl.LOCK_SH)
+            try:
+                yield self._map
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    # ---- entries ----
+
+    def _slot_offset(self, index):
+        return self.entries_offset + index * self.slot_size
+
+    def _probe(self, h):
+        base = h % self.slots
+        return [(base + i) % self.slots for i in range(self.PROBE)]
+
+    def _find(self, segment, key, h):
+        for index in self._probe(h):
+            offset = self._slot_offset(index)
+            slot_hash, expires, value_len, key_len = self.SLOT.unpack_from(segment, offset)
+            start = offset + self.SLOT.size
+            if slot_hash == h and segment[start:start + key_len] == key:
+                return offset, expires, start + key_len, value_len
+        return None
+
+    def get(self, key):
+        key = key.encode()
+        with self._locked(exclusive=False) as segment:
+            found = self._find(segment, key, key_hash(key))
+            if found is None:
+                return None
+            offset, expires, start, value_len = found
+            if expires and expires < time.time():
+                return None
+            return bytes(segment[start:start + value_len])
+
+    def set(self, key, value, ttl=0):
+        key = key.encode()
+        if len(key) > self.MAX_KEY or self.SLOT.size + len(key) + len(value) > self.slot_size:
+            return False
+        h = key_hash(key)
+        now = time.time()
+        with self._locked(exclusive=True) as segment:
+            found = self._find(segment, key, h)
+            if found is not None:
+                offset = found[0]
+            else:
+                # First free or expired slot, else the one expiring soonest
+                candidates = []
+                for index in self._probe(h):
+                    slot_offset = self._slot_offset(index)
+                    slot_hash, expires = self.SLOT.unpack_from(segment, slot_offset)[:2]
+                    if not slot_hash or (expires and expires < now):
+                        candidates = [(0, slot_offset)]
+                        break
+                    candidates.append((expires or float('inf'), slot_offset))
+                offset = min(candidates)[1]
+            self.SLOT.pack_into(segment, offset, h, now + ttl if ttl else 0, len(value), len(key))
+            start = offset + self.SLOT.size
+            segment[start:start + len(key)] = key
+            segment[start + len(key):start + len(key) + len(value)] = value
+        return True
+
+    def delete(self, key):
+        key = key.encode()
+        with self._locked(exclusive=True) as segment:
+            found = self._find(segment, key, key_hash(key))
+            if found is not None:
+                self.SLOT.pack_into(segment, found[0], 0, 0, 0, 0)
+
+    # ---- counters ----
+
+    def _counter_offset(self, segment, h, claim):
+        base = h % self.counter_slots
+        for i in range(self.counter_slots):
+            offset = self.HEADER_SIZE + ((base + i) % self.counter_slots) * self.COUNTER.size
+            slot_hash = self.COUNTER.unpack_from(segment, offset)[0]
+            if slot_hash == h:
+                return offset
+            if not slot_hash:
+                if claim:
+                    self.COUNTER.pack_into(segment, offset, h, 0)
+                    return offset
+                return None
+        raise RuntimeError(f'Shared cache counter table is full ({self.counter_slots} counters)')
+
+    def counter(self, key):
+        with self._locked(exclusive=False) as segment:
+            offset = self._counter_offset(segment, key_hash(key.encode()), claim=False)
+            return self.COUNTER.unpack_from(segment, offset)[1] if offset is not None else 0
+
+    def incr(self, key):
+        h = key_hash(key.encode())
+        with self._locked(exclusive=True) as segment:
+            offset = self._counter_offset(segment, h, claim=True)
+            value = self.COUNTER.unpack_from(segment, offset)[1] + 1
+            self.COUNTER.pack_into(segment, offset, h, value)
+            return value
+
+    def clear(self):
+        with self._locked(exclusive=True) as segment:
+            segment[self.HEADER_SIZE:self.size] = bytes(self.size - self.HEADER_SIZE)
+
+
+class RedisBackend:
+    """Entries and counters on a Redis-protocol server"""
+
+    def __init__(self, url, prefix=''):
+        import redis
+        # RESP2 is spoken by every Redis-compatible server, old or new
+        self.client = redis.Redis.from_url(url, protocol=2, socket_timeout=1, socket_connect_timeout=1)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=0):
+        return self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f'{self.prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class SharedCache:
+    """Namespaced get/set over a backend; invalidate() bumps a namespace's generation"""
+
+    def __init__(self, backend, prefix=''):
+        self.backend = backend
+        self.prefix = prefix
+
+    def generation(self, namespace):
+        return self.backend.counter(f'{self.prefix}gen:{namespace}')
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}{namespace}:{self.generation(namespace)}:{key}'
+
+    def get(self, namespace, key, default=None):
+        try:
+            full_key = self._key(namespace, key)
+        except Exception as e:
+            print(f"Cache get failed ({namespace}): {e}")
+            CACHE_REQUESTS.labels(cache=namespace, result='error').inc()
+            return default
+        return self.get_at(namespace, full_key, default)
+
+    def get_at(self, namespace, full_key, default=None):
+        """get() by a key already built with _key() (for the metrics, `namespace`)"""
+        try:
+            value = self.backend.get(full_key)
+        except Exception as e:
+            print(f"Cache get failed ({namespace}): {e}")
+            CACHE_REQUESTS.labels(cache=namespace, result='error').inc()
+            return default
+        CACHE_REQUESTS.labels(cache=namespace, result='miss' if value is None else 'hit').inc()
+        return default if value is None else pickle.loads(value)
+
+    def set(self, namespace, key, value, ttl=0):
+        try:
+            self.set_at(self._key(namespace, key), value, ttl)
+        except Exception as e:
+            print(f"Cache set failed ({namespace}): {e}")
+
+    def set_at(self, full_key, value, ttl=0):
+        """Store under a key already built with _key(); raises if the backend fails"""
+        self.backend.set(full_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+    def get_or_set(self, namespace, key, load, ttl=0):
+        """
+        Cached value, or load() stored for `ttl` seconds (None is cached too).
+        The value is stored under the generation read before load() ran, so
+        an invalidation during load() leaves it unreachable instead of
+        serving it as current.
+        """
+        try:
+            full_key = self._key(namespace, key)
+        except Exception as e:
+            print(f"Cache get failed ({namespace}): {e}")
+            CACHE_REQUESTS.labels(cache=namespace, result='error').inc()
+            return load()
+        value = self.get_at(namespace, full_key, _MISSING)
+        if value is _MISSING:
+            value = load()
+            try:
+                self.set_at(full_key, value, ttl)
+            except Exception as e:
+                print(f"Cache set failed ({namespace}): {e}")
+        return value
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self._key(namespace, key))
+        except Exception as e:
+            print(f"Cache delete failed ({namespace}): {e}")
+
+    def invalidate(self, *namespaces):
+        """Drop every entry of `namespaces` in all workers"""
+        now = repr(time.time()).encode()
+        for namespace in namespaces:
+            try:
+                self.backend.incr(f'{self.prefix}gen:{namespace}')
+                self.backend.set(f'{self.prefix}modified:{namespace}', now)
+            except Exception as e:
+                print(f"Cache invalidation failed ({namespace}): {e}")
+
+    def last_modified(self, namespace):
+        """When `namespace` was last invalidated (None if never, or the entry was lost)"""
+        try:
+            value = self.backend.get(f'{self.prefix}modified:{namespace}')
+        except Exception as e:
+            print(f"Cache get failed (modified): {e}")
+            return None
+        return float(value) if value is not None else None
+
+    def epoch(self):
+        """
+        (token, start time) of the cache's current contents. Generations
+        start again at 0 after clear(), a restart of a per-process cache or
+        a Redis flush, and a new epoch starts with them: anything derived
+        from generations (ETags) must include the token.
+        """
+        key = f'{self.prefix}epoch'
+        try:
+            value = self.backend.get(key)
+            if value is None:
+                value = f'{time.time()!r}:{os.urandom(8).hex()}'.encode()
+                self.backend.set(key, value)
+        except Exception as e:
+            # No stable epoch: a fresh one per call never matches a stored ETag
+            print(f"Cache get failed (epoch): {e}")
+            value = f'{time.time()!r}:{os.urandom(8).hex()}'.encode()
+        started, token = value.decode().split(':')
+        return token, float(started)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def in_memory_database(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def make_cache(config):
+    """SharedCache for an app config; keys are prefixed per database"""
+    database = hashlib.blake2b(config['SQLALCHEMY_DATABASE_URI'].encode(), digest_size=4).hexdigest()
+    prefix = f"{config['CACHE_KEY_PREFIX']}{database}:"
+    name = config['CACHE_BACKEND']
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown CACHE_BACKEND {name!r}; expected one of {BACKENDS}')
+    if name == 'local' or in_memory_database(config['SQLALCHEMY_DATABASE_URI']):
+        backend = LocalBackend()
+    elif name == 'shared':
+        backend = SharedMemoryBackend(config['CACHE_SHARED_PATH'], slots=config['CACHE_SHARED_SLOTS'],
+                                      slot_size=config['CACHE_SHARED_SLOT_SIZE'])
+    else:
+        backend = RedisBackend(config['CACHE_REDIS_URL'], prefix)
+    return SharedCache(backend, prefix)
+
+
+def init_app(app):
+    app.extensions['shared_cache'] = make_cache(app.config)
+
+
+def current_cache():
+    """The SharedCache of the current app"""
+    return current_app.extensions['shared_cache']
@@ -0,0 +1,115 @@
+import sqlite3
+
+from sqlalchemy import and_, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import DateTime, String
+
+
+class add_days(ColumnElement):
+    """
+    `expr + N days` as a SQL expression, so date shifts can run as a single
+    set-based UPDATE on both PostgreSQL and SQLite.
+    """
+    type = DateTime()
+    inherit_cache = False
+
+    def __init__(self, expr, days):
+        self.expr = expr
+        self.days = int(days)
+
+
+@compiles(add_days)
+def _add_days_default(element, compiler, **kw):
+    return f"({compiler.process(element.expr, **kw)} + INTERVAL '{element.days} days')"
+
+
+@compiles(add_days, 'sqlite')
+def _add_days_sqlite(element, compiler, **kw):
+    # SQLAlchemy stores SQLite DATETIMEs as 'YYYY-MM-DD HH:MM:SS.ffffff';
+    # datetime() drops the fraction, so append the original one back
+    expr = compiler.process(element.expr, **kw)
+    return f"(datetime({expr}, '{element.days:+d} days') || substr({expr}, 20))"
+
+
+def increment_on_conflict(table, key_columns, count_column, dialect_name):
+    """
+    INSERT ... ON CONFLICT (key_columns) DO UPDATE SET count = count + excluded.count,
+    for counters that several workers add to concurrently.
+    """
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={count_column: table.c[count_column] + stmt.excluded[count_column]},
+    )
+
+
+def fold_text(value):
+    """Case folding for case-insensitive search; the same on the Python and SQLite side"""
+    return value.lower() if value is not None else None
+
+
+class fold(FunctionElement):
+    """
+    Case-folded `expr` in code point order, for prefix_match() and the
+    expression indexes behind it. Compare it with fold_text() of the input.
+
+    SQLite's lower() only folds ASCII, so SQLite gets fold_text() itself,
+    registered on every connection as unicode_lower(). Tables with an index
+    on it can then only be written through this app's engine (not the
+    sqlite3 shell). PostgreSQL's lower() folds by the database locale,
+    which matches str.lower() for nearly every letter; COLLATE "C" makes
+    the range comparisons of prefix_match() code point based.
+    """
+    type = String()
+    name = 'fold'
+    inherit_cache = True
+
+
+@compiles(fold)
+def _fold_default(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)})'
+
+
+@compiles(fold, 'postgresql')
+def _fold_postgresql(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)}) COLLATE "C"'
+
+
+@compiles(fold, 'sqlite')
+def _fold_sqlite(element, compiler, **kw):
+    return f'unicode_lower({compiler.process(element.clauses, **kw)})'
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('unicode_lower', 1, fold_text, deterministic=True)
+
+
+def prefix_match(expr, prefix):
+    """
+    `expr` starts with `prefix`, written as the range prefix <= expr < next
+    prefix. Unlike LIKE 'prefix%' (which PostgreSQL only indexes with
+    text_pattern_ops), a plain or expression index on `expr` serves it.
+
+    The range equals a prefix test only in code point order: SQLite's
+    default, and fold() on PostgreSQL (plain text columns there compare by
+    locale collation).
+    """
+    # The smallest string above every string starting with `prefix`: bump
+    # its last character, dropping trailing U+10FFFF (which has no successor)
+    stem = prefix.rstrip(chr(0x10FFFF))
+    if not stem:
+        return expr >= prefix
+    successor = ord(stem[-1]) + 1
+    if 0xD800 <= successor < 0xE000:  # surrogates cannot be stored as text
+        successor = 0xE000
+    return and_(expr >= prefix, expr < stem[:-1] + chr(successor))
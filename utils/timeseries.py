@@ -0,0 +1,50 @@
+"""
+Server-side downsampling for chart series: zero-filled fixed-width buckets
+and Largest-Triangle-Three-Buckets (LTTB), which keeps the visual shape of
+a series (peaks and dips) with a fixed number of points.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def fill_buckets(buckets, values, start, end, freq):
+    """Series over every `freq` bucket in [start, end), 0 where nothing was recorded"""
+    index = pd.date_range(start, end, freq=freq, inclusive='left')
+    series = pd.Series(np.asarray(values, dtype='float64'), index=pd.to_datetime(list(buckets)))
+    return series.groupby(level=0).sum().reindex(index, fill_value=0.0)
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points LTTB keeps from the series (x, y)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # First and last points are always kept; the ones in between are split
+    # into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        # Twice the area of the triangle (selected point, candidate, next bucket average)
+        area = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected])
+                      - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(area.argmax())
+        keep[i + 1] = selected
+    return keep
+
+
+def downsample(series, points):
+    """[(timestamp, value), ...] with at most `points` entries"""
+    x = series.index.asi8 // 10**9
+    keep = lttb(x, series.to_numpy(), points)
+    return [(series.index[i].isoformat(), float(series.iloc[i])) for i in keep]